@@ -5,6 +5,7 @@ from django.conf import settings
 class AppPaths:
 
     _profile_pics = None
+    _profile_pics_tmp = None
 
     @classmethod
     def _create_missing_dir(cls, path):
@@ -19,3 +20,11 @@ class AppPaths:
 
         return cls._profile_pics
 
+    @classmethod
+    def profile_pics_tmp(cls) -> Path:
+        # Uploads in progress. Lives under profile_pics() so that finished uploads can be moved with a rename
+        if cls._profile_pics_tmp is None:
+            p = cls.profile_pics() / '.tmp'
+            cls._profile_pics_tmp = cls._create_missing_dir(p)
+
+        return cls._profile_pics_tmp
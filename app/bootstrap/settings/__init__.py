@@ -6,6 +6,7 @@
 
 from dotenv import load_dotenv
 from split_settings.tools import include
+from django.core.exceptions import ImproperlyConfigured
 
 from app.bootstrap.config import Config
 from app.utils import resolve_root
@@ -27,6 +28,18 @@ setting_files = [
     f'environments/{environment}.py'
 ]
 
+# Optional profiles, trimming the stack down further (production only, the development tools need the full stack)
+profiles = {
+    'api-lean': 'profiles/api_lean.py',
+}
+
+settings_profile = Config.get('runtime.settings_profile')
+if settings_profile and environment == 'production':
+    if settings_profile not in profiles:
+        raise ImproperlyConfigured(f"Unknown settings profile '{settings_profile}'")
+
+    setting_files.append(profiles[settings_profile])
+
 include(*setting_files)
 
 
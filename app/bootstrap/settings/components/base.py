@@ -61,10 +61,13 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [],
     'DEFAULT_PERMISSION_CLASSES': [],
 
-    # Default only json responses
+    # Default only json responses. Rendered with orjson when available, see app/renderers.py
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer'
-    ]
+        'app.renderers.ApiJSONRenderer'
+    ],
+
+    # Respond to our own exceptions (e.g permission denied) right away instead of re-raising them
+    'EXCEPTION_HANDLER': 'app.exceptions.api_exception_handler',
 }
 
 # CORS settings
@@ -1,22 +1,76 @@
+from django.core.exceptions import ImproperlyConfigured
+
 from app.bootstrap.config import Config
-from app.utils import resolve_root, root_directory
-
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'USER': Config.get('db.user'),
-#         'NAME': Config.get('db.name'),
-#         'PASSWORD': Config.get('db.pass'),
-#         'HOST': Config.get('db.host'),
-#         'PORT': Config.get('db.port'),
-#     }
-# }
-DATABASES = {
-    'default': {
+from app.utils import resolve_root, root_directory, to_int
+
+db_engine = Config.get('db.engine') or 'sqlite'
+
+if db_engine == 'sqlite':
+    default_database = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME':  resolve_root('db.sqlite'),
     }
-}
+elif db_engine == 'sqlite-tuned':
+    default_database = {
+        'ENGINE': 'app.core.database.sqlite',
+        'NAME':  resolve_root('db.sqlite'),
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': Config.get('db.sqlite.journal_mode') or 'wal',
+                'synchronous': Config.get('db.sqlite.synchronous') or 'normal',
+                'busy_timeout': to_int(Config.get('db.sqlite.busy_timeout'), 5000),
+                'cache_size': to_int(Config.get('db.sqlite.cache_size'), -65536),
+                'mmap_size': to_int(Config.get('db.sqlite.mmap_size'), 268435456),
+                'temp_store': 'memory',
+            },
+            'immediate_transactions': Config.get_bool('db.sqlite.immediate_transactions'),
+        },
+    }
+elif db_engine == 'postgres':
+    default_database = {
+        'ENGINE': 'app.core.database.postgresql',
+        'USER': Config.get('db.user'),
+        'NAME': Config.get('db.name'),
+        'PASSWORD': Config.get('db.pass'),
+        'HOST': Config.get('db.host'),
+        'PORT': Config.get('db.port'),
+        'OPTIONS': {
+            'connect_timeout': to_int(Config.get('db.postgres.connect_timeout'), 5),
+        },
+    }
+
+    if Config.get_bool('db.pool.enabled'):
+        default_database['POOL'] = {
+            'max_size': to_int(Config.get('db.pool.max_size'), 10),
+            'timeout': to_int(Config.get('db.pool.timeout'), 10),
+            'max_idle': to_int(Config.get('db.pool.max_idle'), 300),
+        }
+else:
+    raise ImproperlyConfigured(f"Unknown database engine '{db_engine}'")
+
+# Keep the connections open across requests instead of opening one per request, checking they still work first.
+# Pooled connections are given back to the pool at the end of every request instead
+default_database['CONN_MAX_AGE'] = 0 if 'POOL' in default_database else to_int(Config.get('db.conn_max_age'), 0)
+default_database['CONN_HEALTH_CHECKS'] = Config.get_bool('db.conn_health_checks')
+
+DATABASES = {'default': default_database}
+
+# Read replica of the primary, with the same settings except for where it is
+if Config.get_bool('db.replica.enabled'):
+    replica_database = {**default_database, 'TEST': {'MIRROR': 'default'}}
+
+    if db_engine == 'postgres':
+        replica_database['NAME'] = Config.get('db.replica.name') or default_database['NAME']
+        replica_database['HOST'] = Config.get('db.replica.host') or default_database['HOST']
+        replica_database['PORT'] = Config.get('db.replica.port') or default_database['PORT']
+    elif Config.get('db.replica.name'):
+        replica_database['NAME'] = resolve_root(Config.get('db.replica.name'))
+    else:
+        raise ImproperlyConfigured("`db.replica.name` must be set to the file of the replica")
+
+    DATABASES['replica'] = replica_database
+    DATABASE_ROUTERS = ['app.core.database.routing.ReplicaRouter']
+
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
 # This allows us to have multiple migrations folders (with separate databases). This is useful e.g for
@@ -1,4 +1,10 @@
 MIDDLEWARE = [
+    # First, so that the time spent in every other middleware is measured too
+    'app.middleware.profiling.ProfilingMiddleware',
+
+    # Only when a read replica is configured
+    'app.middleware.db_routing.DatabaseRoutingMiddleware',
+
     'corsheaders.middleware.CorsMiddleware',
 
     'django.middleware.security.SecurityMiddleware',
@@ -0,0 +1,46 @@
+# "api-lean" profile, enabled with `runtime.settings_profile = 'api-lean'` (production only)
+#
+# The API is a token authenticated JSON API: it uses no sessions, no flash messages, no static files and no
+# CSRF tokens (every API view is csrf exempt anyway), and never renders pages that could be framed. This profile
+# drops those apps and middleware, so that requests stop paying for them.
+#
+# Run `python manage.py check_api_lean` after adding views, it flags the ones relying on any of the removed parts
+
+from app.bootstrap.settings.components.base import (
+    INSTALLED_APPS
+)
+from app.bootstrap.settings.components.middleware import (
+    MIDDLEWARE
+)
+from app.bootstrap.settings.components.templates import (
+    TEMPLATES
+)
+
+API_LEAN_REMOVED_APPS = [
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+
+API_LEAN_REMOVED_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_LEAN_REMOVED_APPS]
+MIDDLEWARE = [m for m in MIDDLEWARE if m not in API_LEAN_REMOVED_MIDDLEWARE]
+
+TEMPLATES = [
+    {
+        **template,
+        'OPTIONS': {
+            **template['OPTIONS'],
+            'context_processors': [
+                p for p in template['OPTIONS']['context_processors'] if not p.startswith('django.contrib.messages.')
+            ],
+        },
+    }
+    for template in TEMPLATES
+]
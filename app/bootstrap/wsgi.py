@@ -11,6 +11,12 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from app.utils.passlib_hash import hashing_executor
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.bootstrap.settings')
 
 application = get_wsgi_application()
+
+# Calibrate the password hashing cost (see `hashing.target_ms`) while the worker boots, rather than on its first
+# login or signup
+hashing_executor.policy()
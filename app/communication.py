@@ -1,4 +1,7 @@
-from typing import Optional
+from typing import Any, Optional
+from functools import wraps
+from http import HTTPStatus
+
 from django.http.request import QueryDict
 from django.core.files.uploadedfile import UploadedFile
 from django.utils.datastructures import MultiValueDict
@@ -11,6 +14,8 @@ from rest_framework.decorators import api_view
 from django.http import HttpRequest, HttpResponse, JsonResponse
 
 from app.models.auth import AppUser
+from app.renderers import dumps, loads
+from app.exceptions import ApiException, HttpException, ApiExceptionCollection, response_exception
 
 # Just rest_framework.request.Request, but with typehints
 class ApiRequest(_Request):
@@ -20,21 +25,90 @@ class ApiRequest(_Request):
     method: str
     data: QueryDict
     user: Optional[AppUser]
+    # Set on views protected by `require()`, see app.core.authentication.engine
+    permission_gate: Any
+
+def _response_body(type: str, msg, payload):
+    # All responses need to have the same body format
+    return {
+        'type': type,
+        'message': msg,
+        'payload': payload
+    }
+
+def render_success(msg="", payload=None) -> bytes:
+    """ The body of a success response, rendered ahead (e.g to be cached), see `rendered_response()` """
+    return dumps(_response_body('success', msg, payload))
+
+def rendered_response(body: bytes, **kwargs) -> HttpResponse:
+    """ A response of an already rendered body, from sync or async views """
+    kwargs.setdefault('content_type', 'application/json')
+    return HttpResponse(body, **kwargs)
 
 class ApiResponse(_Response):
-    # All responses need to have the same body format, hence these helper functions
     @classmethod
     def make_success(cls, msg="", payload=None):
-        return cls({
-            'type': 'success',
-            'message': msg,
-            'payload': payload
-        })
+        return cls(_response_body('success', msg, payload))
+
+    @classmethod
+    def make_error(cls, msg="", payload=None):
+        return cls(_response_body('error', msg, payload))
+
+
+# Responses of async views (see `async_api_view`), which do not go through rest_framework's rendering
+class ApiJsonResponse(HttpResponse):
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+    @classmethod
+    def make_success(cls, msg="", payload=None):
+        return cls(_response_body('success', msg, payload))
 
     @classmethod
     def make_error(cls, msg="", payload=None):
-        return cls({
-            'type': 'error',
-            'message': msg,
-            'payload': payload
-        })
\ No newline at end of file
+        return cls(_response_body('error', msg, payload))
+
+
+_invalid_body_exception = ApiExceptionCollection.BadRequest.copy_with(msg="Malformed request body")
+_method_not_allowed_exception = ApiException.from_http_status_code(HTTPStatus.METHOD_NOT_ALLOWED)
+
+def _parse_body(request: HttpRequest):
+    if request.content_type == 'application/json':
+        if not request.body:
+            return {}
+        try:
+            return loads(request.body)
+        except ValueError:
+            raise _invalid_body_exception
+
+    return request.POST
+
+
+def async_api_view(http_method_names=None):
+    """
+    The async counterpart of rest_framework's `api_view`, which does not support coroutine views.
+
+    Checks the request method, exposes the parsed body as `request.data` and turns raised `HttpException`s into
+    responses right away, so that an async view never has to leave the event loop.
+    """
+    allowed = [m.upper() for m in (http_method_names or ['GET'])]
+
+    def wrapper(func):
+        @wraps(func)
+        async def _f(request, *args, **kwargs):
+            try:
+                if request.method not in allowed:
+                    raise _method_not_allowed_exception
+
+                request.data = _parse_body(request)
+                return await func(request, *args, **kwargs)
+            except HttpException as exp:
+                return response_exception(request, exp)
+
+        # Same as rest_framework, these views are authenticated by API keys and not by cookies.
+        # (django's `csrf_exempt` can not be used here as it would hide the coroutine function)
+        _f.csrf_exempt = True # type: ignore
+        return _f
+
+    return wrapper
\ No newline at end of file
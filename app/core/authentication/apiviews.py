@@ -1,68 +1,86 @@
-import uuid
-
-from pathlib import Path
 from http import HTTPStatus
 from typing import Optional, Any, cast
 
+from django.db import IntegrityError
 from rest_framework.decorators import api_view
 
 from auth_core import AclContext
 
-from app.app_paths import AppPaths
+from app.utils import to_int
 from app.models.auth import AppUser, ProfilePicture
-from app.exceptions import ApiException
+from app.exceptions import ApiException, ApiExceptionCollection
+from app.core.media.uploads import ProfilePictureUploadHandler, store_profile_picture, max_picture_size
+from app.core.media.thumbnails import schedule_variants
+from app.core.media.views import picture_urls
+from app.core.throttling.throttles import (
+    throttle,
+    login_by_ip,
+    login_by_username,
+    signup_by_ip,
+    upload_by_ip,
+    by_api_key,
+)
 from app.communication import (
     ApiRequest,
     ApiResponse,
+    HttpResponse,
+    render_success,
+    rendered_response,
 )
 
-from .keystore import KeyStore
-from .engine import TR, require, FixedContextGenerator
+from .profile_cache import profile_cache
+from .engine import TR, require, issue_api_key, FixedContextGenerator
 from .serializers import (
     UserProfileSerializer,
     CreateUserSerializer,
     LoginSerializer,
-    UserProfileView,
     UpdateUserCredSerializer,
-    UpdatePasswordSerializer
+    UpdatePasswordSerializer,
+    PROFILE_FIELDS,
+    taken_user_fields_exception,
 )
 
 
+_UPLOAD_FORM_SLACK = 64 * 2**10
+
+no_image_exception = ApiExceptionCollection.BadRequest.copy_with(msg="No image uploaded")
+
+
 def extract_user(request: ApiRequest) -> AppUser:
     return cast(AppUser, request.user)
 
 
 @api_view(['POST'])
+@throttle(upload_by_ip)
 def upload_picture(request: ApiRequest) -> ApiResponse:
-    # TODO: Protect this route with at-least some app-level authorization (not user-level) to prevent spamming/DOS
+    # Pictures are uploaded before signing up, so uploads can only be limited per client address.
+    # The throttle must not look at the body, it is parsed below with the upload handler
 
-    file = request.FILES['image'] # type: ignore
+    # Reject what is obviously too big before reading any of it. Some slack is left for the rest of the form.
+    # Requests without a length (chunked) are capped by the upload handler, as they get read
+    if to_int(request.META.get('CONTENT_LENGTH')) > max_picture_size() + _UPLOAD_FORM_SLACK:
+        raise ProfilePictureUploadHandler.too_large_exception
 
-    extension = Path(file.name).suffix
+    # Must be set before the body gets parsed
+    handler = ProfilePictureUploadHandler(request._request)
+    request._request.upload_handlers = [handler]
 
-    name = str(uuid.uuid4())
-    location = name + extension
+    file = request.FILES.get('image', None) # type: ignore
 
-    record = ProfilePicture()
-    record.name = name
-    record.location = location
+    if handler.error is not None:
+        raise handler.error
 
-    try:
-        record.save()
-    except:
-        raise ApiException(
-            code=HTTPStatus.INTERNAL_SERVER_ERROR, msg="Failed to upload image. Try again later")
+    if file is None:
+        raise no_image_exception
 
-    with open(str(AppPaths.profile_pics() / location), 'wb+') as destination:
-        for chunk in file.chunks():
-            destination.write(chunk)
+    record = store_profile_picture(file)
+    schedule_variants(record)
 
     return ApiResponse.make_success(payload={'handle': ProfilePicture.handle_of(record)})
 
 
-
-
 @api_view(['POST'])
+@throttle(signup_by_ip)
 def signup_user(request: ApiRequest) -> ApiResponse:
 
     ss = CreateUserSerializer(data=request.data) # type: ignore
@@ -72,10 +90,7 @@ def signup_user(request: ApiRequest) -> ApiResponse:
 
     user = AppUser.make(data.get('username'), data.get('password'))
 
-    user_key = KeyStore.generate_fresh()
-    serialized_key = KeyStore.serialize_user(user_key)
-
-    user.current_api_key = serialized_key
+    serialized_key = issue_api_key(user)
 
     user.first_name = data['first_name']
     user.last_name = data['last_name']
@@ -91,7 +106,11 @@ def signup_user(request: ApiRequest) -> ApiResponse:
     pic_handle = data.get('profile_pic_handle', None)
     user.profile_picture = ProfilePicture.from_handle(pic_handle) # type: ignore
 
-    user.save()
+    try:
+        user.save()
+    except IntegrityError as e:
+        # Username or email taken by a concurrent request, after validation
+        raise taken_user_fields_exception(user, e)
 
     return ApiResponse.make_success(
         msg="User signed up successfully",
@@ -106,6 +125,7 @@ login_failure_execption = ApiException(HTTPStatus.UNAUTHORIZED, msg="Invalid use
 user_inactive_execption = ApiException(HTTPStatus.UNAUTHORIZED, msg="User's account is not active")
 
 @api_view(['POST'])
+@throttle(login_by_ip, login_by_username)
 def login_user(request: ApiRequest) -> ApiResponse:
 
     ss = LoginSerializer(data=request.data) # type: ignore
@@ -124,10 +144,15 @@ def login_user(request: ApiRequest) -> ApiResponse:
     if user.is_active == 0:
         raise user_inactive_execption
 
+    # The stored key can not be handed back since only its hash is known, so every login issues a new key
+    serialized_key = issue_api_key(user)
+    # Along with the password hash, when `verify_password()` upgraded it
+    user.save()
+
     return ApiResponse.make_success(
         msg="Login successful",
         payload={
-            "api_key": user.current_api_key
+            "api_key": serialized_key
         }
     )
 
@@ -136,16 +161,10 @@ def login_user(request: ApiRequest) -> ApiResponse:
 ctx_authenticated = AclContext.trait_singular(TR.Authenticated)
 
 
-@api_view(["GET"])
-@require('access', FixedContextGenerator(ctx_authenticated))
-def user_profile(request: ApiRequest) -> ApiResponse:
-    user = extract_user(request)
-
-    pf = user.profile_picture
-
-    ss = UserProfileView({
-        "username": user.username,
-        "email": user.email,
+def profile_payload(user: AppUser, pf: Optional[ProfilePicture]) -> dict[str, Any]:
+    # The fields of `UserProfileSerializer`, then those of the account. Values are already of the right types, so
+    # there is nothing for a serializer to do
+    return {
         "first_name": user.first_name,
         "last_name": user.last_name,
         "phone_number": user.phone_number,
@@ -155,50 +174,65 @@ def user_profile(request: ApiRequest) -> ApiResponse:
         "age": user.age,
         "about_me": user.about_me,
         "profile_pic_handle": ProfilePicture.handle_of(pf),
+        "username": user.username,
+        "email": user.email,
         "profile_pic_location": None if pf is None else pf.location,
-    }) # type: ignore
+        "profile_pic_urls": picture_urls(pf),
+    }
 
 
-    return ApiResponse.make_success(payload=ss.data)
+@api_view(["GET"])
+@require('access', FixedContextGenerator(ctx_authenticated), throttles=(by_api_key,), related=('profile_picture',))
+def user_profile(request: ApiRequest) -> HttpResponse:
+    user = extract_user(request)
 
+    body = profile_cache.get(user)
+    if body is None:
+        body = render_success(payload=profile_payload(user, user.profile_picture))
+        profile_cache.put(user, body)
 
+    return rendered_response(body)
 
-@api_view(["POST"])
-@require('access', FixedContextGenerator(ctx_authenticated))
+
+def update_profile_fields(user: AppUser, data: dict[str, Any]):
+    """ Assign the profile fields present in the (validated) data, `save()` then only writes the changed ones """
+    for field in PROFILE_FIELDS:
+        if field in data:
+            setattr(user, field, data[field])
+
+
+@api_view(["POST", "PATCH"])
+@require('access', FixedContextGenerator(ctx_authenticated), throttles=(by_api_key,))
 def user_profile_update(request: ApiRequest) -> ApiResponse:
     user = extract_user(request)
 
-    ss = UserProfileSerializer(data=request.data) # type: ignore
+    # POST replaces the whole profile, PATCH only the given fields
+    partial = request.method == 'PATCH'
+
+    ss = UserProfileSerializer(data=request.data, partial=partial) # type: ignore
     ss.validate_api()
 
     data = ss.validated_data
 
-    user.first_name = data['first_name']
-    user.last_name = data['last_name']
-
-    user.phone_number = data['phone_number']
-    user.post_code = data['post_code']
-    user.address_line_1 = data['address_line_1']
-    user.address_line_2 = data['address_line_2']
-    user.age = data['age']
-    user.about_me = data['about_me']
+    update_profile_fields(user, data)
 
-    pic_handle = data.get('profile_pic_handle', None)
-    user.profile_picture = ProfilePicture.from_handle(pic_handle) # type: ignore
+    if not partial or 'profile_pic_handle' in data:
+        pic_handle = data.get('profile_pic_handle', None)
+        user.profile_picture = ProfilePicture.from_handle(pic_handle) # type: ignore
+        data['profile_pic_handle'] = ProfilePicture.handle_of(user.profile_picture)
 
     user.save()
 
-    data['profile_pic_handle'] = ProfilePicture.handle_of(user.profile_picture)
-
     return ApiResponse.make_success(payload=data)
 
 
-@api_view(["POST"])
-@require('access', FixedContextGenerator(ctx_authenticated))
+@api_view(["POST", "PATCH"])
+@require('access', FixedContextGenerator(ctx_authenticated), throttles=(by_api_key,))
 def user_cred_update(request: ApiRequest) -> ApiResponse:
     user = extract_user(request)
 
-    ss = UpdateUserCredSerializer(user=user, data=request.data) # type: ignore
+    # Fields missing from PATCH requests are kept, same as null ones
+    ss = UpdateUserCredSerializer(user=user, data=request.data, partial=request.method == 'PATCH') # type: ignore
     ss.validate_api()
 
     data = ss.validated_data
@@ -212,13 +246,16 @@ def user_cred_update(request: ApiRequest) -> ApiResponse:
     if email is not None:
         user.email = email
 
-    user.save()
+    try:
+        user.save()
+    except IntegrityError as e:
+        raise taken_user_fields_exception(user, e)
 
     return ApiResponse.make_success(payload=ss.validated_data)
 
 
 @api_view(["POST"])
-@require('access', FixedContextGenerator(ctx_authenticated))
+@require('access', FixedContextGenerator(ctx_authenticated), throttles=(by_api_key,))
 def user_password_update(request: ApiRequest) -> ApiResponse:
     ss = UpdatePasswordSerializer(data=request.data).validate_api() # type: ignore
 
@@ -0,0 +1,200 @@
+# Async versions of the views in `apiviews.py`, used when the app is served over ASGI (see `runtime.async_views`
+# in config/app.toml). They use the async ORM interface and the async hashing executor, so that a single worker
+# can keep many slow clients in flight without a thread per connection.
+#
+# Serializers with uniqueness validators hit the database while validating, so they are run through
+# `sync_to_async` (django refuses sync queries from inside the event loop).
+
+from typing import Any
+
+from django.db import IntegrityError
+from asgiref.sync import sync_to_async
+
+from app.models.auth import AppUser, ProfilePicture
+from app.core.throttling.throttles import throttle, login_by_ip, login_by_username, signup_by_ip, by_api_key
+from app.communication import (
+    ApiRequest,
+    ApiJsonResponse,
+    HttpResponse,
+    async_api_view,
+    render_success,
+    rendered_response,
+)
+
+from .engine import arequire, issue_api_key, FixedContextGenerator
+from .profile_cache import profile_cache
+from .apiviews import (
+    extract_user,
+    profile_payload,
+    update_profile_fields,
+    ctx_authenticated,
+    login_failure_execption,
+    user_inactive_execption,
+)
+from .serializers import (
+    UserProfileSerializer,
+    CreateUserSerializer,
+    LoginSerializer,
+    UpdateUserCredSerializer,
+    UpdatePasswordSerializer,
+    ataken_user_fields_exception,
+)
+
+
+@async_api_view(['POST'])
+@throttle(signup_by_ip)
+async def signup_user(request: ApiRequest) -> ApiJsonResponse:
+
+    ss = CreateUserSerializer(data=request.data) # type: ignore
+    await sync_to_async(ss.validate_api)()
+
+    data = ss.validated_data # type: dict[Any, Any]
+
+    user = AppUser()
+    user.username = data.get('username')
+    await user.aset_password(data.get('password'))
+
+    serialized_key = issue_api_key(user)
+
+    user.first_name = data['first_name']
+    user.last_name = data['last_name']
+    user.email = data['email']
+
+    user.phone_number = data['phone_number']
+    user.post_code = data['post_code']
+    user.address_line_1 = data['address_line_1']
+    user.address_line_2 = data['address_line_2']
+    user.age = data['age']
+    user.about_me = data['about_me']
+
+    pic_handle = data.get('profile_pic_handle', None)
+    user.profile_picture = await ProfilePicture.afrom_handle(pic_handle) # type: ignore
+
+    try:
+        await user.asave()
+    except IntegrityError as e:
+        # Username or email taken by a concurrent request, after validation
+        raise await ataken_user_fields_exception(user, e)
+
+    return ApiJsonResponse.make_success(
+        msg="User signed up successfully",
+        payload={
+            "api_key": serialized_key
+        }
+    )
+
+
+@async_api_view(['POST'])
+@throttle(login_by_ip, login_by_username)
+async def login_user(request: ApiRequest) -> ApiJsonResponse:
+
+    ss = LoginSerializer(data=request.data) # type: ignore
+    ss.validate_api()
+
+    data = ss.validated_data # type: dict[Any, Any]
+
+    user = await AppUser.objects.filter(username=data['username']).afirst()
+    if user is None:
+        raise login_failure_execption
+
+    if user.is_deleted == 1 or not await user.averify_password(data['password']):
+        raise login_failure_execption
+
+    if user.is_active == 0:
+        raise user_inactive_execption
+
+    serialized_key = issue_api_key(user)
+    # Along with the password hash, when `averify_password()` upgraded it
+    await user.asave()
+
+    return ApiJsonResponse.make_success(
+        msg="Login successful",
+        payload={
+            "api_key": serialized_key
+        }
+    )
+
+
+@async_api_view(["GET"])
+@arequire('access', FixedContextGenerator(ctx_authenticated), throttles=(by_api_key,), related=('profile_picture',))
+async def user_profile(request: ApiRequest) -> HttpResponse:
+    user = extract_user(request)
+
+    body = profile_cache.get(user)
+    if body is None:
+        pf = None
+        if AppUser.profile_picture.is_cached(user): # type: ignore
+            pf = user.profile_picture
+        elif user.profile_picture_id is not None: # type: ignore
+            # The user came from the principal cache, without its picture
+            pf = await ProfilePicture.objects.filter(pk=user.profile_picture_id).afirst() # type: ignore
+
+        body = render_success(payload=profile_payload(user, pf))
+        profile_cache.put(user, body)
+
+    return rendered_response(body)
+
+
+@async_api_view(["POST", "PATCH"])
+@arequire('access', FixedContextGenerator(ctx_authenticated), throttles=(by_api_key,))
+async def user_profile_update(request: ApiRequest) -> ApiJsonResponse:
+    user = extract_user(request)
+
+    partial = request.method == 'PATCH'
+
+    ss = UserProfileSerializer(data=request.data, partial=partial) # type: ignore
+    ss.validate_api()
+
+    data = ss.validated_data
+
+    update_profile_fields(user, data)
+
+    if not partial or 'profile_pic_handle' in data:
+        pic_handle = data.get('profile_pic_handle', None)
+        pf = await ProfilePicture.afrom_handle(pic_handle)
+        user.profile_picture = pf # type: ignore
+        data['profile_pic_handle'] = ProfilePicture.handle_of(pf)
+
+    await user.asave()
+
+    return ApiJsonResponse.make_success(payload=data)
+
+
+@async_api_view(["POST", "PATCH"])
+@arequire('access', FixedContextGenerator(ctx_authenticated), throttles=(by_api_key,))
+async def user_cred_update(request: ApiRequest) -> ApiJsonResponse:
+    user = extract_user(request)
+
+    ss = UpdateUserCredSerializer(user=user, data=request.data, partial=request.method == 'PATCH') # type: ignore
+    await sync_to_async(ss.validate_api)()
+
+    data = ss.validated_data
+
+    username = data.get('username', None)
+    email = data.get('email', None)
+
+    if username is not None:
+        user.username = username
+
+    if email is not None:
+        user.email = email
+
+    try:
+        await user.asave()
+    except IntegrityError as e:
+        raise await ataken_user_fields_exception(user, e)
+
+    return ApiJsonResponse.make_success(payload=ss.validated_data)
+
+
+@async_api_view(["POST"])
+@arequire('access', FixedContextGenerator(ctx_authenticated), throttles=(by_api_key,))
+async def user_password_update(request: ApiRequest) -> ApiJsonResponse:
+    ss = UpdatePasswordSerializer(data=request.data).validate_api() # type: ignore
+
+    user = extract_user(request)
+    await user.aset_password(ss.validated_data['password'])
+
+    await user.asave()
+
+    return ApiJsonResponse.make_success(msg="Password updated successfully")
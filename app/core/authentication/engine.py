@@ -1,5 +1,13 @@
-from typing import Any, Optional
+import time
+import threading
+from typing import Any, Callable, Iterable, Optional, TypeVar
 from functools import wraps
+from itertools import islice
+from collections import OrderedDict
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
 
     # AuthzGate,
 from auth_core import (
@@ -7,12 +15,19 @@ from auth_core import (
     AclAuthorizationPolicy
 )
 
+from app.utils import to_int
+from app.bootstrap.config import Config
 from app.exceptions import ApiException, ApiExceptionCollection
 from app.communication import ApiRequest
+from app.core.metrics.profiling import profiled_section
+from app.core.database.routing import REPLICA_SAFE_METHODS, PrimaryPins, replica_reads
+from app.core.throttling.throttles import Throttle, check_throttles
 from app.models.auth import AppUser
 
 from .keystore import KeyStore
 
+T = TypeVar('T')
+
 class ContextGenerator:
     def generate(self, request: Optional[ApiRequest] = None):
         """
@@ -33,20 +48,238 @@ class TR:
     Authenticated = 'sys.authncd'
 
 class SimpleTraitCollection(AgentTraitCollection):
+    __slots__ = ()
+
+    def trait_memo_key(self, user: Optional[AppUser]):
+        if user is None:
+            return 'anonymous'
+
+        # Traits of a user can only change when the user row is saved, which bumps `updated_at`
+        return (user.pk, user.updated_at)
+
     def get_effective_traits(self, user: Optional[AppUser]):
         if user is None:
-            return [TR.Everyone]
+            return (TR.Everyone,)
 
-        eff_traits = [
+        eff_traits = (
             TR.Everyone,
             TR.Authenticated
-        ]
+        )
 
         return eff_traits
 
 
+class PrincipalCache:
+    """
+    A bounded, thread safe TTL + LRU cache mapping API keys to the user they authenticate.
+
+    Only the column values of the user row are kept. Every hit builds a fresh `AppUser` instance
+    so that requests never share (and mutate) the same model object.
+
+    Saves only invalidate the entries of the process that made them. So that other processes do not keep accepting
+    a rotated key, or a deactivated or deleted user, entries last checked more than `check_after` seconds ago are
+    handed out along with a flag asking the caller to check `CHECK_FIELDS` against the database (see `confirm()`).
+    """
+
+    # Changed by every save (`updated_at`), and what decides whether the key is still accepted
+    CHECK_FIELDS = ('updated_at', 'current_api_key', 'is_active', 'is_deleted')
+
+    def __init__(self, max_size: int, ttl: float, check_after: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.check_after = check_after
+
+        # api_key -> (expires_at, user_pk, db_alias, row values, checked_at)
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        # user_pk -> api_key, used for invalidation by user
+        self._user_keys: dict[Any, str] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    @staticmethod
+    def _field_names() -> list[str]:
+        return [f.attname for f in AppUser._meta.concrete_fields]
+
+    def _drop(self, api_key: str):
+        entry = self._entries.pop(api_key, None)
+        if entry is not None and self._user_keys.get(entry[1]) == api_key:
+            del self._user_keys[entry[1]]
+
+    def get(self, api_key: str) -> tuple[Optional[AppUser], bool]:
+        """ The cached user of the key, if any, and whether it has to be checked (then confirmed) before use """
+        if not self.enabled:
+            return None, False
+
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+
+            now = time.monotonic()
+            if entry[0] < now:
+                self._drop(api_key)
+                self.evictions += 1
+                self.misses += 1
+                return None, False
+
+            self._entries.move_to_end(api_key)
+            self.hits += 1
+
+        _, _, db, values, checked_at = entry
+        return AppUser.from_db(db, self._field_names(), values), checked_at + self.check_after < now
+
+    @classmethod
+    def check_values(cls, user: AppUser) -> tuple:
+        return tuple(getattr(user, name) for name in cls.CHECK_FIELDS)
+
+    def confirm(self, api_key: str):
+        """ The entry of the key was checked to still match the database """
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is not None:
+                self._entries[api_key] = (*entry[:4], time.monotonic())
+
+    def put(self, api_key: str, user: AppUser):
+        if not self.enabled:
+            return
+
+        values = tuple(getattr(user, name) for name in self._field_names())
+        now = time.monotonic()
+        entry = (now + self.ttl, user.pk, user._state.db, values, now)
+
+        with self._lock:
+            # A user only ever has a single valid key, so drop any stale entry of the same user
+            old_key = self._user_keys.get(user.pk)
+            if old_key is not None and old_key != api_key:
+                self._drop(old_key)
+
+            self._entries[api_key] = entry
+            self._entries.move_to_end(api_key)
+            self._user_keys[user.pk] = api_key
+
+            while len(self._entries) > self.max_size:
+                _, (_, user_pk, _, _, _) = self._entries.popitem(last=False)
+                self._user_keys.pop(user_pk, None)
+                self.evictions += 1
+
+    def invalidate_user(self, user_pk: Any):
+        with self._lock:
+            api_key = self._user_keys.get(user_pk)
+            if api_key is not None:
+                self._drop(api_key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class MissedKeyCache:
+    """
+    A bounded, thread safe TTL + LRU set of the well formed API keys which recently matched no user (stale keys
+    of clients, scanners, ...), so that replaying them does not query the database every time.
+
+    Membership is exact, a false positive would lock a valid key out. Keys are discarded when issued.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # api_key -> expires_at
+        self._entries: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def __contains__(self, api_key: str) -> bool:
+        if not self.enabled:
+            return False
+
+        with self._lock:
+            expires_at = self._entries.get(api_key)
+            if expires_at is None:
+                return False
+
+            if expires_at < time.monotonic():
+                del self._entries[api_key]
+                self.evictions += 1
+                return False
+
+            self.hits += 1
+            return True
+
+    def add(self, api_key: str):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[api_key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(api_key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, api_key: str):
+        with self._lock:
+            self._entries.pop(api_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'evictions': self.evictions,
+            }
+
+
 class ApiPermissionGate:
     policy = AclAuthorizationPolicy()
+    principal_cache = PrincipalCache(
+        max_size=to_int(Config.get('auth.principal_cache.max_size'), 10000),
+        ttl=to_int(Config.get('auth.principal_cache.ttl'), 10),
+        check_after=to_int(Config.get('auth.principal_cache.check_after'), 2)
+    )
+    missed_keys = MissedKeyCache(
+        max_size=to_int(Config.get('auth.missed_key_cache.max_size'), 10000),
+        ttl=to_int(Config.get('auth.missed_key_cache.ttl'), 60)
+    )
+    # Prefixes of the keys of the users saved by this worker, loaded from the primary until the replica (if any) has
+    # caught up
+    primary_pins = PrimaryPins(
+        max_size=10000,
+        ttl=to_int(Config.get('db.replica.pin_seconds'), 10) if Config.get_bool('db.replica.enabled') else 0
+    )
     next_exception: Exception = ApiExceptionCollection.Forbidden.copy_with(msg="Permission Denied")
 
     invalid_key_exp = ApiExceptionCollection.Forbidden.copy_with(msg="Permission Denied: Invalid Key")
@@ -56,9 +289,19 @@ class ApiPermissionGate:
     # make sure it does not contain a whitespace
     _TOKEN_BEARER_PREFIX = 'Bearer'.strip()
 
-    def __init__(self, request):
-        self.user = self._load_user(request)
-        self._traits = SimpleTraitCollection(self.user) 
+    def __init__(self, request, related: tuple[str, ...] = ()):
+        self._init_with_user(self._load_user(request, related))
+
+    @classmethod
+    async def acreate(cls, request, related: tuple[str, ...] = ()) -> 'ApiPermissionGate':
+        """ Async counterpart of the constructor, loads the user using the async ORM interface """
+        gate = cls.__new__(cls)
+        gate._init_with_user(await gate._aload_user(request, related))
+        return gate
+
+    def _init_with_user(self, user: Optional[AppUser]):
+        self.user = user
+        self._traits = SimpleTraitCollection(self.user)
 
     def set_next_exception(self, exp: Exception):
         self.next_exception = exp
@@ -71,8 +314,8 @@ class ApiPermissionGate:
 
         return token
 
-    def _load_user(self, request) -> Optional[AppUser]:
-        """ Load and return the user object from database or return None if not authenticated""" 
+    def _extract_key(self, request) -> Optional[str]:
+        """ Return the API key of the request if it is present and well formed, otherwise None """
 
         api_key = self.get_token(request.META.get('HTTP_AUTHORIZATION', ''))
 
@@ -80,36 +323,225 @@ class ApiPermissionGate:
         if not api_key:
             return None
 
-        if not KeyStore.validate_format(api_key):
+        if KeyStore.deserialize_user(api_key) is None:
             self.set_next_exception(self.invalid_key_exp)
+            return None
+
+        return api_key
+
+    def _check_user(self, user: Optional[AppUser]) -> Optional[AppUser]:
+        if user is None or user.is_deleted == 1:
+            self.set_next_exception(self.user_not_found_exp)
+        elif user.is_active == 0:
+            self.set_next_exception(self.user_not_active_exp)
         else:
-            user = AppUser.objects.filter(current_api_key=api_key).first()
-            if user is None or user.is_deleted == 1:
-                self.set_next_exception(self.user_not_found_exp)
-            elif user.is_active == 0:
-                self.set_next_exception(self.user_not_active_exp)
-            else:
-                return user
+            return user
+
+        return None
+
+    @staticmethod
+    def _candidates(key, related: tuple[str, ...], using: Optional[str] = None) -> QuerySet:
+        # Prefixes are random but not unique, so there might (rarely) be more than one candidate
+        return AppUser.objects.using(using).select_related(*related).filter(api_key_prefix=key.prefix)
+
+    @staticmethod
+    def _match_user(key, candidates: QuerySet) -> Optional[AppUser]:
+        for candidate in candidates:
+            if KeyStore.matches(key, candidate.current_api_key): # type: ignore
+                return candidate
+        return None
 
+    @staticmethod
+    async def _amatch_user(key, candidates: QuerySet) -> Optional[AppUser]:
+        async for candidate in candidates:
+            if KeyStore.matches(key, candidate.current_api_key): # type: ignore
+                return candidate
         return None
 
+    @staticmethod
+    def _check_query(user: AppUser) -> QuerySet:
+        # The primary's row, a replica could still hold the one the entry was made from
+        return AppUser.objects.using(DEFAULT_DB_ALIAS).filter(pk=user.pk).values_list(*PrincipalCache.CHECK_FIELDS)
+
+    def _cached_user(self, api_key: str, always_check: bool = False) -> Optional[AppUser]:
+        """
+        The cached user of the key, checked against the database when it was not recently, or when `always_check`
+        is set. Requests which may write (see `REPLICA_SAFE_METHODS`) always check: saves only write the changed
+        columns, but bump `updated_at`, so a user older than its row would hide the changes made meanwhile by other
+        workers (e.g from the version of the profile cache entries)
+        """
+        user, needs_check = self.principal_cache.get(api_key)
+        if user is not None and (needs_check or always_check):
+            if self._check_query(user).first() != PrincipalCache.check_values(user):
+                self.principal_cache.invalidate_user(user.pk)
+                return None
+            self.principal_cache.confirm(api_key)
+
+        return user
+
+    async def _acached_user(self, api_key: str, always_check: bool = False) -> Optional[AppUser]:
+        user, needs_check = self.principal_cache.get(api_key)
+        if user is not None and (needs_check or always_check):
+            if await self._check_query(user).afirst() != PrincipalCache.check_values(user):
+                self.principal_cache.invalidate_user(user.pk)
+                return None
+            self.principal_cache.confirm(api_key)
+
+        return user
+
+    def _load_user(self, request, related: tuple[str, ...] = ()) -> Optional[AppUser]:
+        """
+        Load and return the user object from database or return None if not authenticated. The `related` objects
+        of the user are loaded along (with `select_related()`) when the user is not cached
+        """
+
+        api_key = self._extract_key(request)
+        if api_key is None:
+            return None
+
+        user = self._cached_user(api_key, always_check=request.method not in REPLICA_SAFE_METHODS)
+        if user is None and api_key not in self.missed_keys:
+            key = KeyStore.deserialize_user(api_key)
+
+            with replica_reads(request, pinned=key.prefix in self.primary_pins) as from_replica:
+                user = self._match_user(key, self._candidates(key, related))
+            if user is None and from_replica:
+                # The key may have been issued (e.g by a login) after the replica last caught up
+                user = self._match_user(key, self._candidates(key, related, DEFAULT_DB_ALIAS))
+
+            if user is None:
+                self.missed_keys.add(api_key)
+            else:
+                self.principal_cache.put(api_key, user)
+
+        return self._check_user(user)
+
+    async def _aload_user(self, request, related: tuple[str, ...] = ()) -> Optional[AppUser]:
+        """ Same as `_load_user()`, but without blocking the event loop """
+
+        api_key = self._extract_key(request)
+        if api_key is None:
+            return None
+
+        user = await self._acached_user(api_key, always_check=request.method not in REPLICA_SAFE_METHODS)
+        if user is None and api_key not in self.missed_keys:
+            key = KeyStore.deserialize_user(api_key)
+
+            with replica_reads(request, pinned=key.prefix in self.primary_pins) as from_replica:
+                user = await self._amatch_user(key, self._candidates(key, related))
+            if user is None and from_replica:
+                user = await self._amatch_user(key, self._candidates(key, related, DEFAULT_DB_ALIAS))
+
+            if user is None:
+                self.missed_keys.add(api_key)
+            else:
+                self.principal_cache.put(api_key, user)
+
+        return self._check_user(user)
+
     def force_deny_request(self):
         raise self.next_exception
 
     def require(self, perm, context):
         self.policy.permits(perm, context, self._traits) or self.force_deny_request()
 
+    def permits_many(self, perm, contexts: Iterable) -> list[bool]:
+        return self.policy.permits_many(perm, contexts, self._traits)
+
+    def filter_permitted(self, perm, objects: Iterable[T], context_of: Callable[[T], Any], chunk_size=2000) -> list[T]:
+        """
+        Return the objects (e.g rows of a listing) on which `perm` is granted, where `context_of` maps an object to
+        its ACL context. Objects are evaluated by chunks of `chunk_size`, querysets are streamed (with `iterator()`)
+        rather than cached as a whole, and only the permitted objects are kept.
+
+        Objects sharing a context (the same object returned by `context_of`) only get evaluated once per chunk, so
+        returning shared context instances wherever possible keeps this cheap even for large listings.
+        """
+        if isinstance(objects, QuerySet):
+            objects = objects.iterator(chunk_size=chunk_size)
+
+        permitted = []
+        remaining = iter(objects)
+        while chunk := list(islice(remaining, chunk_size)):
+            decisions = self.permits_many(perm, [context_of(obj) for obj in chunk])
+            permitted.extend(obj for obj, allowed in zip(chunk, decisions) if allowed)
+
+        return permitted
+
+
+def issue_api_key(user: AppUser) -> str:
+    """
+    Assign a fresh api key to the user and return its serialized form. Only the key's hash gets stored, so this
+    is the only chance to hand the key over to the client. The caller is responsible for saving the user
+    """
+    user_key = KeyStore.generate_fresh()
+
+    user.api_key_prefix = user_key.prefix
+    user.current_api_key = KeyStore.hash_digest(user_key)
+
+    serialized_key = KeyStore.serialize_user(user_key)
+    # In case it was (somehow) tried before being issued
+    ApiPermissionGate.missed_keys.discard(serialized_key)
 
-def require(perm: str, context_gen: ContextGenerator):
+    return serialized_key
+
+
+def require(
+    perm: str,
+    context_gen: ContextGenerator,
+    throttles: tuple[Throttle, ...] = (),
+    related: tuple[str, ...] = ()
+):
+    """
+    Deny the requests not granted `perm` (in the context made by `context_gen`). The throttles are checked first,
+    so that throttled requests never get to look their API key up. Views using related objects of the user (e.g
+    its `profile_picture`) declare them as `related`, to have them loaded in the same query as the user
+    """
     def wrapper(func):
         @wraps(func)
         def _f(request, *args, **kwargs):
-            gate = ApiPermissionGate(request)
-            gate.require(perm, context_gen.generate(request))
+            check_throttles(request, throttles)
+            with profiled_section('permission_gate'):
+                gate = ApiPermissionGate(request, related)
+                gate.require(perm, context_gen.generate(request))
             request.user = gate.user
+            request.permission_gate = gate
             return func(request, *args, **kwargs)
 
         return _f
 
     return wrapper
 
+
+def arequire(
+    perm: str,
+    context_gen: ContextGenerator,
+    throttles: tuple[Throttle, ...] = (),
+    related: tuple[str, ...] = ()
+):
+    """ Same as `require()`, but for async views """
+    def wrapper(func):
+        @wraps(func)
+        async def _f(request, *args, **kwargs):
+            check_throttles(request, throttles)
+            with profiled_section('permission_gate'):
+                gate = await ApiPermissionGate.acreate(request, related)
+                gate.require(perm, context_gen.generate(request))
+            request.user = gate.user
+            request.permission_gate = gate
+            return await func(request, *args, **kwargs)
+
+        return _f
+
+    return wrapper
+
+
+# Any write to a user row may change its key, status or password, so drop whatever the cache holds for it.
+# Note that bulk `QuerySet.update()` calls bypass these signals and are only picked up once the TTL runs out.
+def _invalidate_principal(sender, instance: AppUser, **kwargs):
+    ApiPermissionGate.principal_cache.invalidate_user(instance.pk)
+    if instance.api_key_prefix:
+        ApiPermissionGate.primary_pins.pin(instance.api_key_prefix)
+
+post_save.connect(_invalidate_principal, sender=AppUser, dispatch_uid='engine.invalidate_principal.save')
+post_delete.connect(_invalidate_principal, sender=AppUser, dispatch_uid='engine.invalidate_principal.delete')
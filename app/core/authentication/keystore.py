@@ -1,7 +1,12 @@
+import re
+import hmac
+import base64
+import hashlib
 import secrets
+from typing import Optional
 from collections import namedtuple
 
-from app.utils.passlib_hash import pbkdf2_sha256
+from app.bootstrap.config import Config
 
 
 # Helper class for managing API keys
@@ -13,6 +18,14 @@ class KeyStore:
     API_KEY_APP_PREFIX = 'kp.'
     API_KEY_APP_PREFIX_LENGTH = len(API_KEY_APP_PREFIX)
 
+    # {prefix}.{digest}{checksum}, with the lengths of `token_urlsafe(6)`, `token_urlsafe(32)` and of a 4 bytes
+    # checksum (base64url, without padding)
+    _KEY_PATTERN = re.compile(r'kp\.([A-Za-z0-9_-]{8})\.([A-Za-z0-9_-]{43})([A-Za-z0-9_-]{6})?')
+
+    # Keys issued before keys got a checksum. Once they have all been rotated (by logging in), disabling this rejects
+    # every key not issued by the app without going to the database
+    ACCEPT_UNCHECKED_KEYS = Config.get_bool('auth.accept_unchecked_keys')
+
     GeneratedAPIKey = namedtuple('GeneratedAPIKey', ['prefix', 'digest'])
 
     @classmethod
@@ -27,39 +40,70 @@ class KeyStore:
     def serialize_user(cls, key: GeneratedAPIKey) -> str:
         """ Serialzes the key, which can then be sent to the user"""
 
-        # format := {2-byte app id}.{6-byte prefix}.{32-byte api key}
+        # format := {2-byte app id}.{6-byte prefix}.{32-byte api key}{4-byte checksum}
         #
-        # In the future we might decide to store in db the hash of the key instead of *the key* itself. In that
-        # case we can use this `prefix` for manual key identification (e.g if a client has multiple keys and need to pick
-        # the correct one, maybe based on the key's scope). The prefix will be stored unhased while the rest of the key is hashed
+        # Only the hash of the key is stored in db (see `hash_digest()`). The `prefix` is stored unhashed and is used
+        # to look the key up, while the rest of the key is hashed. The checksum only serves to tell the keys issued
+        # by the app from anything else, without a lookup
         return ''.join([
             cls.API_KEY_APP_PREFIX,
             key.prefix,
             '.',
             key.digest,
+            cls._checksum(key.prefix, key.digest),
         ]);
 
+    _checksum_key: Optional[bytes] = None
+
     @classmethod
-    def validate_format(cls, user_key: str) -> bool:
-        # Enough for now
-        return user_key.startswith(cls.API_KEY_APP_PREFIX)
+    def _checksum(cls, prefix: str, digest: str) -> str:
+        # Keyed, so that keys can not be forged without the secret
+        if cls._checksum_key is None:
+            cls._checksum_key = hashlib.sha256(cls._hash_secret()).digest()
 
+        checksum = hashlib.blake2b(f'{prefix}.{digest}'.encode(), digest_size=4, key=cls._checksum_key).digest()
+        return base64.urlsafe_b64encode(checksum).rstrip(b'=').decode()
 
-    # @classmethod
-    # def _hash_impl(cls, serialzed) -> str:
-    #     return pbkdf2_sha256.using(
-    #         rounds=1000,
-    #         salt_size=12
-    #     ).hash(serialzed)
+    @classmethod
+    def validate_format(cls, user_key: str) -> bool:
+        return cls.deserialize_user(user_key) is not None
 
-    # @classmethod
-    # def hash_raw(cls, key: GeneratedAPIKey) -> str:
-    #     return cls._hash_impl(cls.serialize_user(key))
+    @classmethod
+    def deserialize_user(cls, user_key: str, accept_unchecked: Optional[bool] = None) -> Optional[GeneratedAPIKey]:
+        """
+        Split a key sent by the user into its parts, or return None if it is not well formed or its checksum does
+        not match. `accept_unchecked` (defaults to `auth.accept_unchecked_keys`) lets keys without a checksum through
+        """
+        match = cls._KEY_PATTERN.fullmatch(user_key)
+        if match is None:
+            return None
+
+        prefix, digest, checksum = match.groups()
+        if checksum is None:
+            if not (cls.ACCEPT_UNCHECKED_KEYS if accept_unchecked is None else accept_unchecked):
+                return None
+        elif not hmac.compare_digest(checksum, cls._checksum(prefix, digest)):
+            return None
+
+        return cls.GeneratedAPIKey(prefix=prefix, digest=digest)
 
-    # @classmethod
-    # def hash_user(cls, user_key: str) -> str:
-    #     if not user_key.startswith(cls.API_KEY_APP_PREFIX):
-    #         raise KeyStore.InvalidKeyError()
+    @classmethod
+    def _hash_secret(cls) -> bytes:
+        # A dedicated secret allows rotating the app's secret key without invalidating every issued api key
+        secret = Config.get('auth.api_key_secret') or Config.get('main.secret_key')
+        return str(secret).encode()
 
-    #     return cls._hash_impl(user_key)
+    @classmethod
+    def hash_digest(cls, key: GeneratedAPIKey) -> str:
+        """
+        Returns the hash of the secret part of the key, which is what gets stored in db.
 
+        The digest is 32 random bytes, so a single keyed hash (HMAC-SHA256) is enough here. A slow password hash
+        would only add latency to every authenticated request.
+        """
+        return hmac.new(cls._hash_secret(), key.digest.encode(), hashlib.sha256).hexdigest()
+
+    @classmethod
+    def matches(cls, key: GeneratedAPIKey, stored_hash: str) -> bool:
+        """ Constant time check of the key against a hash generated by `hash_digest()` """
+        return hmac.compare_digest(cls.hash_digest(key), stored_hash)
@@ -0,0 +1,147 @@
+import time
+import threading
+from typing import Any, Optional
+from collections import OrderedDict
+
+from django.db.models.signals import post_save, post_delete
+
+from app.utils import to_int
+from app.bootstrap.config import Config
+from app.models.auth import AppUser, ProfilePicture
+
+
+class ProfileCache:
+    """
+    A bounded, thread safe TTL + LRU cache of the rendered profile (the whole response body) of users.
+
+    Entries are only served for the same version of the user row (`updated_at`, which also covers changing the
+    picture) they were rendered from, so a user loaded from the database after a change never gets an older profile.
+    Saves of the user or of its picture drop the entry right away. The version is made of what the user row holds:
+    the picture relation may not be loaded, and must not be queried here.
+
+    Each process has its own cache, which the saves made by other processes do not drop. Changes of the user show as
+    soon as the user loaded by the request does (the principal cache checks its entries every few seconds), while
+    thumbnails generated by another process only show once the entry expires.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # user_pk -> (expires_at, version (see `_version()`), body)
+        self._entries: OrderedDict[Any, tuple] = OrderedDict()
+        # picture_pk -> pks of the users whose entry shows the picture
+        self._picture_users: dict[Any, set] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    @staticmethod
+    def _version(user: AppUser) -> tuple:
+        """ (updated_at, picture_pk), both read from the row """
+        return (user.updated_at, user.profile_picture_id) # type: ignore
+
+    def _drop(self, user_pk: Any):
+        entry = self._entries.pop(user_pk, None)
+        picture_pk = entry[1][1] if entry is not None else None
+        if picture_pk is not None:
+            users = self._picture_users.get(picture_pk)
+            if users is not None:
+                users.discard(user_pk)
+                if not users:
+                    del self._picture_users[picture_pk]
+
+    def get(self, user: AppUser) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(user.pk)
+            if entry is None or entry[1] != self._version(user):
+                self.misses += 1
+                return None
+
+            if entry[0] < time.monotonic():
+                self._drop(user.pk)
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user.pk)
+            self.hits += 1
+
+        return entry[2]
+
+    def put(self, user: AppUser, body: bytes):
+        if not self.enabled:
+            return
+
+        version = self._version(user)
+        picture_pk = version[1]
+        entry = (time.monotonic() + self.ttl, version, body)
+
+        with self._lock:
+            self._drop(user.pk)
+            self._entries[user.pk] = entry
+            if picture_pk is not None:
+                self._picture_users.setdefault(picture_pk, set()).add(user.pk)
+
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_pk: Any):
+        with self._lock:
+            if user_pk in self._entries:
+                self._drop(user_pk)
+                self.invalidations += 1
+
+    def invalidate_picture(self, picture_pk: Any):
+        with self._lock:
+            for user_pk in list(self._picture_users.get(picture_pk, ())):
+                self._drop(user_pk)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._picture_users.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+profile_cache = ProfileCache(
+    max_size=to_int(Config.get('auth.profile_cache.max_size'), 10000),
+    ttl=to_int(Config.get('auth.profile_cache.ttl'), 60)
+)
+
+
+# Profile and credential updates, picture changes, etc all save the user row. Pictures get saved when their
+# thumbnails are generated, which adds to their urls
+def _invalidate_user_profile(sender, instance: AppUser, **kwargs):
+    profile_cache.invalidate_user(instance.pk)
+
+def _invalidate_picture_profiles(sender, instance: ProfilePicture, **kwargs):
+    profile_cache.invalidate_picture(instance.pk)
+
+post_save.connect(_invalidate_user_profile, sender=AppUser, dispatch_uid='profile_cache.invalidate_user.save')
+post_delete.connect(_invalidate_user_profile, sender=AppUser, dispatch_uid='profile_cache.invalidate_user.delete')
+post_save.connect(_invalidate_picture_profiles, sender=ProfilePicture, dispatch_uid='profile_cache.invalidate_pic.save')
+post_delete.connect(
+    _invalidate_picture_profiles, sender=ProfilePicture, dispatch_uid='profile_cache.invalidate_pic.delete'
+)
@@ -0,0 +1,248 @@
+# Bulk creation of users, e.g to onboard the users of a new tenant (see the `provision_users` command).
+#
+# Rows go through the same validation as signups, but everything else is done per batch of rows: uniqueness and
+# picture handles are checked with a query per batch, passwords are hashed in parallel by a process pool and the
+# users are inserted with `bulk_create()`, one transaction per batch.
+
+import os
+import csv
+import json
+import multiprocessing
+from itertools import islice, repeat
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, IO, Iterable, Iterator, Optional
+
+from django.db.models import Q
+from django.db import transaction, IntegrityError
+
+from app.models.auth import AppUser, ProfilePicture
+from app.utils.passlib_hash import hash_password, hashing_executor
+
+from .engine import issue_api_key
+from .serializers import CreateUserSerializer, PROFILE_FIELDS, USER_UNIQUE_FIELDS, find_taken_user_fields
+
+
+# Outcome of a row: the api key of the created user, or the errors (by field, same as the API) of a rejected row
+ProvisionResult = namedtuple('ProvisionResult', ['line', 'username', 'api_key', 'errors'])
+
+
+class ProvisionUserSerializer(CreateUserSerializer):
+    # Uniqueness is checked for whole batches, see `UserProvisioner`
+    def find_taken_fields(self, data):
+        return {}
+
+
+_CSV_NULLABLE_COLUMNS = ('profile_pic_handle',)
+
+
+def read_user_rows(file: IO[str], fmt: str) -> Iterator[tuple[int, dict[str, Any]]]:
+    """
+    Stream the (line number, row) of a CSV (with a header of the signup fields) or JSON lines file. Rows that can
+    not be parsed come as None
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            # CSV has no null, an empty cell of a nullable column means no value
+            for column in _CSV_NULLABLE_COLUMNS:
+                if row.get(column) == '':
+                    row[column] = None
+            yield reader.line_num, row
+        return
+
+    if fmt == 'jsonl':
+        for (number, line) in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, (row if isinstance(row, dict) else None)
+        return
+
+    raise ValueError(f"Unknown users file format '{fmt}'")
+
+
+def _raw_value(row: dict[str, Any], field: str) -> Optional[str]:
+    # As the serializer would have cleaned it (its char fields trim whitespace)
+    value = row.get(field)
+    return value.strip() if isinstance(value, str) else None
+
+
+_malformed_row_errors = {'non_field_errors': ["Malformed row"]}
+_unknown_picture_errors = {'profile_pic_handle': ["Unknown profile picture"]}
+
+
+class UserProvisioner:
+    """
+    Create users in batches. `workers` processes hash the passwords (all the CPUs by default, 0 hashes inline).
+
+    Usernames and emails are checked against the database and against the previous rows, so a file can be
+    imported again after a failure: the rows already imported are reported as taken. The first row of a username or
+    email claims it even when that row is rejected, so that the later duplicates are rejected as well (and the file
+    gives the same outcome once the first row is fixed).
+    """
+
+    def __init__(self, batch_size: int = 1000, workers: Optional[int] = None):
+        self.batch_size = batch_size
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+
+        self._seen: dict[str, set] = {field: set() for field in USER_UNIQUE_FIELDS}
+
+    def provision(self, rows: Iterable[tuple[int, Optional[dict[str, Any]]]]) -> Iterator[ProvisionResult]:
+        """ Create the users of the (line number, row) pairs, yield the result of each row in order """
+        pool = None
+        if self.workers > 0:
+            # Same as the request time hashing pool, the parent might be multithreaded
+            pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+        try:
+            rows = iter(rows)
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                yield from self._provision_batch(batch, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def _validate(self, batch) -> tuple[dict[int, dict], dict[int, dict]]:
+        """ Validated data and errors, by index in the batch """
+        valid = {}
+        errors = {}
+
+        for (index, (_, row)) in enumerate(batch):
+            if row is None:
+                errors[index] = _malformed_row_errors
+                continue
+
+            ss = ProvisionUserSerializer(data=row)
+            is_valid = ss.is_valid()
+            values = ss.validated_data if is_valid else {field: _raw_value(row, field) for field in USER_UNIQUE_FIELDS}
+
+            # Taken by a previous row
+            taken = {
+                field: [message] for (field, message) in USER_UNIQUE_FIELDS.items()
+                if values[field] in self._seen[field]
+            }
+            for field in USER_UNIQUE_FIELDS:
+                if values[field] is not None:
+                    self._seen[field].add(values[field])
+
+            if not is_valid:
+                errors[index] = ss.errors
+            elif taken:
+                errors[index] = taken
+            else:
+                valid[index] = ss.validated_data
+
+        return valid, errors
+
+    @staticmethod
+    def _find_taken(valid: dict[int, dict]) -> dict[int, dict]:
+        """ Errors of the rows whose username or email is taken in the database, with a single query """
+        values = {field: {data[field] for data in valid.values()} for field in USER_UNIQUE_FIELDS}
+
+        condition = Q()
+        for (field, field_values) in values.items():
+            condition |= Q(**{f'{field}__in': field_values})
+
+        taken = {field: set() for field in USER_UNIQUE_FIELDS}
+        for row in AppUser.objects.filter(condition).values_list(*USER_UNIQUE_FIELDS):
+            for (field, value) in zip(USER_UNIQUE_FIELDS, row):
+                taken[field].add(value)
+
+        errors = {}
+        for (index, data) in valid.items():
+            row_errors = {
+                field: [message] for (field, message) in USER_UNIQUE_FIELDS.items() if data[field] in taken[field]
+            }
+            if row_errors:
+                errors[index] = row_errors
+
+        return errors
+
+    @staticmethod
+    def _find_pictures(valid: dict[int, dict]) -> dict[str, ProfilePicture]:
+        handles = {data['profile_pic_handle'] for data in valid.values() if data.get('profile_pic_handle')}
+        if not handles:
+            return {}
+
+        return {picture.name: picture for picture in ProfilePicture.objects.filter(name__in=handles)}
+
+    def _hash_passwords(self, passwords: list[str], pool) -> list[str]:
+        # Same policy as the signups, calibrated once
+        policy = hashing_executor.policy()
+        if pool is None:
+            return [hash_password(password, policy) for password in passwords]
+
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(pool.map(hash_password, passwords, repeat(policy), chunksize=chunksize))
+
+    @staticmethod
+    def _insert(users: dict[int, AppUser]) -> dict[int, dict]:
+        """ Insert the users, return the errors of the ones which could not be """
+        try:
+            with transaction.atomic():
+                AppUser.objects.bulk_create(users.values())
+            return {}
+        except IntegrityError:
+            # Some row got taken meanwhile, insert one by one to tell which
+            pass
+
+        errors = {}
+        with transaction.atomic():
+            for (index, user) in users.items():
+                try:
+                    with transaction.atomic():
+                        user.save(force_insert=True)
+                except IntegrityError:
+                    user.pk = None
+                    errors[index] = find_taken_user_fields(
+                        {field: getattr(user, field) for field in USER_UNIQUE_FIELDS}
+                    ) or {'non_field_errors': ["Could not be created"]}
+
+        return errors
+
+    def _provision_batch(self, batch, pool) -> Iterator[ProvisionResult]:
+        valid, errors = self._validate(batch)
+
+        if valid:
+            errors.update(self._find_taken(valid))
+            pictures = self._find_pictures(valid)
+
+            for (index, data) in valid.items():
+                handle = data.get('profile_pic_handle')
+                if handle and handle not in pictures and index not in errors:
+                    errors[index] = _unknown_picture_errors
+
+            valid = {index: data for (index, data) in valid.items() if index not in errors}
+
+        users = {}
+        api_keys = {}
+
+        if valid:
+            password_hashes = self._hash_passwords([data['password'] for data in valid.values()], pool)
+
+            for ((index, data), password_hash) in zip(valid.items(), password_hashes):
+                user = AppUser(username=data['username'], email=data['email'], password_hash=password_hash)
+                for field in PROFILE_FIELDS:
+                    setattr(user, field, data[field])
+
+                handle = data.get('profile_pic_handle')
+                user.profile_picture = pictures[handle] if handle else None # type: ignore
+
+                api_keys[index] = issue_api_key(user)
+                users[index] = user
+
+            errors.update(self._insert(users))
+
+        for (index, (line, row)) in enumerate(batch):
+            username = row.get('username') if row is not None else None
+            if index in errors:
+                yield ProvisionResult(line=line, username=username, api_key=None, errors=errors[index])
+            else:
+                yield ProvisionResult(line=line, username=username, api_key=api_keys[index], errors=None)
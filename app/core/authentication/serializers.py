@@ -1,12 +1,17 @@
 import re
+from typing import Any, Optional
 
+from django.db.models import Q
+from django.db import IntegrityError
+from asgiref.sync import sync_to_async
 from rest_framework import serializers as s
+from rest_framework.fields import empty
 from rest_framework.exceptions import ValidationError
 
 
-from app.utils.qs import qs_exists, qs_filter
-from app.exceptions import ApiExceptionCollection
+from app.exceptions import ApiException, ApiExceptionCollection
 from app.models.auth import AppUser
+from app.core.metrics.profiling import profiled_section
 
 
 class EmailValidator:
@@ -27,41 +32,107 @@ class EmailValidator:
         if not re.fullmatch(self.EMAIL_REGEX, value):
             raise ValidationError("Invalid email format", code='invalid_email')
 
-        
 
-class UniqueFieldValidator:
-    _s_message = "This field must be unique."
-    _s_message_required = "This field must be unique and non-null"
+# Unique fields of `AppUser` -> error reported when taken
+USER_UNIQUE_FIELDS = {
+    'username': "Username already taken",
+    'email': "Email already taken",
+}
 
-    def __init__(self, queryset, message=None, model_field=None, required=True):
-        self.queryset = queryset
-        self.message = message
-        self.model_field = model_field
-        self.required = required
 
-    def __call__(self, value):
-        if self.required and value is None:
-            raise ValidationError(
-                self.message or self._s_message_required, code='create_unique_null')
+def find_taken_user_fields(values: dict[str, Any], exclude_pk: Optional[Any] = None) -> dict[str, list[str]]:
+    """
+    Errors (by field) of the unique user fields whose given value is taken by another user. All the fields are
+    checked at once, with a single query
+    """
+    values = {field: value for (field, value) in values.items() if value is not None}
+    if not values:
+        return {}
+
+    condition = Q()
+    for (field, value) in values.items():
+        condition |= Q(**{field: value})
+
+    queryset = AppUser.objects.filter(condition)
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+
+    errors = {}
+    # Each field can collide with a single row at most
+    for row in queryset.values_list(*values)[:len(values)]:
+        for (field, taken) in zip(values, row):
+            if taken == values[field]:
+                errors[field] = [USER_UNIQUE_FIELDS[field]]
+
+    return errors
+
 
-        model_field = self.model_field or "id"
+def invalid_form_exception(errors) -> ApiException:
+    return ApiExceptionCollection.UnprocessableEntity.copy_with(msg="Invalid form values", data=errors)
 
-        if qs_exists(qs_filter(self.queryset, **{ model_field: value })):
-            raise ValidationError(
-                self.message or self._s_message, code='create_unique')
+
+def taken_user_fields_exception(user: AppUser, error: IntegrityError) -> Exception:
+    """
+    What to raise on an `IntegrityError` saving the user: the same 422 as failed validation when a unique field got
+    taken since the user was validated, otherwise the error itself
+    """
+    errors = find_taken_user_fields({field: getattr(user, field) for field in USER_UNIQUE_FIELDS}, user.pk)
+    return invalid_form_exception(errors) if errors else error
+
+
+async def ataken_user_fields_exception(user: AppUser, error: IntegrityError) -> Exception:
+    return await sync_to_async(taken_user_fields_exception)(user, error)
 
 
 class ApiSerializer(s.Serializer):
     def validate_api(self):
         """ Raise ApiException on failed validation """
-        if not self.is_valid():
-            raise ApiExceptionCollection.UnprocessableEntity.copy_with(
-                msg="Invalid form values",
-                data=self.errors
-            )
+        with profiled_section('serializer_validation'):
+            valid = self.is_valid()
+
+        if not valid:
+            raise invalid_form_exception(self.errors)
         return self
 
 
+class TakenUserFieldsMixin:
+    """
+    Rejects the unique user fields whose value is taken (see `find_taken_fields()`). When other fields are invalid,
+    the taken ones are still reported along with them, in the same 422
+    """
+
+    def find_taken_fields(self, data: dict[str, Any]) -> dict[str, list[str]]:
+        raise NotImplementedError()
+
+    def to_internal_value(self, data):
+        try:
+            return super().to_internal_value(data)
+        except ValidationError as error:
+            if not isinstance(error.detail, dict) or not hasattr(data, 'get'):
+                raise
+
+            valid = {}
+            for field in USER_UNIQUE_FIELDS:
+                if field in error.detail or field not in self.fields:
+                    continue
+                value = self.fields[field].get_value(data)
+                if value is not empty:
+                    # Valid already, this only normalizes it
+                    valid[field] = self.fields[field].run_validation(value)
+
+            taken = self.find_taken_fields(valid)
+            if not taken:
+                raise
+            raise ValidationError({**error.detail, **taken}, code='create_unique')
+
+    def validate(self, data):
+        errors = self.find_taken_fields(data)
+        if errors:
+            raise ValidationError(errors, code='create_unique')
+
+        return data
+
+
 class UserProfileSerializer(ApiSerializer):
     first_name = s.CharField(max_length=250)
     last_name = s.CharField(max_length=250)
@@ -76,26 +147,29 @@ class UserProfileSerializer(ApiSerializer):
     profile_pic_handle = s.CharField(required=False, allow_null=True)
 
 
-class CreateUserSerializer(UserProfileSerializer):
-    username = s.CharField(
-        max_length=250,
-        validators=[UniqueFieldValidator(
-            message="Username already taken",
-            queryset=AppUser.objects.all(),
-            model_field="username"
-        )]
-    )
-    email = s.CharField(
-        max_length=250,
-        validators=[
-            EmailValidator(),
-            UniqueFieldValidator(message="Email already taken", queryset=AppUser.objects.all(), model_field="email")
-        ]
-    )
+# Fields of `UserProfileSerializer` stored as is on the user
+PROFILE_FIELDS = (
+    'first_name',
+    'last_name',
+    'phone_number',
+    'post_code',
+    'address_line_1',
+    'address_line_2',
+    'age',
+    'about_me',
+)
+
+
+class CreateUserSerializer(TakenUserFieldsMixin, UserProfileSerializer):
+    username = s.CharField(max_length=250)
+    email = s.CharField(max_length=250, validators=[EmailValidator()])
     password = s.CharField(min_length=3)
 
+    def find_taken_fields(self, data):
+        return find_taken_user_fields({'username': data.get('username'), 'email': data.get('email')})
+
 
-class UpdateUserCredSerializer(ApiSerializer):
+class UpdateUserCredSerializer(TakenUserFieldsMixin, ApiSerializer):
 
     def __init__(self, user: AppUser, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -104,25 +178,14 @@ class UpdateUserCredSerializer(ApiSerializer):
     username = s.CharField(max_length=250, allow_null=True)
     email = s.CharField(max_length=250, validators=[EmailValidator(required=False)], allow_null=True)
 
-    def validate(self, data):
+    def find_taken_fields(self, data):
         username = data.get('username', None)
         email = data.get('email', None)
 
-        if username is not None and username != self.user.username:
-            UniqueFieldValidator(
-                message="Username already taken",
-                queryset=AppUser.objects.all(),
-                model_field="username"
-            )(username)
-
-        if email is not None and email != self.user.email:
-            UniqueFieldValidator(
-                message="Email already taken",
-                queryset=AppUser.objects.all(),
-                model_field="email"
-            )(email)
-
-        return data
+        return find_taken_user_fields({
+            'username': username if username != self.user.username else None,
+            'email': email if email != self.user.email else None,
+        }, exclude_pk=self.user.pk)
 
 
 class LoginSerializer(ApiSerializer):
@@ -130,12 +193,6 @@ class LoginSerializer(ApiSerializer):
     password = s.CharField()
 
 
-class UserProfileView(UserProfileSerializer):
-    username = s.CharField()
-    email = s.CharField()
-    profile_pic_location = s.CharField()
-
-
 class UpdatePasswordSerializer(ApiSerializer):
     password = s.CharField(min_length=3)
 
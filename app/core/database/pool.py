@@ -0,0 +1,152 @@
+# In-process pool of database connections, shared by the threads of a server worker.
+#
+# With a pool, django "closes" the connection of a thread at the end of each request (`CONN_MAX_AGE = 0`), which
+# hands it back to the pool instead, so that a worker running many threads holds as many connections as it has
+# requests in flight rather than one per thread. See the `[db.pool]` section of config/app.toml.
+
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Optional
+
+from app.exceptions import ApiExceptionCollection
+
+
+class ConnectionPool:
+    """
+    A bounded, thread safe pool of DB-API connections. `acquire()` waits up to `timeout` seconds for a connection
+    when `max_size` of them are in use, then fails with a 503. Idle connections are closed after `max_idle` seconds.
+    """
+
+    exhausted_exception = ApiExceptionCollection.ServiceUnavailable.copy_with(msg="Server is busy. Try again later")
+
+    def __init__(self, max_size: int, timeout: float, max_idle: float):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+
+        # (connection, released_at), the most recently released last
+        self._idle: deque[tuple[Any, float]] = deque()
+        # Connections open, idle or in use
+        self._size = 0
+        self._cond = threading.Condition()
+
+        self.acquired = 0
+        self.opened = 0
+        self.waits = 0
+        self.timeouts = 0
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self, connect: Callable[[], Any], check: Optional[Callable[[Any], bool]] = None):
+        """
+        Take an idle connection (the most recently used, which is the likeliest to still work), or open one with
+        `connect()`. Idle connections failing `check` are dropped
+        """
+        deadline = time.monotonic() + self.timeout
+
+        with self._cond:
+            while True:
+                conn = None
+                now = time.monotonic()
+
+                while self._idle:
+                    (candidate, released_at) = self._idle.pop()
+                    if now - released_at < self.max_idle:
+                        conn = candidate
+                        break
+                    self._size -= 1
+                    self._close_quietly(candidate)
+
+                if conn is not None:
+                    break
+
+                if self._size < self.max_size:
+                    # Opened outside of the lock
+                    self._size += 1
+                    break
+
+                self.waits += 1
+                if not self._cond.wait(deadline - now) and time.monotonic() >= deadline:
+                    self.timeouts += 1
+                    raise self.exhausted_exception
+
+            self.acquired += 1
+
+        if conn is not None:
+            if check is None or check(conn):
+                return conn
+            self.release(conn, reusable=False)
+            return self.acquire(connect, check)
+
+        try:
+            conn = connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self.opened += 1
+        return conn
+
+    def release(self, conn, reusable: bool = True):
+        """ Hand back a connection taken with `acquire()`, closing it when it is not `reusable` """
+        with self._cond:
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+        if not reusable:
+            self._close_quietly(conn)
+
+    def close_all(self):
+        """ Close the idle connections, the ones in use are closed when released """
+        with self._cond:
+            idle = [conn for (conn, _) in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'acquired': self.acquired,
+                'opened': self.opened,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+            }
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(alias: str, options: Optional[dict[str, Any]]) -> Optional[ConnectionPool]:
+    """ The pool of the connections of a database alias, None when `options` (its `POOL` setting) is not set """
+    if not options:
+        return None
+
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(
+                    max_size=options['max_size'],
+                    timeout=options['timeout'],
+                    max_idle=options['max_idle'],
+                )
+
+    return pool
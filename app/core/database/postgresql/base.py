@@ -0,0 +1,49 @@
+# PostgreSQL backend, selected with `db.engine = 'postgres'`. Same as django's backend, except that when the
+# database has a `POOL` setting its connections are taken from, and given back to, an in-process pool (see
+# app/core/database/pool.py) instead of being opened and closed.
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from app.core.database.pool import pool_for
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _pool(self):
+        return pool_for(self.alias, self.settings_dict.get('POOL'))
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        # Only new connections are checked by django, pooled ones are checked when handed out
+        check = self._is_connection_usable if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+        return pool.acquire(lambda: base.DatabaseWrapper.get_new_connection(self, conn_params), check)
+
+    @staticmethod
+    def _is_connection_usable(conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except base.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        pool = self._pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        conn = self.connection
+        # Closed from within an atomic block, django may still use it until the block exits
+        reusable = not conn.closed and not self.in_atomic_block
+        if reusable and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except base.Database.Error:
+                reusable = False
+
+        with self.wrap_database_errors:
+            pool.release(conn, reusable)
@@ -0,0 +1,128 @@
+# Routing of reads to the read replica (the `replica` database, see the `[db.replica]` section of config/app.toml).
+#
+# Nothing is read from the replica unless asked for with `replica_reads()`, which the permission gate does to load
+# the user of GET requests (e.g `GET /user/profile/`). Everything else, and every read following a write of the
+# same request, goes to the primary: a replica lags behind, and a request must see its own writes.
+
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Hashable, Iterator, Optional
+
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpRequest
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Methods of the requests which may read from the replica. The others may write what they read, which must not be
+# older than what the primary holds
+REPLICA_SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+
+class _RequestRouting:
+    __slots__ = ('replica_reads', 'wrote')
+
+    def __init__(self):
+        self.replica_reads = False
+        self.wrote = False
+
+
+# Mutated rather than replaced, so that the ORM calls an async view runs in other threads update it too
+_request_routing: ContextVar[Optional[_RequestRouting]] = ContextVar('request_routing', default=None)
+
+
+def start_request_routing():
+    _request_routing.set(_RequestRouting())
+
+
+def stop_request_routing():
+    _request_routing.set(None)
+
+
+def reading_replica() -> bool:
+    routing = _request_routing.get()
+    return routing is not None and routing.replica_reads and not routing.wrote
+
+
+class PrimaryPins:
+    """
+    A bounded, thread safe set of keys (e.g of rows) expiring after `ttl` seconds. Rows written by this process are
+    pinned for longer than the replication lag, their reads go to the primary in the meantime
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # key -> expires_at, the oldest first
+        self._entries: dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def pin(self, key: Hashable):
+        if self.ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = time.monotonic() + self.ttl
+
+            while len(self._entries) > self.max_size:
+                del self._entries[next(iter(self._entries))]
+
+    def __contains__(self, key: Hashable) -> bool:
+        if not self._entries:
+            return False
+
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False
+
+            return True
+
+
+@contextmanager
+def replica_reads(request: HttpRequest, pinned: bool = False) -> Iterator[bool]:
+    """
+    Read from the replica within the block, if the request is a safe one (see `REPLICA_SAFE_METHODS`) and neither
+    it wrote before nor the data is `pinned`. Yields whether reads do go to the replica
+    """
+    routing = _request_routing.get()
+    if routing is None or routing.replica_reads or pinned or request.method not in REPLICA_SAFE_METHODS:
+        yield reading_replica()
+        return
+
+    routing.replica_reads = True
+    try:
+        yield reading_replica()
+    finally:
+        routing.replica_reads = False
+
+
+class ReplicaRouter:
+    """ Installed when a replica is configured, see the `replica_reads()` context """
+
+    def db_for_read(self, model, **hints) -> str:
+        # Always explicit: django would otherwise use the database an instance hint was loaded from
+        return REPLICA_DB_ALIAS if reading_replica() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints) -> str:
+        routing = _request_routing.get()
+        if routing is not None:
+            routing.wrote = True
+
+        # Instances loaded from the replica are saved to the primary too
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # Same data on both
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, model_name: Optional[str] = None, **hints: Any) -> bool:
+        # The replica gets the schema from the primary
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,41 @@
+# SQLite backend tuned for serving concurrent requests, selected with `db.engine = 'sqlite-tuned'` (see the
+# `[db.sqlite]` section of config/app.toml).
+#
+# Same as django's backend, except that:
+#  - every new connection is set up with the pragmas of `OPTIONS['pragmas']` (WAL journal, so that readers do not
+#    block the writer and the other way around, a busy timeout, bigger page cache, memory mapped reads, ...)
+#  - with `OPTIONS['immediate_transactions']`, transactions take the write lock when they begin. A deferred
+#    transaction that reads then writes can not wait for the lock (it could deadlock with another one), SQLite fails
+#    it with `database is locked` right away no matter the busy timeout
+
+from typing import Any
+
+from django.db.backends.sqlite3 import base
+
+# Options of this backend, the others are passed to `sqlite3.connect()`
+_BACKEND_OPTIONS = ('pragmas', 'immediate_transactions')
+
+
+def apply_pragmas(conn, pragmas: dict[str, Any]):
+    for (name, value) in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for option in _BACKEND_OPTIONS:
+            params.pop(option, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        apply_pragmas(conn, self.settings_dict['OPTIONS'].get('pragmas', {}))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.settings_dict['OPTIONS'].get('immediate_transactions'):
+            self.cursor().execute("BEGIN IMMEDIATE")
+        else:
+            super()._start_transaction_under_autocommit()
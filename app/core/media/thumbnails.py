@@ -0,0 +1,112 @@
+import os
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction, close_old_connections
+
+from app.utils import to_int
+from app.app_paths import AppPaths
+from app.bootstrap.config import Config
+from app.models.auth import ProfilePicture
+
+try:
+    from PIL import Image
+except ImportError:
+    # Pillow is optional. Without it no variants are generated and clients get the original pictures only
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> the size of the square its picture is scaled (down) to fit in
+THUMBNAIL_VARIANTS = {
+    'sm': 64,
+    'md': 256,
+    'lg': 512,
+}
+
+# Pillow format to save each (sniffed) extension with. GIFs are reduced to their first frame, saved as PNG
+_SAVE_FORMATS = {
+    '.jpg': ('JPEG', '.jpg'),
+    '.png': ('PNG', '.png'),
+    '.gif': ('PNG', '.png'),
+    '.webp': ('WEBP', '.webp'),
+}
+
+# Pillow releases the GIL while resizing, so a few threads are enough to keep up with uploads without
+# needing separate processes
+_executor = ThreadPoolExecutor(
+    max_workers=max(1, to_int(Config.get('uploads.thumbnail_workers'), 2)),
+    thread_name_prefix='thumbnails'
+)
+
+
+def variant_extension(extension: str) -> str:
+    """ Extension of the variants of a picture with the given extension """
+    return _SAVE_FORMATS.get(extension, (None, extension))[1]
+
+
+def _save_variant(image, path, fmt: str):
+    # Write next to the destination and rename, so that a half written variant is never served
+    fd, tmp_path = tempfile.mkstemp(suffix='.upload', dir=str(AppPaths.profile_pics_tmp()))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format=fmt)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def generate_variants(picture: ProfilePicture) -> list[str]:
+    """ Generate the thumbnails of the picture and return the names of the generated variants """
+    _, extension = os.path.splitext(picture.location)
+    if Image is None or extension not in _SAVE_FORMATS:
+        return []
+
+    fmt, saved_extension = _SAVE_FORMATS[extension]
+    generated = []
+
+    with Image.open(AppPaths.profile_pics() / picture.location) as original:
+        original.seek(0)
+        if fmt == 'JPEG' and original.mode != 'RGB':
+            original = original.convert('RGB')
+
+        for (variant, size) in THUMBNAIL_VARIANTS.items():
+            image = original.copy()
+            image.thumbnail((size, size), Image.LANCZOS)
+
+            target = AppPaths.profile_pics() / picture.variant_location(variant, saved_extension)
+            _save_variant(image, target, fmt)
+            generated.append(variant)
+
+    return generated
+
+
+def _generate_in_background(picture_id):
+    try:
+        picture = ProfilePicture.objects.filter(pk=picture_id).first()
+        if picture is None or picture.variants:
+            return
+
+        variants = generate_variants(picture)
+        if variants:
+            # Saved through the model, for the cached profiles showing the picture to be dropped (its urls changed)
+            picture.variants = ','.join(variants)
+            picture.save(update_fields=['variants'])
+    except Exception:
+        logger.exception("Failed to generate thumbnails of picture %s", picture_id)
+    finally:
+        # This thread is not part of a request cycle, so the connection is never closed otherwise
+        close_old_connections()
+
+
+def schedule_variants(picture: ProfilePicture):
+    """ Generate the thumbnails of the picture in the background, once the current transaction (if any) commits """
+    if Image is None or picture.variants:
+        return
+
+    picture_id = picture.pk
+    transaction.on_commit(lambda: _executor.submit(_generate_in_background, picture_id))
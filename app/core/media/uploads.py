@@ -0,0 +1,165 @@
+import os
+import uuid
+import hashlib
+import tempfile
+from http import HTTPStatus
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.core.files.uploadedfile import UploadedFile, TemporaryUploadedFile
+
+from app.utils import to_int
+from app.app_paths import AppPaths
+from app.bootstrap.config import Config
+from app.exceptions import ApiException
+from app.models.auth import ProfilePicture
+
+
+# Leading bytes of the supported image formats -> file extension
+# (WEBP is checked separately since its signature is split around the file size)
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+)
+_SNIFF_LENGTH = 12
+
+
+def sniff_image_extension(head: bytes) -> Optional[str]:
+    """ Returns the extension of the image format, judging by the first bytes of the file, or None if not an image """
+    for (signature, extension) in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+
+    return None
+
+
+def max_picture_size() -> int:
+    return to_int(Config.get('uploads.max_picture_size'), 5 * 2**20)
+
+
+class HashedUploadedFile(TemporaryUploadedFile):
+    """
+    An uploaded image, streamed to a temporary file next to its final location so that it can be moved in place
+    with an atomic rename. Knows its content hash and (sniffed) extension.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        file = tempfile.NamedTemporaryFile(suffix='.upload', dir=str(AppPaths.profile_pics_tmp()))
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+
+        self.sha256: str = ''
+        self.extension: str = ''
+
+
+class ProfilePictureUploadHandler(FileUploadHandler):
+    """
+    Streams an uploaded image to disk while hashing it. The upload is aborted as soon as it turns out to be too
+    big or not an image, or when a file other than the `image` one comes in, in which case `error` holds the
+    exception to respond with.
+
+    The size is capped over all the file data of the request, which holds whether or not (e.g chunked requests) the
+    request declares a length. The other form fields are capped by django (`DATA_UPLOAD_MAX_MEMORY_SIZE`).
+    """
+
+    image_field = 'image'
+
+    too_large_exception = ApiException(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, msg="Image is too large")
+    not_an_image_exception = ApiException(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, msg="Unsupported image format")
+    unexpected_file_exception = ApiException(HTTPStatus.BAD_REQUEST, msg="Only a single `image` can be uploaded")
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = max_picture_size()
+        self.error: Optional[ApiException] = None
+
+        self.files = 0
+        # File bytes received over the whole request
+        self.received = 0
+
+    def _abort(self, exp: ApiException):
+        self.error = exp
+        # Do not bother reading the rest of the request
+        raise StopUpload(connection_reset=True)
+
+    def _sniff(self):
+        extension = sniff_image_extension(self.head)
+        if extension is None:
+            self._abort(self.not_an_image_exception)
+
+        self.file.extension = extension
+
+    def new_file(self, field_name, *args, **kwargs):
+        if field_name != self.image_field or self.files > 0:
+            self._abort(self.unexpected_file_exception)
+        self.files += 1
+
+        super().new_file(field_name, *args, **kwargs)
+        self.file = HashedUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.hasher = hashlib.sha256()
+        self.head = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self._abort(self.too_large_exception)
+
+        if self.file.extension == '':
+            self.head += raw_data[:_SNIFF_LENGTH]
+            if len(self.head) >= _SNIFF_LENGTH:
+                self._sniff()
+
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.file.extension == '':
+            # Smaller than the sniffed header
+            self._sniff()
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.seek(0)
+
+        self.file.size = file_size
+        self.file.sha256 = self.hasher.hexdigest()
+        return self.file
+
+
+def store_profile_picture(uploaded: HashedUploadedFile) -> ProfilePicture:
+    """
+    Move the uploaded image to its content addressed location and return its record. Images that were uploaded
+    before are neither stored again nor get a new record.
+    """
+    digest = uploaded.sha256
+    location = f'{digest[:2]}/{digest[2:4]}/{digest}{uploaded.extension}'
+
+    existing = ProfilePicture.objects.filter(content_hash=digest).first()
+    if existing is not None:
+        return existing
+
+    target = AppPaths.profile_pics() / location
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(uploaded.temporary_file_path(), settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+        os.replace(uploaded.temporary_file_path(), target)
+
+    # The row is only created once the file is in place, so a failed upload never leaves a dangling record
+    try:
+        record, _ = ProfilePicture.objects.get_or_create(
+            content_hash=digest,
+            defaults={
+                'name': str(uuid.uuid4()),
+                'location': location,
+            }
+        )
+    except IntegrityError:
+        raise ApiException(code=HTTPStatus.INTERNAL_SERVER_ERROR, msg="Failed to upload image. Try again later")
+
+    return record
@@ -0,0 +1,80 @@
+import os
+import mimetypes
+from typing import Optional
+
+from django.urls import reverse, NoReverseMatch
+from django.http import HttpResponse, FileResponse
+from django.utils.http import http_date
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from app.app_paths import AppPaths
+from app.bootstrap.config import Config
+from app.exceptions import ApiExceptionCollection
+from app.models.auth import ProfilePicture
+
+from .thumbnails import variant_extension
+
+# Stored pictures are never modified in place (new content always gets a new name), so clients can cache them forever
+_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+picture_not_found_exception = ApiExceptionCollection.NotFound.copy_with(msg="Picture not found")
+
+
+def picture_urls(picture: Optional[ProfilePicture]) -> dict[str, str]:
+    """ URLs of the original picture and of each of its generated variants, by variant name """
+    if picture is None:
+        return {}
+
+    try:
+        urls = {'original': reverse('profile-picture', kwargs={'location': picture.location})}
+
+        _, extension = os.path.splitext(picture.location)
+        for variant in picture.variant_names():
+            location = picture.variant_location(variant, variant_extension(extension))
+            urls[variant] = reverse('profile-picture', kwargs={'location': location})
+    except NoReverseMatch:
+        # Some older uploads kept odd extensions from the uploaded file name, these can not be served
+        return {}
+
+    return urls
+
+
+@require_safe
+def serve_profile_picture(request, location: str):
+    # `location` is already restricted to safe path segments by the url pattern
+    path = AppPaths.profile_pics() / location
+
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        raise picture_not_found_exception
+
+    # File names are unique per content, so the name makes for a strong ETag
+    etag = f'"{path.name}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type, _ = mimetypes.guess_type(path.name)
+        content_type = content_type or 'application/octet-stream'
+
+        accel_prefix = Config.get('media.accel_redirect_prefix')
+        sendfile_header = Config.get('media.sendfile_header')
+
+        if accel_prefix:
+            # Let nginx send the file from its internal location
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + location
+        elif sendfile_header:
+            # Same for apache (mod_xsendfile) and lighttpd
+            response = HttpResponse(content_type=content_type)
+            response[sendfile_header] = str(path)
+        else:
+            # Served with the server's file wrapper (i.e sendfile) when there is one
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = _CACHE_CONTROL
+
+    return response
@@ -0,0 +1,214 @@
+import time
+import random
+import bisect
+import threading
+from typing import Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.dispatch import receiver
+from django.db.backends.signals import connection_created
+
+from app.bootstrap.config import Config
+
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the SQL query count histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(labels: tuple, values: tuple, extra: str = '') -> str:
+    parts = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in zip(labels, values)]
+    if extra:
+        parts.append(extra)
+
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        # Only ever called with the registry lock held
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for (label_values, value) in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: tuple, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> [per bucket counts (last one is +Inf), sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        # Only ever called with the registry lock held
+        entry = self._values.get(label_values)
+        if entry is None:
+            entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for (label_values, (counts, total)) in sorted(self._values.items()):
+            cumulative = 0
+            for (bound, count) in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, label_values)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process metrics, rendered in the Prometheus text format. Every server worker process has its own registry,
+    so the scraper has to reach each worker (or the values are per worker).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: list = []
+
+        self.requests = self._add(Counter(
+            'app_requests_total', "Requests served", ('method', 'route', 'status')
+        ))
+        self.request_duration = self._add(Histogram(
+            'app_request_duration_seconds', "Time spent serving requests", LATENCY_BUCKETS, ('method', 'route')
+        ))
+
+        # The ones below are only recorded for sampled requests
+        self.sampled_requests = self._add(Counter(
+            'app_sampled_requests_total', "Requests that were profiled", ('method', 'route')
+        ))
+        self.sql_queries = self._add(Histogram(
+            'app_request_sql_queries', "SQL queries per (sampled) request", QUERY_COUNT_BUCKETS, ('method', 'route')
+        ))
+        self.sql_duration = self._add(Histogram(
+            'app_request_sql_duration_seconds', "Time spent in SQL queries per (sampled) request",
+            LATENCY_BUCKETS, ('method', 'route')
+        ))
+        self.section_duration = self._add(Histogram(
+            'app_section_duration_seconds', "Time spent in profiled sections per (sampled) request",
+            LATENCY_BUCKETS, ('route', 'section')
+        ))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def record(self, method: str, route: str, status: int, duration: float, profile: Optional['RequestProfile']):
+        with self._lock:
+            self.requests.inc(method, route, status)
+            self.request_duration.observe(duration, method, route)
+
+            if profile is not None:
+                self.sampled_requests.inc(method, route)
+                self.sql_queries.observe(profile.sql_count, method, route)
+                self.sql_duration.observe(profile.sql_time, method, route)
+                for (section, elapsed) in profile.sections.items():
+                    self.section_duration.observe(elapsed, route, section)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in self._metrics:
+                lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
+
+
+class RequestProfile:
+    """ What is measured during a sampled request, besides its latency """
+
+    __slots__ = ('sql_count', 'sql_time', 'sections')
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.sections: dict[str, float] = {}
+
+
+# The profile of the sampled request being served, if any. Being a context variable, it follows the request
+# into the threads of `sync_to_async()` (where the ORM runs for async views)
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar('current_profile', default=None)
+
+
+def sample_rate() -> float:
+    """ Share of the requests that get profiled, between 0 and 1 """
+    try:
+        return min(max(float(Config.get('metrics.sample_rate', 0.05)), 0.0), 1.0)
+    except (TypeError, ValueError):
+        return 0.05
+
+
+def start_profile(rate: float) -> Optional[RequestProfile]:
+    """ Start profiling the current request with a probability of `rate`. Returns the profile if sampled """
+    if rate <= 0 or random.random() >= rate:
+        return None
+
+    profile = RequestProfile()
+    _current_profile.set(profile)
+    return profile
+
+
+def stop_profile():
+    _current_profile.set(None)
+
+
+@contextmanager
+def profiled_section(name: str):
+    """
+    Add the time spent in the block to the `name` section of the current request, if it is being profiled.
+    Costs a single context variable lookup otherwise.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.sections[name] = profile.sections.get(name, 0.0) + time.perf_counter() - start
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.sql_time += time.perf_counter() - start
+        profile.sql_count += 1
+
+
+# `connection.execute_wrapper()` only wraps the connection of the current thread, while async views run their
+# queries on the connections of other threads. Install the wrapper on every connection instead, it only measures
+# queries made on behalf of sampled requests
+@receiver(connection_created)
+def _install_sql_wrapper(sender, connection, **kwargs):
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
@@ -0,0 +1,31 @@
+import hmac
+
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+
+from app.bootstrap.config import Config
+from app.exceptions import ApiExceptionCollection
+
+from .profiling import metrics_registry
+
+_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+metrics_forbidden_exception = ApiExceptionCollection.Forbidden.copy_with(msg="Permission Denied")
+
+
+@require_safe
+def metrics(request):
+    """ The metrics of this worker process, in the Prometheus text format """
+    if not Config.get_bool('metrics.enabled'):
+        raise ApiExceptionCollection.NotFound
+
+    # Routes and timings are not for everyone to see, without a token the endpoint is closed
+    token = Config.get('metrics.token')
+    if not token:
+        raise metrics_forbidden_exception
+
+    provided = request.META.get('HTTP_AUTHORIZATION', '')
+    if not hmac.compare_digest(provided.encode(), f'Bearer {token}'.encode()):
+        raise metrics_forbidden_exception
+
+    return HttpResponse(metrics_registry.render(), content_type=_CONTENT_TYPE)
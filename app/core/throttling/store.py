@@ -0,0 +1,214 @@
+import os
+import mmap
+import math
+import time
+import fcntl
+import struct
+import hashlib
+import threading
+from typing import Optional
+
+from app.utils import to_int
+from app.bootstrap.config import Config
+
+
+# Sliding window counters: the hits of the current fixed window, plus the hits of the previous one weighted by how
+# much of it still overlaps the sliding window. Needs a couple of numbers per key, unlike a log of every hit.
+
+def _slide(window_start: float, prev: int, curr: int, now: float, window: float) -> tuple[float, int, int]:
+    """ Move the counters of a key to the fixed window `now` falls in """
+    current_start = now - (now % window)
+    if current_start == window_start:
+        return window_start, prev, curr
+
+    if current_start - window_start == window:
+        # The window right after, the current counter becomes the previous one
+        return current_start, curr, 0
+
+    # Nothing recent
+    return current_start, 0, 0
+
+
+def _decide(window_start: float, prev: int, curr: int, now: float, limit: int, window: float) -> tuple[bool, int]:
+    """ Whether one more hit is allowed, and if not, in how many seconds it will be """
+    elapsed = now - window_start
+    estimate = prev * (1 - elapsed / window) + curr
+    if estimate < limit:
+        return True, 0
+
+    if curr >= limit or prev == 0:
+        # Only the next window will do
+        retry_after = window - elapsed
+    else:
+        # Until enough of the previous window has slid out
+        retry_after = window * (1 - (limit - curr) / prev) - elapsed
+
+    return False, max(1, math.ceil(retry_after))
+
+
+class MemoryThrottleStore:
+    """
+    Counters held by the current process, split into shards with a lock each, so that concurrent requests of
+    unrelated keys do not wait for each other.
+    """
+
+    def __init__(self, shards: int = 64, max_keys: int = 100000):
+        self._shards = [dict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._max_shard_keys = max(1, max_keys // shards)
+
+    def _prune(self, shard: dict, now: float):
+        # Drop the keys that no longer count anything, then the oldest ones if that was not enough
+        stale = [key for key, (start, _, _, window) in shard.items() if now - start >= 2 * window]
+        for key in stale:
+            del shard[key]
+
+        while len(shard) >= self._max_shard_keys:
+            del shard[next(iter(shard))]
+
+    def hit(self, key: str, limit: int, window: float) -> tuple[bool, int]:
+        """ Count a hit of the key, unless it is over the limit. Returns (allowed, seconds to wait if not) """
+        index = hash(key) % len(self._shards)
+        shard = self._shards[index]
+        now = time.time()
+
+        with self._locks[index]:
+            entry = shard.get(key)
+            if entry is None:
+                if len(shard) >= self._max_shard_keys:
+                    self._prune(shard, now)
+                start, prev, curr = _slide(0.0, 0, 0, now, window)
+            else:
+                start, prev, curr = _slide(entry[0], entry[1], entry[2], now, window)
+
+            allowed, retry_after = _decide(start, prev, curr, now, limit, window)
+            if allowed:
+                curr += 1
+
+            shard[key] = (start, prev, curr, window)
+
+        return allowed, retry_after
+
+    def clear(self):
+        for (shard, lock) in zip(self._shards, self._locks):
+            with lock:
+                shard.clear()
+
+
+class SharedMemoryThrottleStore:
+    """
+    Counters in a memory mapped file (under /dev/shm by default), shared by every process mapping it, i.e by all
+    the workers of a server. The file is a fixed size hash table split into shards, each guarded by a byte range
+    lock of the file (between processes) and a thread lock (between the threads of a process).
+
+    When a shard is full the least recently used slot is reused, so the worst case is forgetting about old keys.
+    """
+
+    # key hash, window start, previous count, current count
+    _SLOT = struct.Struct('<QdII')
+    # Slots probed for a key, within its shard
+    _PROBES = 8
+
+    def __init__(self, path: str, shards: int = 64, slots_per_shard: int = 1024):
+        self.path = path
+        self.shards = shards
+        self.slots_per_shard = slots_per_shard
+        self._shard_size = slots_per_shard * self._SLOT.size
+        size = shards * self._shard_size
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # Whoever comes first sizes the (zero filled) file, under a lock of the whole file
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+        self._map = mmap.mmap(self._fd, size)
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    @staticmethod
+    def _key_hash(key: str) -> int:
+        # Must be the same in every process, unlike `hash()`. 0 marks empty slots
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+    def _find_slot(self, base: int, key_hash: int, first: int, now: float) -> int:
+        """ Offset of the slot of the key, or of the slot to (re)use for it """
+        candidate = None
+        candidate_start = math.inf
+
+        for probe in range(self._PROBES):
+            offset = base + ((first + probe) % self.slots_per_shard) * self._SLOT.size
+            slot_hash, start, _, _ = self._SLOT.unpack_from(self._map, offset)
+
+            if slot_hash == key_hash:
+                return offset
+            if slot_hash == 0:
+                if candidate is None or candidate_start > -1:
+                    candidate, candidate_start = offset, -1
+            elif start < candidate_start:
+                candidate, candidate_start = offset, start
+
+        return candidate
+
+    def hit(self, key: str, limit: int, window: float) -> tuple[bool, int]:
+        """ Count a hit of the key, unless it is over the limit. Returns (allowed, seconds to wait if not) """
+        key_hash = self._key_hash(key)
+        shard = key_hash % self.shards
+        base = shard * self._shard_size
+        first = (key_hash // self.shards) % self.slots_per_shard
+        now = time.time()
+
+        with self._locks[shard]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self._shard_size, base)
+            try:
+                offset = self._find_slot(base, key_hash, first, now)
+                slot_hash, start, prev, curr = self._SLOT.unpack_from(self._map, offset)
+                if slot_hash != key_hash:
+                    start, prev, curr = 0.0, 0, 0
+
+                start, prev, curr = _slide(start, prev, curr, now, window)
+                allowed, retry_after = _decide(start, prev, curr, now, limit, window)
+                if allowed:
+                    curr += 1
+
+                self._SLOT.pack_into(self._map, offset, key_hash, start, prev, curr)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self._shard_size, base)
+
+        return allowed, retry_after
+
+    def clear(self):
+        for shard in range(self.shards):
+            base = shard * self._shard_size
+            with self._locks[shard]:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, self._shard_size, base)
+                try:
+                    self._map[base:base + self._shard_size] = bytes(self._shard_size)
+                finally:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, self._shard_size, base)
+
+
+def _default_shared_path() -> str:
+    name = 'ask-api-throttle-' + hashlib.blake2b(os.getcwd().encode(), digest_size=4).hexdigest()
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp'
+    return os.path.join(directory, name)
+
+
+def make_store(backend: Optional[str] = None):
+    """ The store configured under `throttle` """
+    backend = backend or Config.get('throttle.backend') or 'memory'
+    shards = max(1, to_int(Config.get('throttle.shards'), 64))
+
+    if backend == 'memory':
+        return MemoryThrottleStore(shards=shards, max_keys=to_int(Config.get('throttle.max_keys'), 100000))
+
+    if backend == 'shared':
+        return SharedMemoryThrottleStore(
+            path=Config.get('throttle.shared_path') or _default_shared_path(),
+            shards=shards,
+            slots_per_shard=max(SharedMemoryThrottleStore._PROBES, to_int(Config.get('throttle.shared_slots'), 1024))
+        )
+
+    raise ValueError(f"Unknown throttle backend '{backend}'")
@@ -0,0 +1,168 @@
+import asyncio
+from http import HTTPStatus
+from functools import wraps, lru_cache
+from typing import Callable, Optional, Iterable
+
+from app.bootstrap.config import Config
+from app.exceptions import ApiException
+
+from .store import make_store
+
+
+# Request -> the key it is counted under for a throttle, or None when the throttle does not apply to it
+KeyFunction = Callable[..., Optional[str]]
+
+
+def parse_rate(rate: str) -> Optional[tuple[int, float]]:
+    """ Parse a `<count>/<seconds>` rate, e.g '10/60'. Empty rates mean no limit """
+    if not rate:
+        return None
+
+    count, _, seconds = rate.partition('/')
+    limit, window = int(count), float(seconds or 1)
+    if limit <= 0 or window <= 0:
+        raise ValueError(f"Invalid throttle rate '{rate}'")
+
+    return limit, window
+
+
+throttling_enabled = Config.get_bool('throttle.enabled')
+
+_store = None
+
+def get_store():
+    """ The store of the counters, created on first use (so that forked workers map a shared one themselves) """
+    global _store
+    if _store is None:
+        _store = make_store()
+    return _store
+
+
+# --------------------------------------------------
+# Keys
+
+_client_ip_header = Config.get('throttle.client_ip_header') or ''
+_client_ip_meta_key = 'HTTP_' + _client_ip_header.upper().replace('-', '_')
+
+def client_ip(request) -> Optional[str]:
+    """
+    Address of the client. Behind a reverse proxy `throttle.client_ip_header` names the header it sets, whose last
+    address is the one the proxy saw (the ones before it are whatever the client sent)
+    """
+    if _client_ip_header:
+        forwarded = request.META.get(_client_ip_meta_key, '')
+        address = forwarded.rpartition(',')[2].strip()
+        if address:
+            return address
+
+    return request.META.get('REMOTE_ADDR') or None
+
+
+def login_username(request) -> Optional[str]:
+    """ The username a login is attempted for, as sent (usernames are not validated yet) """
+    data = getattr(request, 'data', None)
+    if not isinstance(data, dict):
+        return None
+
+    username = data.get('username')
+    if not isinstance(username, str) or not username:
+        return None
+
+    return username.strip().lower()
+
+
+def bearer_key(request) -> Optional[str]:
+    """ The API key of the request, as sent """
+    prefix, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if prefix != 'Bearer' or not token:
+        return None
+
+    return token
+
+
+# --------------------------------------------------
+
+class Throttle:
+    """
+    A limit on the number of requests counted under a same key, e.g the login attempts of an address. The rate
+    comes from `throttle.rates.<name>`, a throttle without a rate lets everything through.
+    """
+
+    __slots__ = ('name', 'key_of', 'rate')
+
+    def __init__(self, name: str, key_of: KeyFunction):
+        self.name = name
+        self.key_of = key_of
+        self.rate = parse_rate(Config.get(f'throttle.rates.{name}') or '')
+
+    def hit(self, request) -> int:
+        """ Count the request, return how many seconds to wait when over the limit or 0 """
+        if self.rate is None:
+            return 0
+
+        key = self.key_of(request)
+        if key is None:
+            return 0
+
+        limit, window = self.rate
+        allowed, retry_after = get_store().hit(f'{self.name}:{key}', limit, window)
+
+        return 0 if allowed else retry_after
+
+    def __repr__(self):
+        return f"<Throttle: {self.name}>"
+
+
+@lru_cache(maxsize=512)
+def throttled_exception(retry_after: int) -> ApiException:
+    """ The 429 to respond with, shared by every request having to wait the same time """
+    return ApiException(
+        HTTPStatus.TOO_MANY_REQUESTS,
+        msg="Too many requests, try again later",
+        headers={'Retry-After': str(retry_after)}
+    )
+
+
+def check_throttles(request, throttles: Iterable[Throttle]):
+    """ Raise a 429 when the request is over any of the limits. Each throttle counts it when under its own limit """
+    if not throttling_enabled:
+        return
+
+    retry_after = 0
+    for t in throttles:
+        retry_after = max(retry_after, t.hit(request))
+
+    if retry_after:
+        raise throttled_exception(retry_after)
+
+
+def throttle(*throttles: Throttle):
+    """
+    Reject the requests to the view which are over the limit of any of the throttles, before running the view.
+    Goes under `api_view` or `async_api_view` (for the rejections to get rendered and `request.data` be parsed)
+    """
+    def wrapper(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def _af(request, *args, **kwargs):
+                check_throttles(request, throttles)
+                return await func(request, *args, **kwargs)
+
+            return _af
+
+        @wraps(func)
+        def _f(request, *args, **kwargs):
+            check_throttles(request, throttles)
+            return func(request, *args, **kwargs)
+
+        return _f
+
+    return wrapper
+
+
+# Throttles of the views (see `[throttle.rates]` in config/app.toml)
+login_by_ip = Throttle('login_ip', client_ip)
+login_by_username = Throttle('login_username', login_username)
+signup_by_ip = Throttle('signup_ip', client_ip)
+upload_by_ip = Throttle('upload_ip', client_ip)
+by_api_key = Throttle('api_key', bearer_key)
@@ -1,19 +1,45 @@
-from typing import TYPE_CHECKING
-import copy
+from typing import TYPE_CHECKING, Optional
 
 from http import HTTPStatus
 
 from django.http import HttpRequest, HttpResponse, JsonResponse
 
 from django.shortcuts import render
+from rest_framework.views import exception_handler
+
+from app.renderers import dumps
 
 class HttpException(Exception):
+    """
+    An error to respond with. Exceptions are immutable values: many of them are module level singletons, raised
+    over and over by every request, and derived ones share the data of their origin rather than copying it.
+    """
+
+    __slots__ = ('code', 'msg')
+
     def __init__(self, code, msg):
         if isinstance(code, HTTPStatus):
             code = code.value
-            
-        self.code = code
-        self.msg = msg
+
+        object.__setattr__(self, 'code', code)
+        object.__setattr__(self, 'msg', msg)
+
+    def __setattr__(self, name, value):
+        # Python itself still needs to set `__traceback__`, `__context__`, etc
+        if name.startswith('__'):
+            return super().__setattr__(name, value)
+
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def detach(self):
+        """
+        Drop the traceback and context of the last raise. When a singleton gets raised again its new traceback is
+        chained to the previous one, which would keep growing (along with the frames, and their locals, of every
+        request that raised it). These are expected errors, nothing ever looks at their tracebacks.
+        """
+        self.__traceback__ = None
+        self.__context__ = None
+        self.__cause__ = None
 
     @classmethod
     def from_http_status_code(cls, status: HTTPStatus):
@@ -25,12 +51,14 @@ class HttpException(Exception):
 # --------------------------------------------------
 
 def response_exception(request: HttpRequest, exp: HttpException):
+    exp.detach()
+
     if isinstance(exp, ApiException):
-        return JsonResponse({
-            'type': 'error',
-            'message': exp.msg,
-            'payload': exp.data
-        }, status=exp.code)
+        response = HttpResponse(exp.rendered_body(), status=exp.code, content_type='application/json')
+        if exp.headers:
+            for (name, value) in exp.headers.items():
+                response[name] = value
+        return response
 
     return HttpResponse(exp.msg, status=exp.code, content_type="text/plain")
 
@@ -45,26 +73,76 @@ def response_exception(request: HttpRequest, exp: HttpException):
 # --------------------------------------------------
 
 class ApiException(HttpException):
-    def __init__(self, code=500, msg="", data=None):
+    __slots__ = ('data', 'headers', '_rendered_body', '_variants')
+
+    # Bound on the number of memoized message variants of an exception, see `copy_with()`
+    MAX_VARIANTS = 64
+
+    def __init__(self, code=500, msg="", data=None, headers: Optional[dict[str, str]] = None):
         super().__init__(code, msg)
-        self.data = data
+        object.__setattr__(self, 'data', data)
+        # Extra headers of the error response, e.g `Retry-After`
+        object.__setattr__(self, 'headers', headers)
+        object.__setattr__(self, '_rendered_body', None)
+        object.__setattr__(self, '_variants', None)
+
+    def rendered_body(self) -> bytes:
+        """
+        The JSON body of the error response. Serialized once, on first use: most exceptions are module level
+        singletons (e.g the permission denied ones) that get raised over and over.
+        """
+        if self._rendered_body is None:
+            object.__setattr__(self, '_rendered_body', dumps({
+                'type': 'error',
+                'message': self.msg,
+                'payload': self.data
+            }))
+        return self._rendered_body
 
     # Currently only copying with message and data is allowed. That is because it doesn't make sense to
     # change the status code if you are "copying" in the first place .
+    #
+    # Whatever is not given is shared with this exception (exceptions are immutable, so no copy is needed).
+    # Variants with only a different message are memoized, so that asking for the same one again (e.g on every
+    # failed request) returns the same exception, with its body already rendered
     def copy_with(self, msg=None, data=None):
-        return ApiException(
-            msg=msg or copy.deepcopy(self.msg),
-            code=self.code,
-            data=data or copy.deepcopy(self.data)
-        )
+        if data is not None:
+            return ApiException(msg=msg or self.msg, code=self.code, data=data, headers=self.headers)
+
+        msg = msg or self.msg
+        variants = self._variants
+        if variants is None:
+            variants = {}
+            object.__setattr__(self, '_variants', variants)
+
+        variant = variants.get(msg)
+        if variant is None:
+            variant = ApiException(msg=msg, code=self.code, data=self.data, headers=self.headers)
+            if len(variants) < self.MAX_VARIANTS:
+                variants[msg] = variant
+
+        return variant
 
     @classmethod
     def from_http_status_code(cls, status: HTTPStatus, data=None):
         return cls(code=status.value, msg=f"HTTP {status.value} - {status.phrase}", data=data);
 
 
+def api_exception_handler(exp: Exception, context: dict):
+    """
+    rest_framework's exception handler, extended to respond to `HttpException`s right away. Otherwise these get
+    re-raised by rest_framework, to be turned into a response by the exception handler middleware.
+    """
+    if isinstance(exp, HttpException):
+        return response_exception(context['request'], exp)
+
+    return exception_handler(exp, context)
+
+
 class ApiExceptionCollection:
     BadRequest = ApiException.from_http_status_code(HTTPStatus.BAD_REQUEST)
     Forbidden = ApiException.from_http_status_code(HTTPStatus.FORBIDDEN)
     NotFound = ApiException.from_http_status_code(HTTPStatus.NOT_FOUND)
     UnprocessableEntity = ApiException.from_http_status_code(HTTPStatus.UNPROCESSABLE_ENTITY)
+    TooManyRequests = ApiException.from_http_status_code(HTTPStatus.TOO_MANY_REQUESTS)
+    ServiceUnavailable = ApiException.from_http_status_code(HTTPStatus.SERVICE_UNAVAILABLE)
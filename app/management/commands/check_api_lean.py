@@ -0,0 +1,112 @@
+import re
+import inspect
+from types import FunctionType
+
+from django.urls import get_resolver, URLPattern, URLResolver
+from django.core.management.base import BaseCommand, CommandError
+
+from app.utils import resolve_root
+
+
+# What the api-lean settings profile removes -> source patterns of the code relying on it
+REMOVED_USAGES = {
+    'django.contrib.sessions': [r'\.session\b', r'contrib\.sessions'],
+    'django.contrib.messages': [r'contrib\.messages', r'\bmessages\.\w+\(', r'\bget_messages\('],
+    'django.contrib.staticfiles': [r'contrib\.staticfiles', r'\bstatic\(', r'\bSTATIC_URL\b'],
+    'CsrfViewMiddleware': [r'\bcsrf_protect\b', r'\bensure_csrf_cookie\b', r'\brequires_csrf_token\b', r'\bget_token\('],
+    'XFrameOptionsMiddleware': [r'\bxframe_options_\w+'],
+}
+
+_COMPILED_USAGES = {
+    removed: [re.compile(pattern) for pattern in patterns] for (removed, patterns) in REMOVED_USAGES.items()
+}
+
+# Only the project's own code is inspected
+_PROJECT_DIRS = (resolve_root('app'), resolve_root('auth_core'))
+
+
+def _iter_patterns(resolver, prefix=''):
+    for pattern in resolver.url_patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _iter_patterns(pattern, route)
+        elif isinstance(pattern, URLPattern):
+            yield route, pattern.callback
+
+
+def _functions_of(view) -> list[FunctionType]:
+    """
+    The project functions making up a view: the view itself and whatever its decorators wrap (found through
+    `__wrapped__`, closures and, for DRF views, the methods of the view class)
+    """
+    found = {}
+    seen = set()
+    pending = [view]
+
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        wrapped = getattr(obj, '__wrapped__', None)
+        if wrapped is not None:
+            pending.append(wrapped)
+
+        cls = getattr(obj, 'cls', None)
+        if inspect.isclass(cls):
+            pending.extend(v for v in vars(cls).values() if isinstance(v, FunctionType))
+
+        if isinstance(obj, FunctionType):
+            # Decorators copy the module and name of what they wrap, so tell functions apart by their code
+            if obj.__code__.co_filename.startswith(_PROJECT_DIRS):
+                found[obj.__code__] = obj
+
+            for cell in obj.__closure__ or ():
+                try:
+                    content = cell.cell_contents
+                except ValueError:
+                    # Empty cell
+                    continue
+                if callable(content):
+                    pending.append(content)
+
+    return list(found.values())
+
+
+def find_usages(view) -> list[tuple[str, str]]:
+    """ (removed part, function name) of every use of what the api-lean profile removes, by the given view """
+    usages = []
+    for fn in _functions_of(view):
+        try:
+            source = inspect.getsource(fn.__code__)
+        except (OSError, TypeError):
+            continue
+
+        for (removed, patterns) in _COMPILED_USAGES.items():
+            if any(p.search(source) for p in patterns):
+                usages.append((removed, f'{fn.__module__}.{fn.__qualname__}'))
+
+    return usages
+
+
+class Command(BaseCommand):
+    help = (
+        "Flag the views that depend on an app or middleware removed by the 'api-lean' settings profile "
+        "(sessions, messages, staticfiles, CSRF and X-Frame-Options middleware)"
+    )
+
+    def handle(self, *args, **options):
+        problems = 0
+        views = 0
+
+        for (route, view) in _iter_patterns(get_resolver()):
+            views += 1
+            for (removed, fn_name) in find_usages(view):
+                problems += 1
+                self.stderr.write(f"/{route}: {fn_name} depends on {removed}")
+
+        if problems:
+            raise CommandError(f"{problems} dependencie(s) on parts removed by the api-lean profile, in {views} view(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {views} view(s), none depends on what api-lean removes"))
@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.core.management.base import BaseCommand
+
+from app.models.auth import AppUser
+from app.core.authentication.keystore import KeyStore
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace api keys stored in plain text (from before keys were hashed) with their hashed form. "
+        "Clients keep using their current keys. Safe to run more than once"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Rows that have not been migrated yet have no prefix, but still hold the full serialized key
+        pending = AppUser.objects.filter(api_key_prefix='').only('id', 'current_api_key').order_by('id')
+
+        migrated = 0
+        skipped = 0
+        last_id = 0
+
+        while True:
+            batch = list(pending.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            last_id = batch[-1].id
+            updated = []
+
+            for user in batch:
+                # Plain text keys predate the checksum
+                key = KeyStore.deserialize_user(user.current_api_key, accept_unchecked=True)
+                if key is None:
+                    skipped += 1
+                    continue
+
+                user.api_key_prefix = key.prefix
+                user.current_api_key = KeyStore.hash_digest(key)
+                updated.append(user)
+
+            with transaction.atomic():
+                AppUser.objects.bulk_update(updated, ['api_key_prefix', 'current_api_key'])
+
+            migrated += len(updated)
+
+        self.stdout.write(self.style.SUCCESS(f"Migrated {migrated} api key(s), skipped {skipped} malformed key(s)"))
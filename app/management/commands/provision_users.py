@@ -0,0 +1,69 @@
+import sys
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.core.authentication.provisioning import UserProvisioner, read_user_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the users of a CSV (with a header row) or JSON lines file, having the same fields as the signup "
+        "endpoint. Writes a JSON lines report holding, for each row, the api key of the created user or the errors "
+        "of the row"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="Users file, '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the extension of the file")
+        parser.add_argument('--report', default='-', help="Where to write the report, '-' for stdout")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows inserted per transaction")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Processes hashing the passwords, defaults to the number of CPUs. 0 hashes inline")
+
+    def handle(self, *args, **options):
+        path = options['file']
+
+        fmt = options['format']
+        if fmt is None:
+            if path.endswith('.csv'):
+                fmt = 'csv'
+            elif path.endswith(('.jsonl', '.ndjson')):
+                fmt = 'jsonl'
+            else:
+                raise CommandError("Can not tell the format of the file, use --format")
+
+        users_file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        report = self.stdout if options['report'] == '-' else open(options['report'], 'w', encoding='utf-8')
+
+        provisioner = UserProvisioner(batch_size=options['batch_size'], workers=options['workers'])
+
+        created = 0
+        failed = 0
+        started = time.perf_counter()
+
+        try:
+            for result in provisioner.provision(read_user_rows(users_file, fmt)):
+                entry = {'line': result.line, 'username': result.username}
+                if result.errors is None:
+                    created += 1
+                    entry['api_key'] = result.api_key
+                else:
+                    failed += 1
+                    entry['errors'] = result.errors
+
+                report.write(json.dumps(entry) + '\n')
+
+                if (created + failed) % provisioner.batch_size == 0:
+                    self.stderr.write(f"{created + failed} row(s) processed")
+        finally:
+            if users_file is not sys.stdin:
+                users_file.close()
+            if report is not self.stdout:
+                report.close()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f"Created {created} user(s), rejected {failed} row(s) in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,43 @@
+import asyncio
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpRequest
+
+from app.core.database.routing import REPLICA_DB_ALIAS, start_request_routing, stop_request_routing
+
+
+# Scopes the replica routing (see app/core/database/routing.py) to each request, so that a request reads its own
+# writes. Dropped from the stack when no replica is configured. Like MiddlewareMixin, runs natively in both sync
+# and async mode
+class DatabaseRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if REPLICA_DB_ALIAS not in settings.DATABASES:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        else:
+            self._is_coroutine = None
+
+    def __call__(self, request: HttpRequest):
+        if self._is_coroutine:
+            return self.__acall__(request)
+
+        start_request_routing()
+        try:
+            return self.get_response(request)
+        finally:
+            stop_request_routing()
+
+    async def __acall__(self, request: HttpRequest):
+        start_request_routing()
+        try:
+            return await self.get_response(request)
+        finally:
+            stop_request_routing()
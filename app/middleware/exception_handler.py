@@ -1,4 +1,5 @@
 from django.http import HttpRequest, JsonResponse
+from django.utils.deprecation import MiddlewareMixin
 
 from app.exceptions import (
     response_exception,
@@ -7,13 +8,9 @@ from app.exceptions import (
     HttpException,
 )
 
-class ExceptionHandlerMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, req):
-        return self.get_response(req)
-
+# MiddlewareMixin makes this usable for both sync and async requests, so that ASGI requests do not
+# have to hop into a thread just to pass through this middleware
+class ExceptionHandlerMiddleware(MiddlewareMixin):
     def process_exception(self, request: HttpRequest, exp: Exception):
 
         if isinstance(exp, HttpException):
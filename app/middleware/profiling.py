@@ -0,0 +1,83 @@
+import time
+import asyncio
+
+from django.http import HttpRequest
+
+from app.bootstrap.config import Config
+from app.core.metrics.profiling import (
+    metrics_registry,
+    sample_rate,
+    start_profile,
+    stop_profile,
+)
+
+_UNMATCHED_ROUTE = '<unmatched>'
+
+# Clients can send any method, the others share a label so that the number of series stays bounded
+_KNOWN_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'))
+_OTHER_METHOD = 'OTHER'
+
+
+def _method_of(request: HttpRequest) -> str:
+    return request.method if request.method in _KNOWN_METHODS else _OTHER_METHOD
+
+
+def _route_of(request: HttpRequest) -> str:
+    # Label by url pattern rather than by path, so that the number of series stays bounded
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return _UNMATCHED_ROUTE
+
+    return match.route or match.view_name or _UNMATCHED_ROUTE
+
+
+# Records the latency of every request, and the SQL queries and profiled sections (see `profiled_section()`) of a
+# sampled share of them. Like MiddlewareMixin, runs natively in both sync and async mode
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = Config.get_bool('metrics.enabled')
+        self.sample_rate = sample_rate()
+
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        else:
+            self._is_coroutine = None
+
+    def __call__(self, request: HttpRequest):
+        if self._is_coroutine:
+            return self.__acall__(request)
+
+        if not self.enabled:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        profile = start_profile(self.sample_rate)
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_profile()
+
+        metrics_registry.record(
+            _method_of(request), _route_of(request), response.status_code, time.perf_counter() - start, profile
+        )
+        return response
+
+    async def __acall__(self, request: HttpRequest):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        profile = start_profile(self.sample_rate)
+        try:
+            response = await self.get_response(request)
+        finally:
+            stop_profile()
+
+        metrics_registry.record(
+            _method_of(request), _route_of(request), response.status_code, time.perf_counter() - start, profile
+        )
+        return response
@@ -1,6 +1,8 @@
+import os
 from typing import Any, Optional
 
-from app.utils.passlib_hash import pbkdf2_sha256
+from app.utils.passlib_hash import hashing_executor
+from app.core.metrics.profiling import profiled_section
 
 from . import fields as f
 from .core import BaseModel
@@ -30,9 +32,16 @@ class ProfilePicture(BaseModel['ProfilePicture']):
 
     name = f.CharField(max_length=250, unique=True, db_index=True)
 
-    # `location` is just name + extension
+    # Path of the image relative to the profile pictures folder. Images are stored by the sha256 of their
+    # content, i.e `location` is `ab/cd/abcd...{sha256}.{extension}`. Older uploads are stored as name + extension
     location = f.CharField(max_length=250)
 
+    # sha256 of the image, used to store identical images only once. Null for older uploads
+    content_hash = f.CharField(max_length=64, unique=True, null=True)
+
+    # Comma separated names of the generated thumbnail variants (see app.core.media.thumbnails)
+    variants = f.CharField(max_length=100, default='')
+
     @staticmethod
     def handle_of(profile: Optional['ProfilePicture']):
         if profile is None:
@@ -41,6 +50,14 @@ class ProfilePicture(BaseModel['ProfilePicture']):
         # Might use a different field as handle in the future
         return profile.name
 
+    def variant_names(self) -> list[str]:
+        return self.variants.split(',') if self.variants else []
+
+    def variant_location(self, variant: str, extension: str) -> str:
+        # Variants live next to the original, e.g `ab/cd/{sha256}_sm.png`
+        stem, _ = os.path.splitext(self.location)
+        return f'{stem}_{variant}{extension}'
+
     @staticmethod
     def from_handle(handle: Any) -> Optional['ProfilePicture']:
         if handle is None:
@@ -48,6 +65,13 @@ class ProfilePicture(BaseModel['ProfilePicture']):
 
         return ProfilePicture.objects.filter(name=handle).first()
 
+    @staticmethod
+    async def afrom_handle(handle: Any) -> Optional['ProfilePicture']:
+        if handle is None:
+            return None
+
+        return await ProfilePicture.objects.filter(name=handle).afirst()
+
 
 class UserProfileMixin(f.models.Model):
     class Meta:
@@ -67,17 +91,18 @@ class AppUser(BaseModel['AppUser'], TimeStampedModel, StatusTrackedModel, UserPr
         db_table = 'k_app_users'
 
     # Might want to store some sort of "api keys history" in the future. So `current_api_key` makes more sense
-    # For now it stores the actual key, needed for a lookup. In the future it should be updated to
-    # hold the hash
-    current_api_key = f.CharField(max_length=250, db_index=True)
+    # It holds the hash of the secret part of the key (see `KeyStore.hash_digest()`), while the public prefix of
+    # the key is stored as is in `api_key_prefix`, which is what keys are looked up by
+    current_api_key = f.CharField(max_length=250)
+    api_key_prefix = f.CharField(max_length=32, db_index=True, default='')
 
-    username = f.CharField(max_length=250)
+    username = f.CharField(max_length=250, unique=True)
     password_hash = f.CharField(max_length=250)
 
     first_name = f.CharField(max_length=250)
     last_name = f.CharField(max_length=250)
 
-    email = f.CharField(max_length=250)
+    email = f.CharField(max_length=250, unique=True)
 
     @classmethod
     def make(cls, username, password):
@@ -87,7 +112,30 @@ class AppUser(BaseModel['AppUser'], TimeStampedModel, StatusTrackedModel, UserPr
         return user
 
     def set_password(self, password):
-        self.password_hash = pbkdf2_sha256.using(rounds=29000, salt_size=16).hash(password)
+        with profiled_section('password_hashing'):
+            self.password_hash = hashing_executor.hash(password)
 
     def verify_password(self, password):
-        return pbkdf2_sha256.verify(password, self.password_hash)
+        """
+        Whether the password is the user's. When it is and its hash is outdated (another scheme or cost than the
+        `hashing` config's), the hash is replaced by an up to date one, which the next `save()` writes
+        """
+        with profiled_section('password_hashing'):
+            matches, new_hash = hashing_executor.verify_and_update(password, self.password_hash)
+
+        if new_hash is not None:
+            self.password_hash = new_hash
+        return matches
+
+    async def aset_password(self, password):
+        with profiled_section('password_hashing'):
+            self.password_hash = await hashing_executor.ahash(password)
+
+    async def averify_password(self, password):
+        """ Same as `verify_password()` """
+        with profiled_section('password_hashing'):
+            matches, new_hash = await hashing_executor.averify_and_update(password, self.password_hash)
+
+        if new_hash is not None:
+            self.password_hash = new_hash
+        return matches
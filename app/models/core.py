@@ -1,6 +1,7 @@
 from __future__ import annotations
 from django.db import models
-from typing import TYPE_CHECKING, ClassVar, TypeVar, Generic
+from asgiref.sync import sync_to_async
+from typing import TYPE_CHECKING, Any, ClassVar, Optional, TypeVar, Generic
 
 T = TypeVar('T', bound='BaseModel')
 
@@ -9,5 +10,75 @@ class BaseModel(models.Model, Generic[T]):
 
     objects: models.Manager[T]
 
+    # Values of the concrete fields (by attname) as last loaded from, or written to, the database. Lets `save()`
+    # write only the columns that changed
+    _loaded_values: dict[str, Any]
+
     class Meta:
         abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _snapshot(self):
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            f.attname: getattr(self, f.attname) for f in self._meta.concrete_fields if f.attname not in deferred
+        }
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot()
+
+    def dirty_fields(self) -> Optional[list[str]]:
+        """ Attnames of the fields changed since the instance was loaded or saved, None when it never was """
+        loaded = self.__dict__.get('_loaded_values')
+        if loaded is None:
+            return None
+
+        dirty = []
+        for field in self._meta.concrete_fields:
+            name = field.attname
+            if name in loaded:
+                if getattr(self, name) != loaded[name]:
+                    dirty.append(name)
+            elif name in self.__dict__:
+                # Deferred when loaded, assigned since
+                dirty.append(name)
+
+        return dirty
+
+    def save(self, *args, **kwargs):
+        """
+        Same as `Model.save()`, except that updates of loaded rows only write the changed columns (along with the
+        `auto_now` ones), and nothing at all when no column changed
+        """
+        if not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert') \
+                and not self._state.adding:
+            dirty = self.dirty_fields()
+            if dirty is not None and self._meta.pk.attname not in dirty:
+                if not dirty:
+                    return
+
+                kwargs['update_fields'] = dirty + [
+                    f.attname for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)
+                ]
+
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._snapshot()
+        elif '_loaded_values' in self.__dict__:
+            # The other fields are as dirty as they were
+            for name in update_fields:
+                attname = self._meta.get_field(name).attname
+                self._loaded_values[attname] = getattr(self, attname)
+
+    if not hasattr(models.Model, 'asave'):
+        # Model.asave() only landed in Django 4.2
+        async def asave(self, *args, **kwargs):
+            return await sync_to_async(self.save)(*args, **kwargs)
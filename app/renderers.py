@@ -0,0 +1,60 @@
+import json
+from typing import Any, Callable
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from app.bootstrap.config import Config
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, the stdlib encoder is used without it
+    orjson = None
+
+
+# Types orjson does not handle (Decimal, lazy strings, querysets, ...) and datetimes (so that they get formatted
+# the same as rest_framework does) are passed to rest_framework's encoder
+_encoder = JSONEncoder()
+
+
+def _orjson_dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def _stdlib_dumps(data: Any) -> bytes:
+    # Same output as rest_framework's JSONRenderer (compact and unicode)
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+
+
+def _select_backend() -> tuple[str, Callable[[Any], bytes], Callable[[Any], Any]]:
+    backend = Config.get('runtime.json_backend') or 'auto'
+
+    if backend not in ('auto', 'orjson', 'stdlib'):
+        raise ValueError(f"Unknown json backend '{backend}'")
+
+    if backend == 'orjson' and orjson is None:
+        raise ImportError("The 'orjson' json backend is configured, but orjson is not installed")
+
+    if backend != 'stdlib' and orjson is not None:
+        return 'orjson', _orjson_dumps, orjson.loads
+
+    return 'stdlib', _stdlib_dumps, json.loads
+
+
+# `dumps()` serializes to (UTF-8 encoded) JSON bytes, `loads()` parses JSON (str or bytes)
+json_backend, dumps, loads = _select_backend()
+
+
+class ApiJSONRenderer(BaseRenderer):
+    """ Drop-in replacement of rest_framework's JSONRenderer, rendering with `dumps()` """
+
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        return dumps(data)
@@ -1,17 +1,32 @@
 from django.urls import re_path, path, include
 # from django.http import JsonResponse
 
+from app.bootstrap.config import Config
 from app.communication import ApiRequest, ApiResponse, api_view
 
-from app.core.authentication.apiviews import (
-    upload_picture,
-    signup_user,
-    login_user,
-    user_profile,
-    user_profile_update,
-    user_cred_update,
-    user_password_update
-)
+from app.core.authentication.apiviews import upload_picture
+from app.core.media.views import serve_profile_picture
+from app.core.metrics.views import metrics
+
+# When served over ASGI, use the native async views instead of running the sync ones in a thread pool
+if Config.get_bool('runtime.async_views'):
+    from app.core.authentication.async_apiviews import (
+        signup_user,
+        login_user,
+        user_profile,
+        user_profile_update,
+        user_cred_update,
+        user_password_update
+    )
+else:
+    from app.core.authentication.apiviews import (
+        signup_user,
+        login_user,
+        user_profile,
+        user_profile_update,
+        user_cred_update,
+        user_password_update
+    )
 
 @api_view()
 def not_implemented(_):
@@ -23,6 +38,7 @@ def v1_index(_):
 
 urlpatterns = [
     path("", not_implemented),
+    path("metrics/", metrics),
     path('v1/', include([
         path("", v1_index),
 
@@ -33,5 +49,12 @@ urlpatterns = [
         path('user/profile/update/', user_profile_update),
         path('user/creds/update/', user_cred_update),
         path('user/password/update/', user_password_update),
+
+        # Stored profile pictures, i.e `{2 hex}/{2 hex}/{name}.{ext}` or just `{name}.{ext}` for older uploads
+        re_path(
+            r'^media/w/(?P<location>(?:[0-9a-f]{2}/[0-9a-f]{2}/)?[\w-]+(?:\.\w+)?)$',
+            serve_profile_picture,
+            name='profile-picture'
+        ),
     ]))
 ]
\ No newline at end of file
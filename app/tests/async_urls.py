@@ -0,0 +1,15 @@
+# The v1 routes served by the native async views, as with `runtime.async_views = true` (see app/routes.py)
+from django.urls import path, include
+
+from app.core.authentication import async_apiviews
+
+urlpatterns = [
+    path('api/v1/', include([
+        path('auth/signup/', async_apiviews.signup_user),
+        path('auth/login/', async_apiviews.login_user),
+        path('user/profile/', async_apiviews.user_profile),
+        path('user/profile/update/', async_apiviews.user_profile_update),
+        path('user/creds/update/', async_apiviews.user_cred_update),
+        path('user/password/update/', async_apiviews.user_password_update),
+    ])),
+]
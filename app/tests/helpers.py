@@ -0,0 +1,84 @@
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from app.app_paths import AppPaths
+from app.models.auth import AppUser
+from app.core.throttling.throttles import get_store
+from app.core.authentication.engine import ApiPermissionGate, issue_api_key
+from app.core.authentication.profile_cache import profile_cache
+
+
+def make_user(username: str, current_api_key: str = '-', api_key_prefix: str = '', **fields: Any) -> AppUser:
+    """ A user with a valid profile, without going through the signup (nor hashing a password) """
+    values = {
+        'email': f'{username}@example.com',
+        'password_hash': '-',
+        'first_name': 'First',
+        'last_name': 'Last',
+        'phone_number': '0',
+        'post_code': '0',
+        'address_line_1': '-',
+        'address_line_2': '-',
+        'age': 30,
+        'about_me': '',
+        **fields,
+    }
+    return AppUser.objects.create(
+        username=username, current_api_key=current_api_key, api_key_prefix=api_key_prefix, **values
+    )
+
+
+def temporary_media_root(test: TestCase) -> Path:
+    """ Store the media (see `AppPaths`) of the test in a temporary folder, removed once it is done """
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+
+    test.enterContext(override_settings(MEDIA_ROOT=directory.name))
+    test.enterContext(mock.patch.object(AppPaths, '_profile_pics', None))
+    test.enterContext(mock.patch.object(AppPaths, '_profile_pics_tmp', None))
+
+    return Path(directory.name)
+
+
+def make_image(fmt: str = 'PNG', size: tuple[int, int] = (600, 400), color: str = 'red') -> bytes:
+    from PIL import Image
+
+    with BytesIO() as out:
+        Image.new('RGB', size, color).save(out, format=fmt)
+        return out.getvalue()
+
+
+def clear_process_caches():
+    """ The caches and throttle counters are per process, so they outlive the rows of a test """
+    ApiPermissionGate.principal_cache.clear()
+    ApiPermissionGate.missed_keys.clear()
+    profile_cache.clear()
+    get_store().clear()
+
+
+class ApiTestCase(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_process_caches()
+
+    @staticmethod
+    def login(user: AppUser) -> str:
+        """ Issue an API key to the user, as a login does """
+        api_key = issue_api_key(user)
+        user.save()
+        return api_key
+
+    @staticmethod
+    def auth(api_key: str) -> dict[str, str]:
+        return {'HTTP_AUTHORIZATION': f'Bearer {api_key}'}
+
+    @staticmethod
+    def aauth(api_key: str) -> dict[str, str]:
+        # The async client takes headers by their ASGI (lowercase) name
+        return {'authorization': f'Bearer {api_key}'}
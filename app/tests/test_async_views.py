@@ -0,0 +1,101 @@
+from django.test import override_settings
+
+from app.models.auth import AppUser, ProfilePicture
+
+from app.tests.helpers import ApiTestCase
+
+SIGNUP = {
+    'username': 'async',
+    'email': 'async@example.com',
+    'password': 'password',
+    'first_name': 'First',
+    'last_name': 'Last',
+    'phone_number': '0',
+    'post_code': '0',
+    'address_line_1': '-',
+    'address_line_2': '-',
+    'age': 30,
+    'about_me': '',
+    'profile_pic_handle': 'picture',
+}
+
+
+@override_settings(ROOT_URLCONF='app.tests.async_urls')
+class AsyncViewsTest(ApiTestCase):
+    """ The native async views, as served with `runtime.async_views = true` """
+
+    def setUp(self):
+        super().setUp()
+        ProfilePicture.objects.create(name='picture', location='picture.png')
+
+    async def _post(self, path: str, data: dict, api_key=None, method='post'):
+        headers = self.aauth(api_key) if api_key else {}
+        request = getattr(self.async_client, method)
+        return await request(f'/api/v1/{path}', data, content_type='application/json', **headers)
+
+    async def _login(self, password='password'):
+        return await self._post('auth/login/', {'username': 'async', 'password': password})
+
+    async def test_account_lifecycle(self):
+        response = await self._post('auth/signup/', SIGNUP)
+        self.assertEqual(response.status_code, 200)
+        api_key = response.json()['payload']['api_key']
+
+        response = await self.async_client.get('/api/v1/user/profile/', **self.aauth(api_key))
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()['payload']
+        self.assertEqual((payload['username'], payload['profile_pic_handle']), ('async', 'picture'))
+
+        response = await self._post('user/profile/update/', {'about_me': 'Async'}, api_key, method='patch')
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get('/api/v1/user/profile/', **self.aauth(api_key))
+        self.assertEqual(response.json()['payload']['about_me'], 'Async')
+
+        response = await self._post('user/password/update/', {'password': 'changed'}, api_key)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual((await self._login()).status_code, 401)
+        response = await self._login('changed')
+        self.assertEqual(response.status_code, 200)
+
+        # The login issued another key
+        self.assertEqual(
+            (await self.async_client.get('/api/v1/user/profile/', **self.aauth(api_key))).status_code, 403
+        )
+        new_key = response.json()['payload']['api_key']
+        self.assertEqual(
+            (await self.async_client.get('/api/v1/user/profile/', **self.aauth(new_key))).status_code, 200
+        )
+
+    async def test_taken_fields(self):
+        await AppUser.objects.acreate(
+            username='taken', email='taken@example.com', current_api_key='-', password_hash='-', age=1
+        )
+
+        response = await self._post('auth/signup/', {**SIGNUP, 'username': 'taken'})
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('username', response.json()['payload'])
+
+        api_key = (await self._post('auth/signup/', SIGNUP)).json()['payload']['api_key']
+        response = await self._post('user/creds/update/', {'email': 'taken@example.com'}, api_key, method='patch')
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('email', response.json()['payload'])
+
+        response = await self._post('user/creds/update/', {'email': 'renamed@example.com'}, api_key, method='patch')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await AppUser.objects.aget(username='async')).email, 'renamed@example.com')
+
+    async def test_requires_a_key(self):
+        response = await self.async_client.get('/api/v1/user/profile/')
+        self.assertEqual(response.status_code, 403)
+
+        response = await self._post('user/profile/update/', {'about_me': 'x'}, 'kp.malformed', method='patch')
+        self.assertEqual(response.status_code, 403)
+
+    async def test_inactive_users(self):
+        await self._post('auth/signup/', SIGNUP)
+        await AppUser.objects.filter(username='async').aupdate(is_active=0)
+
+        response = await self._login()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['message'], "User's account is not active")
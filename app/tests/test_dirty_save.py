@@ -0,0 +1,101 @@
+from django.db import connection
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+
+from app.models.auth import AppUser
+
+from app.tests.helpers import ApiTestCase, make_user
+
+
+class DirtySaveTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = AppUser.objects.get(pk=make_user('dirty').pk)
+
+    def _save(self, user: AppUser) -> list[str]:
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_only_the_changed_columns_are_written(self):
+        self.user.first_name = 'Changed'
+        self.user.age = 31
+
+        [update] = self._save(self.user)
+        columns = update.split(' SET ')[1].split(' WHERE ')[0]
+
+        self.assertCountEqual(
+            [assignment.split(' = ')[0].strip('"') for assignment in columns.split(', ')],
+            ['first_name', 'age', 'updated_at']
+        )
+        self.assertEqual(self.user.dirty_fields(), [])
+
+    def test_clean_instances_are_not_written(self):
+        updated_at = self.user.updated_at
+        self.assertEqual(self._save(self.user), [])
+
+        # Nor is an assignment of the same value
+        self.user.first_name = self.user.first_name
+        self.assertEqual(self._save(self.user), [])
+        self.assertEqual(AppUser.objects.get(pk=self.user.pk).updated_at, updated_at)
+
+    def test_the_other_columns_are_kept(self):
+        stale = AppUser.objects.get(pk=self.user.pk)
+        self.user.last_name = 'Concurrent'
+        self.user.save()
+
+        stale.first_name = 'Changed'
+        stale.save()
+
+        fresh = AppUser.objects.get(pk=self.user.pk)
+        self.assertEqual((fresh.first_name, fresh.last_name), ('Changed', 'Concurrent'))
+
+    def test_new_instances_are_inserted(self):
+        user = AppUser(username='new', email='new@example.com', age=1)
+        self.assertIsNone(user.dirty_fields())
+
+        user.save()
+        self.assertEqual(user.dirty_fields(), [])
+        self.assertTrue(AppUser.objects.filter(username='new').exists())
+
+
+class WritesFromCachedUsersTest(ApiTestCase):
+    """ Other workers' saves do not drop the principal cache entries of this one """
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('cached', last_name='Before')
+        self.api_key = self.login(self.user)
+
+        # Cached, and checked against the database
+        self.assertEqual(self._profile()['last_name'], 'Before')
+
+    def _profile(self) -> dict:
+        response = self.client.get('/api/v1/user/profile/', **self.auth(self.api_key))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['payload']
+
+    def _saved_by_another_worker(self, **values):
+        AppUser.objects.filter(pk=self.user.pk).update(updated_at=timezone.now(), **values)
+
+    def test_reads_may_be_served_from_the_cache(self):
+        self._saved_by_another_worker(last_name='Other')
+
+        # Within `check_after`
+        with self.assertNumQueries(0):
+            self.assertEqual(self._profile()['last_name'], 'Before')
+
+    def test_writes_load_the_current_user(self):
+        self._saved_by_another_worker(last_name='Other')
+
+        # Set back to what the cached user still holds
+        response = self.client.patch(
+            '/api/v1/user/profile/update/', {'last_name': 'Before', 'first_name': 'Mine'},
+            content_type='application/json', **self.auth(self.api_key)
+        )
+        self.assertEqual(response.status_code, 200)
+
+        user = AppUser.objects.get(pk=self.user.pk)
+        self.assertEqual((user.first_name, user.last_name), ('Mine', 'Before'))
+        self.assertEqual(self._profile()['last_name'], 'Before')
@@ -0,0 +1,180 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from app.bootstrap.config import Config
+from app.exceptions import ApiException
+from app.utils.passlib_hash import (
+    HashingExecutor,
+    hashing_executor,
+    hash_password,
+    make_policy,
+    calibrate_rounds,
+    _verify_password,
+)
+
+from app.tests.helpers import ApiTestCase, make_user
+
+# Cheap enough for tests
+POLICY = make_policy('pbkdf2_sha256', [], 1000)
+
+
+class HashingExecutorTest(SimpleTestCase):
+
+    def test_pool(self):
+        executor = HashingExecutor(max_workers=1, max_pending=4)
+        self.addCleanup(executor.shutdown)
+
+        hashed = executor._wait(executor.submit(hash_password, 'password', POLICY))
+        self.assertEqual(executor._wait(executor.submit(_verify_password, 'password', hashed, POLICY)), (True, None))
+
+    def test_inline_runs_outside_the_lock(self):
+        executor = HashingExecutor(max_workers=0, max_pending=4)
+        seen = []
+
+        def job():
+            # Other requests can submit meanwhile, the job counts as in-flight
+            seen.append((executor._lock.locked(), executor._pending))
+            return 'done'
+
+        self.assertEqual(executor.submit(job).result(), 'done')
+        self.assertEqual(seen, [(False, 1)])
+        self.assertEqual(executor._pending, 0)
+
+    def test_inline_failures(self):
+        executor = HashingExecutor(max_workers=0, max_pending=4)
+
+        future = executor.submit(int, 'not a number')
+        self.assertRaises(ValueError, future.result)
+        self.assertEqual(executor._pending, 0)
+
+    def test_saturated(self):
+        executor = HashingExecutor(max_workers=0, max_pending=2)
+        def job(depth):
+            if depth < 2:
+                executor.submit(job, depth + 1).result()
+            return depth
+
+        with self.assertRaises(ApiException) as raised:
+            executor.submit(job, 0).result()
+
+        self.assertEqual(raised.exception.code, 503)
+        self.assertEqual(executor._pending, 0)
+
+        # Room again
+        self.assertEqual(executor.submit(job, 2).result(), 2)
+
+    def test_concurrent_inline_jobs(self):
+        executor = HashingExecutor(max_workers=0, max_pending=8)
+        started = threading.Barrier(4, timeout=10)
+
+        def job():
+            # Deadlocks if the jobs run one at a time
+            started.wait()
+            return hash_password('password', POLICY)
+
+        threads = [threading.Thread(target=lambda: executor.submit(job).result()) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=20)
+
+        self.assertFalse(started.broken)
+        self.assertEqual(executor._pending, 0)
+
+
+class HashingPolicyTest(SimpleTestCase):
+
+    @staticmethod
+    def _rounds(hashed: str) -> int:
+        from passlib.hash import pbkdf2_sha256
+        return pbkdf2_sha256.from_string(hashed).rounds
+
+    def test_fixed_rounds(self):
+        hashed = hash_password('password', POLICY)
+        self.assertEqual(self._rounds(hashed), 1000)
+        self.assertEqual(_verify_password('password', hashed, POLICY), (True, None))
+        self.assertEqual(_verify_password('wrong', hashed, POLICY), (False, None))
+
+        # Any other cost is outdated
+        matches, new_hash = _verify_password('password', hashed, make_policy('pbkdf2_sha256', [], 2000))
+        self.assertTrue(matches)
+        self.assertEqual(self._rounds(new_hash), 2000)
+
+    def test_calibrated_rounds_tolerance(self):
+        calibrated = make_policy('pbkdf2_sha256', [], 2000, calibrated=True)
+
+        for (rounds, outdated) in ((1000, False), (4000, False), (999, True), (4001, True)):
+            hashed = hash_password('password', make_policy('pbkdf2_sha256', [], rounds))
+            matches, new_hash = _verify_password('password', hashed, calibrated)
+            with self.subTest(rounds=rounds):
+                self.assertTrue(matches)
+                self.assertEqual(new_hash is not None, outdated)
+
+    def test_legacy_schemes_are_upgraded(self):
+        legacy = hash_password('password', make_policy('sha512_crypt', [], 1000))
+        policy = make_policy('pbkdf2_sha256', ['sha512_crypt'], 1000)
+
+        matches, new_hash = _verify_password('password', legacy, policy)
+        self.assertTrue(matches)
+        self.assertTrue(new_hash.startswith('$pbkdf2-sha256$1000$'))
+
+    def test_default_scheme_always_verifies(self):
+        hashed = hash_password('password', POLICY)
+        policy = make_policy('sha256_crypt', [], 1000)
+
+        matches, new_hash = _verify_password('password', hashed, policy)
+        self.assertTrue(matches)
+        self.assertTrue(new_hash.startswith('$5$'))
+
+    def test_unlisted_schemes_do_not_match(self):
+        legacy = hash_password('password', make_policy('sha512_crypt', [], 1000))
+
+        with self.assertLogs('app.utils.passlib_hash', 'WARNING'):
+            self.assertEqual(_verify_password('password', legacy, POLICY), (False, None))
+
+    def test_calibrate_rounds(self):
+        from passlib.hash import pbkdf2_sha256
+
+        rounds = calibrate_rounds('pbkdf2_sha256', 5)
+        self.assertGreaterEqual(rounds, pbkdf2_sha256.min_rounds)
+        # Two significant digits
+        self.assertEqual(rounds, float(f'{rounds:.2g}'))
+
+        self.assertEqual(calibrate_rounds('pbkdf2_sha256', 0.000001), pbkdf2_sha256.min_rounds)
+
+    def test_executor_policy(self):
+        config = {'hashing.scheme': 'pbkdf2_sha256', 'hashing.rounds': '1500', 'hashing.target_ms': '0'}
+        executor = HashingExecutor(max_workers=0, max_pending=4)
+
+        with mock.patch.object(Config, 'get', side_effect=config.get):
+            policy = executor.policy()
+            self.assertIs(executor.policy(), policy)
+
+        self.assertEqual(self._rounds(executor.hash('password')), 1500)
+        self.assertTrue(executor.verify('password', executor.hash('password')))
+
+    def test_executor_calibrates(self):
+        config = {'hashing.scheme': 'pbkdf2_sha256', 'hashing.target_ms': '5'}
+        executor = HashingExecutor(max_workers=0, max_pending=4)
+
+        with mock.patch.object(Config, 'get', side_effect=config.get):
+            hashed = executor.hash('password')
+
+        self.assertEqual(_verify_password('password', hashed, executor.policy()), (True, None))
+
+
+class RehashOnLoginTest(ApiTestCase):
+
+    def test_outdated_hashes_are_replaced(self):
+        user = make_user('outdated', password_hash=hash_password('password', POLICY))
+
+        response = self.client.post(
+            '/api/v1/auth/login/', {'username': 'outdated', 'password': 'password'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        user.refresh_from_db()
+        self.assertNotEqual(user.password_hash, hash_password('password', POLICY))
+        self.assertEqual(hashing_executor.verify_and_update('password', user.password_hash), (True, None))
@@ -0,0 +1,119 @@
+from io import StringIO
+from unittest import mock
+
+from django.test import TestCase
+from django.core.management import call_command
+
+from app.core.authentication.keystore import KeyStore
+
+from app.tests.helpers import make_user as _make_user
+
+
+def _unchecked(key: KeyStore.GeneratedAPIKey) -> str:
+    # Keys were serialized without a checksum before keys were hashed
+    return f'{KeyStore.API_KEY_APP_PREFIX}{key.prefix}.{key.digest}'
+
+
+class KeyStoreTest(TestCase):
+
+    def test_round_trip(self):
+        key = KeyStore.generate_fresh()
+        serialized = KeyStore.serialize_user(key)
+
+        self.assertTrue(serialized.startswith(KeyStore.API_KEY_APP_PREFIX))
+        self.assertEqual(KeyStore.deserialize_user(serialized), key)
+        self.assertTrue(KeyStore.matches(KeyStore.deserialize_user(serialized), KeyStore.hash_digest(key)))
+
+    def test_only_the_hash_of_the_digest_is_stored(self):
+        key = KeyStore.generate_fresh()
+        stored = KeyStore.hash_digest(key)
+
+        self.assertNotIn(key.digest, stored)
+        self.assertFalse(KeyStore.matches(KeyStore.generate_fresh(), stored))
+        self.assertFalse(KeyStore.matches(key._replace(digest=key.digest[::-1]), stored))
+
+    def test_tampered_keys_are_rejected(self):
+        serialized = KeyStore.serialize_user(KeyStore.generate_fresh())
+        digest_start = len(KeyStore.API_KEY_APP_PREFIX) + 9
+
+        for position in (len(KeyStore.API_KEY_APP_PREFIX), digest_start, len(serialized) - 1):
+            replacement = 'A' if serialized[position] != 'A' else 'B'
+            tampered = serialized[:position] + replacement + serialized[position + 1:]
+            self.assertIsNone(KeyStore.deserialize_user(tampered), tampered)
+
+    def test_malformed_keys_are_rejected(self):
+        serialized = KeyStore.serialize_user(KeyStore.generate_fresh())
+
+        for malformed in ('', 'kp.', serialized[:-1], serialized + 'A', 'xx' + serialized[2:], serialized.upper()):
+            self.assertIsNone(KeyStore.deserialize_user(malformed), malformed)
+
+    def test_unchecked_keys(self):
+        key = KeyStore.generate_fresh()
+        unchecked = _unchecked(key)
+
+        self.assertEqual(KeyStore.deserialize_user(unchecked, accept_unchecked=True), key)
+        self.assertIsNone(KeyStore.deserialize_user(unchecked, accept_unchecked=False))
+
+        # Defaults to `auth.accept_unchecked_keys`
+        with mock.patch.object(KeyStore, 'ACCEPT_UNCHECKED_KEYS', False):
+            self.assertIsNone(KeyStore.deserialize_user(unchecked))
+            self.assertFalse(KeyStore.validate_format(unchecked))
+        with mock.patch.object(KeyStore, 'ACCEPT_UNCHECKED_KEYS', True):
+            self.assertEqual(KeyStore.deserialize_user(unchecked), key)
+
+        # Issued keys pass either way
+        serialized = KeyStore.serialize_user(key)
+        self.assertEqual(KeyStore.deserialize_user(serialized, accept_unchecked=False), key)
+
+
+class MigrateApiKeysTest(TestCase):
+
+    def _migrate(self) -> str:
+        out = StringIO()
+        call_command('migrate_api_keys', batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_plaintext_keys_are_hashed(self):
+        keys = [KeyStore.generate_fresh() for _ in range(5)]
+        users = [_make_user(f'legacy{i}', _unchecked(key)) for (i, key) in enumerate(keys)]
+        malformed = _make_user('malformed', 'not-a-key')
+
+        output = self._migrate()
+        self.assertIn("Migrated 5 api key(s), skipped 1 malformed key(s)", output)
+
+        for (user, key) in zip(users, keys):
+            user.refresh_from_db()
+            self.assertEqual(user.api_key_prefix, key.prefix)
+            self.assertEqual(user.current_api_key, KeyStore.hash_digest(key))
+
+            # The client's key still matches
+            self.assertTrue(KeyStore.matches(KeyStore.deserialize_user(_unchecked(key), True), user.current_api_key))
+
+        malformed.refresh_from_db()
+        self.assertEqual((malformed.api_key_prefix, malformed.current_api_key), ('', 'not-a-key'))
+
+    def test_migrated_keys_are_left_alone(self):
+        key = KeyStore.generate_fresh()
+        user = _make_user('hashed', KeyStore.hash_digest(key), key.prefix)
+        legacy = _make_user('legacy', _unchecked(KeyStore.generate_fresh()))
+
+        self.assertIn("Migrated 1 api key(s)", self._migrate())
+        legacy.refresh_from_db()
+        migrated_hash = legacy.current_api_key
+
+        # Safe to run again
+        self.assertIn("Migrated 0 api key(s)", self._migrate())
+
+        user.refresh_from_db()
+        legacy.refresh_from_db()
+        self.assertEqual(user.current_api_key, KeyStore.hash_digest(key))
+        self.assertEqual(legacy.current_api_key, migrated_hash)
+
+    def test_migrated_keys_authenticate(self):
+        key = KeyStore.generate_fresh()
+        _make_user('legacy', _unchecked(key))
+        self._migrate()
+
+        response = self.client.get('/api/v1/user/profile/', HTTP_AUTHORIZATION=f'Bearer {_unchecked(key)}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['payload']['username'], 'legacy')
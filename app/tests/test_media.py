@@ -0,0 +1,75 @@
+from unittest import mock
+
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from app.bootstrap.config import Config
+from app.models.auth import ProfilePicture
+from app.core.media.views import picture_urls
+from app.core.media.thumbnails import THUMBNAIL_VARIANTS, generate_variants
+
+from app.tests.helpers import ApiTestCase, make_image, temporary_media_root
+
+
+class ServePictureTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = temporary_media_root(self)
+        self.image = make_image()
+
+        response = self.client.post('/api/v1/user/upload-picture/', {'image': SimpleUploadedFile('a.png', self.image)})
+        self.picture = ProfilePicture.objects.get(name=response.json()['payload']['handle'])
+        self.url = picture_urls(self.picture)['original']
+
+    def test_served_with_caching_headers(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.image)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['ETag'], f'"{self.picture.content_hash}.png"')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_not_modified(self):
+        first = self.client.get(self.url)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], first['ETag'])
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other.png"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_found(self):
+        self.assertEqual(self.client.get(self.url.replace('.png', '.gif')).status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/media/w/../db.sqlite').status_code, 404)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_sent_by_the_web_server(self):
+        settings = {'media.accel_redirect_prefix': '/protected-media/w/'}
+        with mock.patch.object(Config, 'get', side_effect=lambda key: settings.get(key, '')):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/w/{self.picture.location}')
+
+    def test_variants(self):
+        self.assertEqual(generate_variants(self.picture), list(THUMBNAIL_VARIANTS))
+        self.picture.variants = ','.join(THUMBNAIL_VARIANTS)
+        self.picture.save()
+
+        urls = picture_urls(self.picture)
+        self.assertEqual(set(urls), {'original', *THUMBNAIL_VARIANTS})
+
+        for (variant, size) in THUMBNAIL_VARIANTS.items():
+            response = self.client.get(urls[variant])
+            self.assertEqual(response.status_code, 200)
+
+            with Image.open(self.media_root / 'w' / self.picture.variant_location(variant, '.png')) as image:
+                self.assertEqual(max(image.size), min(size, 600))
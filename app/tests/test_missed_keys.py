@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from app.core.authentication import engine
+from app.core.authentication.engine import ApiPermissionGate, MissedKeyCache
+from app.core.authentication.keystore import KeyStore
+
+from app.tests.helpers import ApiTestCase, make_user
+
+
+class MissedKeyCacheTest(SimpleTestCase):
+
+    def test_membership(self):
+        cache = MissedKeyCache(max_size=2, ttl=10)
+        for key in ('a', 'b', 'c'):
+            cache.add(key)
+
+        self.assertNotIn('a', cache)
+        self.assertIn('b', cache)
+        self.assertIn('c', cache)
+
+        cache.discard('b')
+        self.assertNotIn('b', cache)
+
+        with mock.patch.object(engine.time, 'monotonic', return_value=engine.time.monotonic() + 11):
+            self.assertNotIn('c', cache)
+
+    def test_disabled(self):
+        cache = MissedKeyCache(max_size=10, ttl=0)
+        cache.add('a')
+        self.assertNotIn('a', cache)
+
+
+class GateMissedKeysTest(ApiTestCase):
+
+    def _status(self, api_key: str) -> int:
+        return self.client.get('/api/v1/user/profile/', **self.auth(api_key)).status_code
+
+    def test_unknown_keys_are_looked_up_once(self):
+        unknown = KeyStore.serialize_user(KeyStore.generate_fresh())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self._status(unknown), 403)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._status(unknown), 403)
+
+        self.assertIn(unknown, ApiPermissionGate.missed_keys)
+
+    def test_malformed_keys_are_not_remembered(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self._status('kp.malformed'), 403)
+
+        self.assertEqual(ApiPermissionGate.missed_keys.stats()['size'], 0)
+
+    def test_issued_keys_are_discarded(self):
+        key = KeyStore.generate_fresh()
+        serialized = KeyStore.serialize_user(key)
+        self.assertEqual(self._status(serialized), 403)
+
+        with mock.patch.object(KeyStore, 'generate_fresh', return_value=key):
+            self.assertEqual(self.login(make_user('late')), serialized)
+
+        self.assertEqual(self._status(serialized), 200)
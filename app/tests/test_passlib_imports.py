@@ -0,0 +1,50 @@
+import sys
+import subprocess
+
+from django.test import SimpleTestCase
+
+from app.utils import passlib_hash, resolve_root
+
+
+def _imported_after(code: str) -> set[str]:
+    """ The passlib handler modules imported by a fresh interpreter once it ran `code` """
+    script = (
+        "import sys\n"
+        f"{code}\n"
+        "print(','.join(sorted(m for m in sys.modules if m.startswith('passlib.handlers.'))))"
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', script], cwd=resolve_root('.'), capture_output=True, text=True, check=True
+    ).stdout
+    return set(filter(None, output.strip().split(',')))
+
+
+class LazyPasslibImportTest(SimpleTestCase):
+
+    def test_handlers_are_imported_on_use(self):
+        self.assertEqual(_imported_after("import app.utils.passlib_hash"), set())
+        self.assertEqual(
+            _imported_after("from app.utils.passlib_hash import pbkdf2_sha256"), {'passlib.handlers.pbkdf2'}
+        )
+        self.assertEqual(
+            _imported_after("from app.utils.passlib_hash import make_policy\nmake_policy('pbkdf2_sha256', [], 0)"),
+            {'passlib.handlers.pbkdf2'}
+        )
+
+    def test_every_handler_is_mapped(self):
+        from passlib.registry import _locations
+
+        self.assertEqual(
+            passlib_hash._HANDLER_MODULES,
+            {name: location.rsplit('.', 1)[1] for (name, location) in _locations.items()}
+        )
+
+    def test_resolved_handlers(self):
+        from passlib.hash import pbkdf2_sha256, md5_crypt
+
+        self.assertIs(passlib_hash.get_handler('pbkdf2_sha256'), pbkdf2_sha256)
+        self.assertIs(passlib_hash.md5_crypt, md5_crypt)
+        self.assertIn('bcrypt', dir(passlib_hash))
+
+        with self.assertRaises(AttributeError):
+            passlib_hash.get_handler('unknown')
@@ -0,0 +1,68 @@
+from django.test import RequestFactory
+
+from auth_core import Allow, Deny, AclContext, TraitSpec
+
+from app.models.auth import AppUser
+from app.core.authentication.engine import TR, ApiPermissionGate
+
+from app.tests.helpers import ApiTestCase, make_user
+
+
+class _PlainContext(object):
+    """ Not an `AclContext`, evaluated rule by rule """
+    def __init__(self, *acl):
+        self.acl = acl
+
+
+PUBLIC = AclContext.trait_singular(TR.Everyone)
+MEMBERS = AclContext.trait_singular(TR.Authenticated)
+GUESTS_ONLY = AclContext((Allow, TraitSpec(TR.Everyone) & ~TraitSpec(TR.Authenticated), {'access'}))
+HIDDEN = _PlainContext((Allow, TR.Everyone, {'access'}), (Deny, TR.Everyone, {'access'}))
+
+
+class FilterPermittedTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('member')
+        self.api_key = self.login(self.user)
+
+    def _gate(self, api_key=None) -> ApiPermissionGate:
+        extra = self.auth(api_key) if api_key else {}
+        return ApiPermissionGate(RequestFactory().get('/', **extra))
+
+    def test_mixed_listing(self):
+        listing = [(i, context) for i in range(10) for context in (PUBLIC, MEMBERS, GUESTS_ONLY, HIDDEN)]
+
+        def context_of(item):
+            return item[1]
+
+        member = self._gate(self.api_key)
+        self.assertEqual(member.user, self.user)
+        self.assertEqual(
+            member.filter_permitted('access', listing, context_of, chunk_size=3),
+            [item for item in listing if item[1] in (PUBLIC, MEMBERS)]
+        )
+
+        guest = self._gate()
+        self.assertIsNone(guest.user)
+        self.assertEqual(
+            guest.filter_permitted('access', listing, context_of),
+            [item for item in listing if item[1] in (PUBLIC, GUESTS_ONLY)]
+        )
+
+        # No rule grants it
+        self.assertEqual(member.filter_permitted('delete', listing, context_of), [])
+        self.assertEqual(member.filter_permitted('access', [], context_of), [])
+
+    def test_queryset(self):
+        for age in range(1, 8):
+            make_user(f'aged{age}', age=age)
+
+        def context_of(user):
+            return MEMBERS if user.age % 2 else HIDDEN
+
+        queryset = AppUser.objects.filter(username__startswith='aged').order_by('age')
+        permitted = self._gate(self.api_key).filter_permitted('access', queryset, context_of, chunk_size=2)
+
+        self.assertEqual([user.age for user in permitted], [1, 3, 5, 7])
@@ -0,0 +1,119 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from app.models.auth import AppUser
+from app.core.authentication import engine
+from app.core.authentication.engine import ApiPermissionGate, PrincipalCache
+
+from app.tests.helpers import ApiTestCase, make_user
+
+
+def _later(seconds: float):
+    """ Moves the clock of the caches `seconds` ahead """
+    return mock.patch.object(engine.time, 'monotonic', return_value=engine.time.monotonic() + seconds)
+
+
+class PrincipalCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = PrincipalCache(max_size=2, ttl=10, check_after=2)
+
+    @staticmethod
+    def _user(pk: int) -> AppUser:
+        return AppUser(pk=pk, username=f'user{pk}', email=f'user{pk}@example.com', age=pk)
+
+    def test_hits_are_fresh_instances(self):
+        self.cache.put('key', self._user(1))
+
+        (first, needs_check), (second, _) = self.cache.get('key'), self.cache.get('key')
+        self.assertFalse(needs_check)
+        self.assertIsNot(first, second)
+        self.assertEqual((first.pk, first.username, first.age), (1, 'user1', 1))
+
+        # Not shared with the cached values
+        first.username = 'changed'
+        self.assertEqual(self.cache.get('key')[0].username, 'user1')
+
+    def test_checked_after_a_while(self):
+        self.cache.put('key', self._user(1))
+
+        with _later(3):
+            self.assertTrue(self.cache.get('key')[1])
+            self.cache.confirm('key')
+            self.assertFalse(self.cache.get('key')[1])
+
+    def test_entries_expire(self):
+        self.cache.put('key', self._user(1))
+
+        with _later(11):
+            self.assertEqual(self.cache.get('key'), (None, False))
+        self.assertEqual(self.cache.get('key'), (None, False))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for pk in (1, 2):
+            self.cache.put(f'key{pk}', self._user(pk))
+        self.cache.get('key1')
+        self.cache.put('key3', self._user(3))
+
+        self.assertIsNone(self.cache.get('key2')[0])
+        self.assertIsNotNone(self.cache.get('key1')[0])
+        self.assertIsNotNone(self.cache.get('key3')[0])
+
+    def test_a_user_has_a_single_entry(self):
+        self.cache.put('old', self._user(1))
+        self.cache.put('new', self._user(1))
+        self.assertIsNone(self.cache.get('old')[0])
+
+        self.cache.invalidate_user(1)
+        self.assertIsNone(self.cache.get('new')[0])
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_disabled(self):
+        cache = PrincipalCache(max_size=0, ttl=10, check_after=2)
+        cache.put('key', self._user(1))
+        self.assertEqual(cache.get('key'), (None, False))
+
+
+class GatePrincipalCacheTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('cached')
+        self.api_key = self.login(self.user)
+
+    def _status(self, api_key=None) -> int:
+        return self.client.get('/api/v1/user/profile/', **self.auth(api_key or self.api_key)).status_code
+
+    def test_cached_lookups(self):
+        self.assertEqual(self._status(), 200)
+
+        hits = ApiPermissionGate.principal_cache.hits
+        with self.assertNumQueries(0):
+            self.assertEqual(self._status(), 200)
+        self.assertEqual(ApiPermissionGate.principal_cache.hits, hits + 1)
+
+    def test_saves_drop_the_entry(self):
+        self.assertEqual(self._status(), 200)
+
+        old_key = self.api_key
+        self.api_key = self.login(self.user)
+        self.assertEqual(self._status(old_key), 403)
+        self.assertEqual(self._status(), 200)
+
+        self.user.is_active = 0
+        self.user.save()
+        self.assertEqual(self._status(), 403)
+
+    def test_saves_of_other_workers_show_after_check_after(self):
+        self.assertEqual(self._status(), 200)
+
+        # Does not go through this worker's signals
+        AppUser.objects.filter(pk=self.user.pk).update(is_active=0, updated_at=timezone.now())
+        self.assertEqual(self._status(), 200)
+
+        with _later(3):
+            with self.assertNumQueries(2):
+                # Checked, then loaded again
+                self.assertEqual(self._status(), 403)
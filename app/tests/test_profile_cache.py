@@ -0,0 +1,61 @@
+from django.test import override_settings
+
+from app.models.auth import ProfilePicture
+from app.core.authentication.profile_cache import profile_cache
+
+from app.tests.helpers import ApiTestCase, make_user
+
+
+class ProfileCacheTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        picture = ProfilePicture.objects.create(name='picture', location='ab/cd/picture.png', variants='sm')
+        self.user = make_user('pictured', profile_picture=picture)
+        self.api_key = self.login(self.user)
+
+    def _get_profile(self):
+        return self.client.get('/api/v1/user/profile/', **self.auth(self.api_key))
+
+    def test_hits_run_no_query(self):
+        first = self._get_profile()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['payload']['profile_pic_handle'], 'picture')
+
+        hits = profile_cache.stats()['hits']
+        # Principal and profile both cached
+        with self.assertNumQueries(0):
+            second = self._get_profile()
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(profile_cache.stats()['hits'], hits + 1)
+
+    def test_saves_drop_the_entry(self):
+        self._get_profile()
+
+        self.user.about_me = 'Changed'
+        self.user.save()
+
+        self.assertEqual(self._get_profile().json()['payload']['about_me'], 'Changed')
+
+    def test_picture_saves_drop_the_entry(self):
+        self._get_profile()
+
+        picture = self.user.profile_picture
+        picture.variants = 'sm,md'
+        picture.save()
+
+        self.assertEqual(set(self._get_profile().json()['payload']['profile_pic_urls']), {'original', 'sm', 'md'})
+
+    @override_settings(ROOT_URLCONF='app.tests.async_urls')
+    async def test_async_hits(self):
+        first = await self.async_client.get('/api/v1/user/profile/', **self.aauth(self.api_key))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['payload']['profile_pic_handle'], 'picture')
+
+        # The user now comes from the principal cache, without its picture loaded
+        for _ in range(2):
+            response = await self.async_client.get('/api/v1/user/profile/', **self.aauth(self.api_key))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, first.content)
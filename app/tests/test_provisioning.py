@@ -0,0 +1,88 @@
+import os
+import csv
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+
+from app.models.auth import AppUser, ProfilePicture
+
+from app.tests.helpers import ApiTestCase, make_user
+
+COLUMNS = (
+    'username', 'email', 'password', 'first_name', 'last_name', 'phone_number', 'post_code', 'address_line_1',
+    'address_line_2', 'age', 'about_me', 'profile_pic_handle',
+)
+
+
+def _row(username, email=None, age=30, picture=''):
+    return (username, email or f'{username}@example.com', 'password', 'First', 'Last', '0', '0', '-', '-', age, '',
+            picture)
+
+
+class ProvisionUsersTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        ProfilePicture.objects.create(name='picture', location='picture.png')
+        make_user('taken')
+
+    def _provision(self, rows, *args) -> list[dict]:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'users.csv')
+
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+
+        report = StringIO()
+        call_command('provision_users', path, '--workers', '0', *args, stdout=report, stderr=StringIO())
+        return [json.loads(line) for line in report.getvalue().splitlines()]
+
+    def test_report(self):
+        report = self._provision([
+            _row('alice', picture='picture'),
+            _row('bob', age=0),
+            # Claimed by the rejected row above
+            _row('bob', email='bob2@example.com'),
+            _row('taken', email='taken2@example.com'),
+            _row('alice2', email='alice@example.com'),
+            _row('carol', picture='unknown'),
+            _row('dave'),
+        ], '--batch-size', '3')
+
+        self.assertEqual([(entry['line'], entry['username']) for entry in report], [
+            (2, 'alice'), (3, 'bob'), (4, 'bob'), (5, 'taken'), (6, 'alice2'), (7, 'carol'), (8, 'dave'),
+        ])
+        errors = [entry.get('errors') for entry in report]
+        self.assertIsNone(errors[0])
+        self.assertEqual(list(errors[1]), ['age'])
+        self.assertEqual(errors[2], {'username': ["Username already taken"]})
+        self.assertEqual(errors[3], {'username': ["Username already taken"]})
+        self.assertEqual(errors[4], {'email': ["Email already taken"]})
+        self.assertEqual(errors[5], {'profile_pic_handle': ["Unknown profile picture"]})
+        self.assertIsNone(errors[6])
+
+        self.assertEqual(
+            set(AppUser.objects.values_list('username', flat=True)), {'taken', 'alice', 'dave'}
+        )
+        self.assertEqual(AppUser.objects.get(username='alice').profile_picture.name, 'picture')
+        self.assertIsNone(AppUser.objects.get(username='dave').profile_picture)
+
+        # The reported keys log in
+        response = self.client.get('/api/v1/user/profile/', **self.auth(report[0]['api_key']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['payload']['username'], 'alice')
+
+    def test_imported_again(self):
+        rows = [_row('alice'), _row('bob', age=0)]
+        self._provision(rows)
+
+        report = self._provision(rows)
+        self.assertEqual(
+            report[0]['errors'], {'username': ["Username already taken"], 'email': ["Email already taken"]}
+        )
+        self.assertEqual(list(report[1]['errors']), ['age'])
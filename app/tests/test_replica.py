@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+
+from app.models.auth import AppUser
+from app.core.database import routing
+from app.core.database.routing import REPLICA_DB_ALIAS, PrimaryPins, reading_replica
+from app.core.authentication.engine import ApiPermissionGate
+
+from app.tests.helpers import ApiTestCase, clear_process_caches, make_user
+
+
+@override_settings(DATABASE_ROUTERS=['app.core.database.routing.ReplicaRouter'])
+class ReplicaRoutingTest(TransactionTestCase):
+    """ The primary is the test database, the replica a copy of it in another file which is never written to """
+
+    def setUp(self):
+        super().setUp()
+        clear_process_caches()
+
+        self.user = make_user('replicated')
+        self.api_key = ApiTestCase.login(self.user)
+
+        # The users saved by this worker so far have been replicated
+        pins = mock.patch.object(ApiPermissionGate, 'primary_pins', PrimaryPins(max_size=100, ttl=10))
+        pins.start()
+        self.addCleanup(pins.stop)
+
+        self._copy_to_replica()
+
+    def _copy_to_replica(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'replica.sqlite')
+
+        primary = connections['default']
+        primary.ensure_connection()
+        with sqlite3.connect(path) as replica:
+            primary.connection.backup(replica)
+        replica.close()
+
+        # Also seen by the routing middleware, which is only installed along a replica
+        connections.settings[REPLICA_DB_ALIAS] = {**connections.settings['default'], 'NAME': path}
+        self.addCleanup(self._remove_replica)
+
+    @staticmethod
+    def _remove_replica():
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        del connections.settings[REPLICA_DB_ALIAS]
+
+    def _profile(self, api_key=None) -> dict:
+        response = self.client.get('/api/v1/user/profile/', HTTP_AUTHORIZATION=f'Bearer {api_key or self.api_key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(reading_replica())
+        return response.json()['payload']
+
+    def test_get_requests_load_the_user_from_the_replica(self):
+        # Not replicated yet, and bypasses the signals (so it is not pinned)
+        AppUser.objects.filter(pk=self.user.pk).update(first_name='Primary')
+
+        self.assertEqual(self._profile()['first_name'], 'First')
+        self.assertEqual(AppUser.objects.get(pk=self.user.pk).first_name, 'Primary')
+
+    def test_users_saved_by_this_worker_load_from_the_primary(self):
+        self.user.first_name = 'Saved'
+        self.user.save()
+
+        self.assertIn(self.user.api_key_prefix, ApiPermissionGate.primary_pins)
+        self.assertEqual(self._profile()['first_name'], 'Saved')
+
+        # Until the replica has caught up
+        with mock.patch.object(routing.time, 'monotonic', return_value=routing.time.monotonic() + 11):
+            self.assertNotIn(self.user.api_key_prefix, ApiPermissionGate.primary_pins)
+
+    def test_keys_issued_after_the_copy_fall_back_to_the_primary(self):
+        # Not pinned either
+        with mock.patch.object(ApiPermissionGate.primary_pins, 'ttl', 0):
+            api_key = ApiTestCase.login(make_user('late'))
+
+        self.assertEqual(self._profile(api_key)['username'], 'late')
+
+    def test_no_replica_reads_outside_requests(self):
+        AppUser.objects.filter(pk=self.user.pk).update(first_name='Primary')
+
+        self.assertFalse(reading_replica())
+        self.assertEqual(AppUser.objects.get(pk=self.user.pk).first_name, 'Primary')
+
+
+class PrimaryPinsTest(ApiTestCase):
+
+    def test_pins_expire(self):
+        pins = PrimaryPins(max_size=2, ttl=10)
+        for key in ('a', 'b', 'c'):
+            pins.pin(key)
+
+        # The oldest is dropped past `max_size`
+        self.assertNotIn('a', pins)
+        self.assertIn('b', pins)
+        self.assertIn('c', pins)
+
+        with mock.patch.object(routing.time, 'monotonic', return_value=routing.time.monotonic() + 11):
+            self.assertNotIn('c', pins)
+
+    def test_no_replica_pins_nothing(self):
+        pins = PrimaryPins(max_size=2, ttl=0)
+        pins.pin('a')
+        self.assertNotIn('a', pins)
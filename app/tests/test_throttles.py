@@ -0,0 +1,151 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from app.core.throttling import store, throttles
+from app.core.throttling.store import MemoryThrottleStore, SharedMemoryThrottleStore
+from app.core.throttling.throttles import parse_rate
+
+from app.tests.helpers import ApiTestCase
+
+# Start of a fixed window of 60 seconds
+NOW = 60.0 * 100000
+
+
+def _at(seconds: float):
+    return mock.patch.object(store.time, 'time', return_value=seconds)
+
+
+class ThrottleStoreTests:
+    """ Run against each store """
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def test_limit(self):
+        counters = self.make_store()
+
+        with _at(NOW + 10):
+            self.assertEqual([counters.hit('key', 3, 60) for _ in range(4)], [(True, 0)] * 3 + [(False, 50)])
+            # Other keys have their own counters
+            self.assertEqual(counters.hit('other', 3, 60), (True, 0))
+
+    def test_sliding_window(self):
+        counters = self.make_store()
+        with _at(NOW + 50):
+            for _ in range(4):
+                counters.hit('key', 4, 60)
+
+        # The previous window still weighs 11/12 of its hits
+        with _at(NOW + 65):
+            self.assertEqual(counters.hit('key', 4, 60), (True, 0))
+            allowed, retry_after = counters.hit('key', 4, 60)
+            self.assertFalse(allowed)
+            # Until a quarter of the previous window has slid out (3 + 1 hits)
+            self.assertEqual(retry_after, 10)
+
+        with _at(NOW + 180):
+            self.assertEqual(counters.hit('key', 4, 60), (True, 0))
+
+    def test_clear(self):
+        counters = self.make_store()
+        with _at(NOW):
+            counters.hit('key', 1, 60)
+            counters.clear()
+            self.assertEqual(counters.hit('key', 1, 60), (True, 0))
+
+
+class MemoryThrottleStoreTest(ThrottleStoreTests, SimpleTestCase):
+
+    def make_store(self):
+        return MemoryThrottleStore(shards=4, max_keys=100)
+
+    def test_max_keys(self):
+        counters = MemoryThrottleStore(shards=1, max_keys=2)
+        with _at(NOW):
+            for key in ('a', 'b', 'c'):
+                counters.hit(key, 1, 60)
+
+            # The oldest key was forgotten
+            self.assertEqual(counters.hit('a', 1, 60), (True, 0))
+            self.assertFalse(counters.hit('c', 1, 60)[0])
+
+
+class SharedMemoryThrottleStoreTest(ThrottleStoreTests, SimpleTestCase):
+
+    def make_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SharedMemoryThrottleStore(os.path.join(directory.name, 'throttle'), shards=4, slots_per_shard=16)
+
+    def test_shared_between_instances(self):
+        first = self.make_store()
+        second = SharedMemoryThrottleStore(first.path, shards=4, slots_per_shard=16)
+
+        with _at(NOW):
+            self.assertTrue(first.hit('key', 1, 60)[0])
+            self.assertFalse(second.hit('key', 1, 60)[0])
+
+
+class ParseRateTest(SimpleTestCase):
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/60'), (10, 60.0))
+        self.assertEqual(parse_rate('5'), (5, 1.0))
+        self.assertIsNone(parse_rate(''))
+        self.assertRaises(ValueError, parse_rate, '0/60')
+
+
+class LoginThrottleTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # All in the same window, whenever the test runs
+        self.enterContext(_at(NOW))
+
+    def _login(self, username: str, address: str = '10.0.0.1'):
+        return self.client.post(
+            '/api/v1/auth/login/', {'username': username, 'password': 'password'},
+            content_type='application/json', REMOTE_ADDR=address
+        )
+
+    def test_by_username(self):
+        limit, _ = throttles.login_by_username.rate
+
+        for i in range(limit):
+            self.assertEqual(self._login('target', f'10.0.1.{i}').status_code, 401)
+
+        response = self._login(' Target', '10.0.2.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        self.assertEqual(self._login('someone else', '10.0.2.1').status_code, 401)
+
+    def test_by_address(self):
+        limit, _ = throttles.login_by_ip.rate
+
+        for i in range(limit):
+            self.assertEqual(self._login(f'user{i}').status_code, 401)
+
+        response = self._login('another')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self._login('another', '10.0.0.2').status_code, 401)
+
+    @override_settings(ROOT_URLCONF='app.tests.async_urls')
+    def test_async_views(self):
+        limit, _ = throttles.login_by_ip.rate
+
+        for i in range(limit):
+            self._login(f'user{i}')
+
+        self.assertEqual(self._login('another').status_code, 429)
+
+    def test_disabled(self):
+        limit, _ = throttles.login_by_ip.rate
+
+        with mock.patch.object(throttles, 'throttling_enabled', False):
+            for i in range(limit + 1):
+                self.assertEqual(self._login(f'user{i}').status_code, 401)
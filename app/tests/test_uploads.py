@@ -0,0 +1,72 @@
+import hashlib
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from app.models.auth import ProfilePicture
+from app.core.media.uploads import sniff_image_extension
+
+from app.tests.helpers import ApiTestCase, make_image, temporary_media_root
+
+UPLOAD_PATH = '/api/v1/user/upload-picture/'
+
+
+class UploadPictureTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = temporary_media_root(self)
+        self.image = make_image()
+
+    def _upload(self, data: bytes, name='picture.png', field='image', **extra):
+        return self.client.post(UPLOAD_PATH, {field: SimpleUploadedFile(name, data), **extra})
+
+    def test_stored_by_content_hash(self):
+        response = self._upload(self.image)
+        self.assertEqual(response.status_code, 200)
+
+        digest = hashlib.sha256(self.image).hexdigest()
+        picture = ProfilePicture.objects.get(name=response.json()['payload']['handle'])
+        self.assertEqual((picture.content_hash, picture.location), (digest, f'{digest[:2]}/{digest[2:4]}/{digest}.png'))
+        self.assertEqual((self.media_root / 'w' / picture.location).read_bytes(), self.image)
+
+        # No upload left behind
+        self.assertEqual(list((self.media_root / 'w' / '.tmp').iterdir()), [])
+
+    def test_identical_images_are_stored_once(self):
+        first = self._upload(self.image, name='first.png').json()['payload']['handle']
+        second = self._upload(self.image, name='second.jpg').json()['payload']['handle']
+        other = self._upload(make_image(color='blue')).json()['payload']['handle']
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(ProfilePicture.objects.count(), 2)
+
+    def test_the_format_is_sniffed(self):
+        response = self._upload(make_image('JPEG'), name='picture.png')
+        picture = ProfilePicture.objects.get(name=response.json()['payload']['handle'])
+        self.assertTrue(picture.location.endswith('.jpg'))
+
+        self.assertEqual(self._upload(b'<svg></svg>', name='picture.svg').status_code, 415)
+        self.assertEqual(self._upload(b'\x89PNG', name='short.png').status_code, 415)
+
+    def test_size_cap(self):
+        with mock.patch('app.core.media.uploads.max_picture_size', return_value=len(self.image) - 1):
+            self.assertEqual(self._upload(self.image).status_code, 413)
+
+        self.assertFalse(ProfilePicture.objects.exists())
+        self.assertEqual(list((self.media_root / 'w' / '.tmp').iterdir()), [])
+
+    def test_only_a_single_image(self):
+        self.assertEqual(self._upload(self.image, field='other').status_code, 400)
+        self.assertEqual(
+            self._upload(self.image, other=SimpleUploadedFile('other.png', self.image)).status_code, 400
+        )
+        self.assertEqual(self.client.post(UPLOAD_PATH, {'name': 'no image'}).status_code, 400)
+
+        self.assertFalse(ProfilePicture.objects.exists())
+
+    def test_sniff_image_extension(self):
+        self.assertEqual(sniff_image_extension(make_image('GIF')), '.gif')
+        self.assertEqual(sniff_image_extension(make_image('WEBP')), '.webp')
+        self.assertEqual(sniff_image_extension(b'RIFF\x00\x00\x00\x00WAVE'), None)
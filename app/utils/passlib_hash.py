@@ -1,73 +1,132 @@
 # type: ignore
 
-# OK this file exists only for proper typechecking, since passlib has some issues regarding typesafe imports
-
-from typing import TYPE_CHECKING
-
-from passlib.hash import (
-    argon2,
-    bcrypt,
-    bcrypt_sha256,
-    cisco_asa,
-    cisco_pix,
-    cisco_type7,
-    bigcrypt,
-    bsdi_crypt,
-    crypt16,
-    des_crypt,
-    hex_md4,
-    hex_md5,
-    hex_sha1,
-    hex_sha256,
-    hex_sha512,
-    htdigest,
-    django_bcrypt,
-    django_bcrypt_sha256,
-    django_des_crypt,
-    django_disabled,
-    django_pbkdf2_sha1,
-    django_pbkdf2_sha256,
-    django_salted_md5,
-    django_salted_sha1,
-    fshp,
-    apr_md5_crypt,
-    md5_crypt,
-    plaintext,
-    unix_disabled,
-    unix_fallback,
-    mssql2000,
-    mssql2005,
-    mysql323,
-    mysql41,
-    oracle10,
-    oracle11,
-    atlassian_pbkdf2_sha1,
-    cta_pbkdf2_sha1,
-    dlitz_pbkdf2_sha1,
-    grub_pbkdf2_sha512,
-    ldap_pbkdf2_sha1,
-    ldap_pbkdf2_sha256,
-    ldap_pbkdf2_sha512,
-    pbkdf2_sha1,
-    pbkdf2_sha256,
-    pbkdf2_sha512,
-    phpass,
-    postgres_md5,
-    ldap_hex_md5,
-    ldap_hex_sha1,
-    roundup_plaintext,
-    scram,
-    scrypt,
-    sha1_crypt,
-    sha256_crypt,
-    sha512_crypt,
-    sun_md5_crypt,
-    bsd_nthash,
-    lmhash,
-    msdcc,
-    msdcc2,
-    nthash
-)
+# OK this file exists mainly for proper typechecking, since passlib has some issues regarding typesafe imports.
+# It also hosts the hashing policy and the executor that runs password hashing off the request thread (see bottom of
+# the file)
+
+import math
+import time
+import asyncio
+import logging
+import importlib
+import threading
+import functools
+import multiprocessing
+from typing import TYPE_CHECKING, Optional
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Importing all of `passlib.hash` loads every handler module passlib has (argon2, bcrypt, scrypt, cisco, ...), while
+# the app only ever uses a few of them. Handlers are rather resolved on first access (`from app.utils.passlib_hash
+# import pbkdf2_sha256` or `get_handler('pbkdf2_sha256')`), which only imports the module defining them.
+# See scripts/bench/import_report.py for the difference it makes on boot time and memory.
+
+# Handler name -> module of `passlib.handlers` defining it
+_HANDLER_MODULES = {
+    'argon2': 'argon2',
+    'bcrypt': 'bcrypt',
+    'bcrypt_sha256': 'bcrypt',
+    'cisco_asa': 'cisco',
+    'cisco_pix': 'cisco',
+    'cisco_type7': 'cisco',
+    'bigcrypt': 'des_crypt',
+    'bsdi_crypt': 'des_crypt',
+    'crypt16': 'des_crypt',
+    'des_crypt': 'des_crypt',
+    'hex_md4': 'digests',
+    'hex_md5': 'digests',
+    'hex_sha1': 'digests',
+    'hex_sha256': 'digests',
+    'hex_sha512': 'digests',
+    'htdigest': 'digests',
+    'django_argon2': 'django',
+    'django_bcrypt': 'django',
+    'django_bcrypt_sha256': 'django',
+    'django_des_crypt': 'django',
+    'django_disabled': 'django',
+    'django_pbkdf2_sha1': 'django',
+    'django_pbkdf2_sha256': 'django',
+    'django_salted_md5': 'django',
+    'django_salted_sha1': 'django',
+    'fshp': 'fshp',
+    'ldap_bcrypt': 'ldap_digests',
+    'ldap_bsdi_crypt': 'ldap_digests',
+    'ldap_des_crypt': 'ldap_digests',
+    'ldap_md5': 'ldap_digests',
+    'ldap_md5_crypt': 'ldap_digests',
+    'ldap_plaintext': 'ldap_digests',
+    'ldap_salted_md5': 'ldap_digests',
+    'ldap_salted_sha1': 'ldap_digests',
+    'ldap_salted_sha256': 'ldap_digests',
+    'ldap_salted_sha512': 'ldap_digests',
+    'ldap_sha1': 'ldap_digests',
+    'ldap_sha1_crypt': 'ldap_digests',
+    'ldap_sha256_crypt': 'ldap_digests',
+    'ldap_sha512_crypt': 'ldap_digests',
+    'apr_md5_crypt': 'md5_crypt',
+    'md5_crypt': 'md5_crypt',
+    'plaintext': 'misc',
+    'unix_disabled': 'misc',
+    'unix_fallback': 'misc',
+    'mssql2000': 'mssql',
+    'mssql2005': 'mssql',
+    'mysql323': 'mysql',
+    'mysql41': 'mysql',
+    'oracle10': 'oracle',
+    'oracle11': 'oracle',
+    'atlassian_pbkdf2_sha1': 'pbkdf2',
+    'cta_pbkdf2_sha1': 'pbkdf2',
+    'dlitz_pbkdf2_sha1': 'pbkdf2',
+    'grub_pbkdf2_sha512': 'pbkdf2',
+    'ldap_pbkdf2_sha1': 'pbkdf2',
+    'ldap_pbkdf2_sha256': 'pbkdf2',
+    'ldap_pbkdf2_sha512': 'pbkdf2',
+    'pbkdf2_sha1': 'pbkdf2',
+    'pbkdf2_sha256': 'pbkdf2',
+    'pbkdf2_sha512': 'pbkdf2',
+    'phpass': 'phpass',
+    'postgres_md5': 'postgres',
+    'ldap_hex_md5': 'roundup',
+    'ldap_hex_sha1': 'roundup',
+    'roundup_plaintext': 'roundup',
+    'scram': 'scram',
+    'scrypt': 'scrypt',
+    'sha1_crypt': 'sha1_crypt',
+    'sha256_crypt': 'sha2_crypt',
+    'sha512_crypt': 'sha2_crypt',
+    'sun_md5_crypt': 'sun_md5_crypt',
+    'bsd_nthash': 'windows',
+    'lmhash': 'windows',
+    'msdcc': 'windows',
+    'msdcc2': 'windows',
+    'nthash': 'windows',
+}
+
+
+def get_handler(name: str):
+    """ Returns the passlib handler of the given name, importing its module on first use """
+    handler = globals().get(name)
+    if handler is not None:
+        return handler
+
+    try:
+        module = _HANDLER_MODULES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    handler = getattr(importlib.import_module(f'passlib.handlers.{module}'), name)
+    # Later accesses are plain module attribute lookups
+    globals()[name] = handler
+    return handler
+
+
+def __getattr__(name: str):
+    return get_handler(name)
+
+
+def __dir__():
+    return sorted({*globals(), *_HANDLER_MODULES})
+
 
 if TYPE_CHECKING:
     from passlib.handlers.argon2 import argon2
@@ -75,7 +134,7 @@ if TYPE_CHECKING:
     from passlib.handlers.cisco import cisco_asa, cisco_pix, cisco_type7
     from passlib.handlers.des_crypt import bigcrypt, bsdi_crypt, crypt16, des_crypt
     from passlib.handlers.digests import hex_md4, hex_md5, hex_sha1, hex_sha256, hex_sha512, htdigest
-    from passlib.handlers.django import django_bcrypt, django_bcrypt_sha256, django_des_crypt, django_disabled, django_pbkdf2_sha1, django_pbkdf2_sha256, django_salted_md5, django_salted_sha1
+    from passlib.handlers.django import django_argon2, django_bcrypt, django_bcrypt_sha256, django_des_crypt, django_disabled, django_pbkdf2_sha1, django_pbkdf2_sha256, django_salted_md5, django_salted_sha1
     from passlib.handlers.fshp import fshp
     from passlib.handlers.ldap_digests import ldap_bcrypt, ldap_bsdi_crypt, ldap_des_crypt, ldap_md5, ldap_md5_crypt, ldap_plaintext, ldap_salted_md5, ldap_salted_sha1, ldap_salted_sha256, ldap_salted_sha512, ldap_sha1, ldap_sha1_crypt, ldap_sha256_crypt, ldap_sha512_crypt
     from passlib.handlers.md5_crypt import apr_md5_crypt, md5_crypt
@@ -92,4 +151,259 @@ if TYPE_CHECKING:
     from passlib.handlers.sha1_crypt import sha1_crypt
     from passlib.handlers.sha2_crypt import sha256_crypt, sha512_crypt
     from passlib.handlers.sun_md5_crypt import sun_md5_crypt
-    from passlib.handlers.windows import bsd_nthash, lmhash, msdcc, msdcc2, nthash
\ No newline at end of file
+    from passlib.handlers.windows import bsd_nthash, lmhash, msdcc, msdcc2, nthash
+
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------
+# Hashing policy
+#
+# New hashes are made with `hashing.scheme`, while hashes of the `hashing.legacy_schemes` still verify. The cost
+# (rounds) of the scheme is either fixed, or calibrated once per process so that a hash takes `hashing.target_ms`.
+# Hashes of a legacy scheme or of another cost are outdated, and get replaced on the next successful login.
+#
+# The policy is a serialized `CryptContext`, so that it can be handed to the pool processes along with each job.
+
+# Calibrated costs are only outdated beyond this factor of the target, so that processes which measured slightly
+# different costs do not keep rehashing each other's hashes
+_CALIBRATED_COST_TOLERANCE = 2
+
+# Scheme the app has always hashed with. It keeps verifying whatever `hashing.scheme` gets switched to, so that
+# the hashes already stored do not need `hashing.legacy_schemes` to be set
+DEFAULT_SCHEME = 'pbkdf2_sha256'
+
+
+@functools.lru_cache(maxsize=4)
+def _context(policy: str):
+    from passlib.context import CryptContext
+    return CryptContext.from_string(policy)
+
+
+def calibrate_rounds(scheme: str, target_ms: float) -> int:
+    """ Rounds of `scheme` for a hash to take about `target_ms` milliseconds on this machine """
+    handler = get_handler(scheme)
+    probe = handler.using(rounds=handler.default_rounds)
+
+    elapsed = math.inf
+    for _ in range(3):
+        start = time.perf_counter()
+        probe.hash('calibration')
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    ratio = target_ms / 1000 / elapsed
+    if handler.rounds_cost == 'log2':
+        rounds = handler.default_rounds + math.floor(math.log2(ratio))
+    else:
+        rounds = handler.default_rounds * ratio
+        # Two significant digits, processes calibrating a few percent apart then mostly agree
+        magnitude = 10 ** max(int(math.log10(rounds)) - 1, 0) if rounds >= 1 else 1
+        rounds = int(rounds // magnitude * magnitude)
+
+    return int(min(max(rounds, handler.min_rounds), handler.max_rounds))
+
+
+def make_policy(scheme: str, legacy_schemes: list[str], rounds: int, calibrated: bool = False) -> str:
+    """ Serialized `CryptContext` hashing with `scheme` at `rounds` (0 for passlib's default) """
+    from passlib.context import CryptContext
+
+    handler = get_handler(scheme)
+    rounds = rounds or handler.default_rounds
+
+    if not calibrated:
+        min_rounds = max_rounds = rounds
+    elif handler.rounds_cost == 'log2':
+        tolerance = math.ceil(math.log2(_CALIBRATED_COST_TOLERANCE))
+        min_rounds, max_rounds = rounds - tolerance, rounds + tolerance
+    else:
+        min_rounds, max_rounds = rounds // _CALIBRATED_COST_TOLERANCE, rounds * _CALIBRATED_COST_TOLERANCE
+
+    context = CryptContext(
+        schemes=list(dict.fromkeys((scheme, *legacy_schemes, DEFAULT_SCHEME))),
+        default=scheme,
+        deprecated='auto',
+        **{
+            f'{scheme}__default_rounds': rounds,
+            f'{scheme}__min_rounds': max(min_rounds, handler.min_rounds),
+            f'{scheme}__max_rounds': min(max_rounds, handler.max_rounds),
+        }
+    )
+    return context.to_string()
+
+
+# These run inside the pool processes, so they must stay importable module level functions
+def hash_password(password: str, policy: str) -> str:
+    """
+    Hash with `policy` (see `HashingExecutor.policy()`) in the calling process. Requests go through `hashing_executor`
+    instead, this is for batch jobs running their own pool (e.g provisioning)
+    """
+    return _context(policy).hash(password)
+
+def _verify_password(password: str, hashed: str, policy: str) -> tuple[bool, Optional[str]]:
+    """ Whether the password matches, and the new hash to store when the matching one is outdated """
+    try:
+        return _context(policy).verify_and_update(password, hashed)
+    except ValueError:
+        # A hash of a scheme the policy does not list (e.g dropped from `hashing.legacy_schemes`) can not match.
+        # Its user can not log in until the scheme is listed again, rather than the login failing with a 500
+        logger.warning("Password hash of a scheme missing from the hashing policy")
+        return (False, None)
+
+
+# ------------------------------------------------
+# Password hashing executor
+#
+# Hashing a password is deliberately slow and holds the GIL the whole time. Running it on the request thread
+# starves every other request served by the same worker, so the work is handed off to a small process pool.
+# The number of in-flight jobs is capped: once the pool is saturated new jobs fail fast with a 503 instead of
+# queueing up behind a login storm.
+
+class HashingExecutor:
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._configured = False
+
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        # Calibrating takes a few hashes' time, under its own lock so that it never holds up `_lock`
+        self._policy = None
+        self._policy_lock = threading.Lock()
+
+    def _configure(self):
+        # Read lazily, so that importing this module (e.g from inside the pool processes) never touches the config
+        from app.utils import to_int
+        from app.bootstrap.config import Config
+
+        if self._max_workers is None:
+            self._max_workers = to_int(Config.get('hashing.workers'), 2)
+        if self._max_pending is None:
+            self._max_pending = to_int(Config.get('hashing.max_pending'), 64)
+
+        self._configured = True
+
+    def _make_policy(self) -> str:
+        from app.utils import to_int
+        from app.bootstrap.config import Config
+
+        scheme = Config.get('hashing.scheme') or DEFAULT_SCHEME
+        legacy_schemes = Config.get('hashing.legacy_schemes') or []
+        target_ms = to_int(Config.get('hashing.target_ms'), 0)
+
+        if target_ms <= 0:
+            return make_policy(scheme, legacy_schemes, to_int(Config.get('hashing.rounds'), 0))
+
+        # Measured where the hashing happens
+        rounds = self._wait(self.submit(calibrate_rounds, scheme, target_ms))
+        logger.info("Calibrated %s to %d rounds for %dms per hash", scheme, rounds, target_ms)
+
+        return make_policy(scheme, legacy_schemes, rounds, calibrated=True)
+
+    def policy(self) -> str:
+        """
+        The hashing policy (see `make_policy()`), calibrated on first use. The server entrypoints call it on boot,
+        so that no request waits for the calibration
+        """
+        if self._policy is None:
+            with self._policy_lock:
+                if self._policy is None:
+                    self._policy = self._make_policy()
+        return self._policy
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Do not fork: the parent is a multithreaded server process
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                # A pool process died, start over with a new pool on the next call
+                self._pool = None
+
+    def _wait(self, future: Future):
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # The pool is replaced by `_release()`, this request gets a 503 rather than a 500
+            raise self._saturated_exception()
+
+    async def _await(self, future: Future):
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            raise self._saturated_exception()
+
+    def _saturated_exception(self):
+        from app.exceptions import ApiExceptionCollection
+        return ApiExceptionCollection.ServiceUnavailable.copy_with(msg="Server is busy. Try again later")
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if not self._configured:
+                self._configure()
+
+            if self._pending >= self._max_pending:
+                raise self._saturated_exception()
+
+            # Pool disabled, run inline (on the calling thread, once the lock is released)
+            inline = self._max_workers <= 0
+            if not inline:
+                try:
+                    future = self._get_pool().submit(fn, *args)
+                except BrokenProcessPool:
+                    self._pool = None
+                    raise self._saturated_exception()
+
+            self._pending += 1
+
+        if inline:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+        future.add_done_callback(self._release)
+        return future
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+
+    # Sync surface
+
+    def hash(self, password: str) -> str:
+        return self._wait(self.submit(hash_password, password, self.policy()))
+
+    def verify_and_update(self, password: str, hashed: str) -> tuple[bool, Optional[str]]:
+        """ Whether the password matches, and the new hash to store when the matching one is outdated """
+        return self._wait(self.submit(_verify_password, password, hashed, self.policy()))
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self.verify_and_update(password, hashed)[0]
+
+    # Async surface
+
+    async def ahash(self, password: str) -> str:
+        return await self._await(self.submit(hash_password, password, self.policy()))
+
+    async def averify_and_update(self, password: str, hashed: str) -> tuple[bool, Optional[str]]:
+        return await self._await(self.submit(_verify_password, password, hashed, self.policy()))
+
+    async def averify(self, password: str, hashed: str) -> bool:
+        return (await self.averify_and_update(password, hashed))[0]
+
+
+hashing_executor = HashingExecutor()
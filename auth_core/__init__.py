@@ -10,7 +10,14 @@ from auth_core.policy import (
 
 from auth_core.traits import (
     AgentTraitCollection,
-    TraitSpec
+    TraitSpec,
+    TraitSet,
+    TraitRegistry,
+    trait_registry
+)
+
+from auth_core.compiled import (
+    CompiledAcl,
 )
 
 from auth_core.helpers import (
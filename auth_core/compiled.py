@@ -0,0 +1,223 @@
+from typing import Container, Iterable, Any, Optional, cast
+
+from auth_core.traits import TraitSpec, trait_registry
+
+
+#########################################
+########## COMPILED PREDICATES ##########
+#########################################
+
+
+# Specs are normalized to a disjunction of clauses, each clause being a (required, forbidden) pair of trait
+# masks. Past this many clauses the normal form is not worth it and the spec tree is evaluated as is
+_MAX_CLAUSES = 64
+
+_TRUE = [(0, 0)]
+_FALSE = []
+
+
+def _and_clauses(left: list, right: list) -> list:
+    result = []
+    for (req_l, forb_l) in left:
+        for (req_r, forb_r) in right:
+            req, forb = req_l | req_r, forb_l | forb_r
+            # A clause requiring and forbidding the same trait never matches
+            if req & forb == 0 and (req, forb) not in result:
+                result.append((req, forb))
+
+            if len(result) > _MAX_CLAUSES:
+                raise OverflowError()
+    return result
+
+
+def _or_clauses(left: list, right: list) -> list:
+    result = list(left)
+    for clause in right:
+        if clause not in result:
+            result.append(clause)
+
+    if len(result) > _MAX_CLAUSES:
+        raise OverflowError()
+    return result
+
+
+def _negate_clauses(clauses: list) -> list:
+    # not (c1 or c2 ...) = (not c1) and (not c2) ...
+    # where not (a and b and not c) = (not a) or (not b) or c
+    result = _TRUE
+    for (req, forb) in clauses:
+        negated = []
+        for i in range(max(req.bit_length(), forb.bit_length())):
+            bit = 1 << i
+            if req & bit:
+                negated.append((0, bit))
+            elif forb & bit:
+                negated.append((bit, 0))
+
+        result = _and_clauses(result, negated)
+    return result
+
+
+def _spec_clauses(node) -> list:
+    if not isinstance(node, TraitSpec):
+        return [(trait_registry.bit(node), 0)]
+
+    # Same as `_resolve_control()`: an empty AND node passes, while an empty OR node does not
+    if node.connector == TraitSpec.OPER_AND:
+        clauses = _TRUE
+        for child in node.children:
+            clauses = _and_clauses(clauses, _spec_clauses(child))
+    else:
+        clauses = _FALSE
+        for child in node.children:
+            clauses = _or_clauses(clauses, _spec_clauses(child))
+
+    if node.negated:
+        clauses = _negate_clauses(clauses)
+
+    return clauses
+
+
+class CompiledTraitPredicate(object):
+    """
+        A trait specification (either a single trait or a `TraitSpec` tree) compiled to a check over a trait mask
+    """
+
+    __slots__ = ('clauses', 'any_mask', 'spec')
+
+    def __init__(self, spec):
+        self.clauses: Optional[tuple] = None
+        self.any_mask = 0
+        self.spec = None
+
+        try:
+            clauses = _spec_clauses(spec)
+        except OverflowError:
+            # Too big to normalize, evaluate the tree against the mask instead
+            self.spec = spec
+            return
+
+        # A plain "any of these traits" collapses into a single mask check
+        if clauses and all(forb == 0 and req != 0 and req & (req - 1) == 0 for (req, forb) in clauses):
+            for (req, _) in clauses:
+                self.any_mask |= req
+        else:
+            self.clauses = tuple(clauses)
+
+    def matches(self, trait_mask: int) -> bool:
+        if self.any_mask:
+            return trait_mask & self.any_mask != 0
+
+        if self.clauses is not None:
+            for (req, forb) in self.clauses:
+                if trait_mask & req == req and trait_mask & forb == 0:
+                    return True
+            return False
+
+        return _resolve_mask(self.spec, trait_mask)
+
+
+def _resolve_mask(root_node: TraitSpec, trait_mask: int) -> bool:
+    is_and = root_node.connector == TraitSpec.OPER_AND
+    resolved = is_and
+    for child in root_node.children:
+        if isinstance(child, TraitSpec):
+            resolve_child = _resolve_mask(child, trait_mask)
+        else:
+            resolve_child = trait_mask & trait_registry.lookup(child) != 0
+
+        if is_and != resolve_child:
+            resolved = resolve_child
+            break
+
+    if root_node.negated:
+        resolved = not resolved
+
+    return resolved
+
+
+#########################################
+############# COMPILED ACLS #############
+#########################################
+
+
+class CompiledAcl(object):
+    """
+        An ACL compiled into a decision table. For every permission it holds the rules granting or denying it, most
+        significant (i.e last) rule first, with the trait specifications compiled into mask checks.
+
+        Decisions only depend on the agent's trait mask, so they are memoized per mask as well.
+    """
+
+    # Bound on the number of memoized decisions per permission. Only grows past a handful of entries when traits
+    # are very fine grained (e.g per user)
+    MAX_MEMO_SIZE = 1024
+
+    __slots__ = ('_table', '_rules', '_memo', '_all_memo')
+
+    def __init__(self, acl: Iterable):
+        from auth_core.policy import Allow, Deny
+
+        # (is_allow, predicate, permissions) in ACL order
+        self._rules: list[tuple[bool, CompiledTraitPredicate, frozenset]] = []
+        predicates: dict[Any, CompiledTraitPredicate] = {}
+
+        for (action, trait, granted_perms) in acl:
+            assert (action is Allow or action is Deny), f"Invalid action: {action}"
+
+            # Rules using the same spec object share the predicate
+            key = id(trait) if isinstance(trait, TraitSpec) else ('trait', trait)
+            predicate = predicates.get(key)
+            if predicate is None:
+                predicate = predicates[key] = CompiledTraitPredicate(trait)
+
+            self._rules.append((action is Allow, predicate, frozenset(cast(Container, granted_perms))))
+
+        self._table: dict[Any, tuple] = {}
+        for (is_allow, predicate, perms) in reversed(self._rules):
+            for perm in perms:
+                self._table[perm] = self._table.get(perm, ()) + ((predicate, is_allow),)
+
+        self._memo: dict[Any, dict[int, bool]] = {}
+        self._all_memo: dict[int, frozenset] = {}
+
+    def permits_mask(self, permission, trait_mask: int) -> bool:
+        memo = self._memo.get(permission)
+        if memo is None:
+            memo = self._memo.setdefault(permission, {})
+        else:
+            try:
+                return memo[trait_mask]
+            except KeyError:
+                pass
+
+        allowed = False
+        for (predicate, is_allow) in self._table.get(permission, ()):
+            if predicate.matches(trait_mask):
+                allowed = is_allow
+                break
+
+        if len(memo) < self.MAX_MEMO_SIZE:
+            memo[trait_mask] = allowed
+
+        return allowed
+
+    def all_permissions_mask(self, trait_mask: int) -> frozenset:
+        try:
+            return self._all_memo[trait_mask]
+        except KeyError:
+            pass
+
+        all_perms = set()
+        for (is_allow, predicate, perms) in self._rules:
+            if predicate.matches(trait_mask):
+                if is_allow:
+                    all_perms.update(perms)
+                else:
+                    all_perms.difference_update(perms)
+
+        result = frozenset(all_perms)
+        if len(self._all_memo) < self.MAX_MEMO_SIZE:
+            self._all_memo[trait_mask] = result
+
+        return result
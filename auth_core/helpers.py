@@ -2,11 +2,19 @@ from collections import namedtuple
 
 from auth_core.traits import TraitSpec
 from auth_core.policy import Allow
+from auth_core.compiled import CompiledAcl
 
 class AclContext(object):
-    __slots__ = ('acl')
+    __slots__ = ('acl', '_compiled')
     def __init__(self, *acl):
         self.acl = acl
+        self._compiled = None
+
+    def compile(self) -> CompiledAcl:
+        # Contexts are treated as immutable, so the ACL is only compiled once (on first use)
+        if self._compiled is None:
+            self._compiled = CompiledAcl(self.acl)
+        return self._compiled
 
     @classmethod
     def singular(cls, action, trait, granted_perms):
@@ -1,4 +1,5 @@
 from auth_core.traits import AgentTraitCollection, TraitSpec
+from auth_core.compiled import CompiledAcl
 from typing import Container, Iterable, Any, cast
 
 #######################################
@@ -28,6 +29,13 @@ class AuthorizationPolicy(object):
         """
         raise NotImplemented();
 
+    def permits_many(self, permission, resource_contexts: Iterable, traits: AgentTraitCollection) -> list[bool]:
+        """
+            Same as `permits()`, but for many resources at once. Returns a list with the decision of each of the
+            given contexts, in order
+        """
+        return [self.permits(permission, ctx, traits) for ctx in resource_contexts]
+
 def _resolve_control(root_node: TraitSpec, traits: AgentTraitCollection):
     resolved = root_node.connector == TraitSpec.OPER_AND
     for child in root_node.children:
@@ -52,9 +60,25 @@ def _resolve_control(root_node: TraitSpec, traits: AgentTraitCollection):
     return resolved
 
 
+def _compiled_acl_of(resource_context: Any):
+    """ Returns the compiled ACL of the context, or None if the context can not be compiled """
+    if isinstance(resource_context, CompiledAcl):
+        return resource_context
+
+    compile = getattr(resource_context, 'compile', None)
+    if compile is None:
+        return None
+
+    return compile()
+
+
 class AclAuthorizationPolicy(AuthorizationPolicy):
     def permits(self, permission, resource_context: Any, agent_traits: AgentTraitCollection) -> bool:
 
+        compiled = _compiled_acl_of(resource_context)
+        if compiled is not None:
+            return compiled.permits_mask(permission, agent_traits.trait_mask)
+
         try:
             acl = resource_context.acl
         except AttributeError:
@@ -80,6 +104,10 @@ class AclAuthorizationPolicy(AuthorizationPolicy):
 
 
     def all_permissions(self, resource_context: Any, agent_traits: AgentTraitCollection) -> Iterable:
+        compiled = _compiled_acl_of(resource_context)
+        if compiled is not None:
+            return compiled.all_permissions_mask(agent_traits.trait_mask)
+
         try:
             acl = resource_context.acl
         except AttributeError:
@@ -102,3 +130,25 @@ class AclAuthorizationPolicy(AuthorizationPolicy):
             
         return all_perms
 
+
+    def permits_many(self, permission, resource_contexts: Iterable, agent_traits: AgentTraitCollection) -> list[bool]:
+        # Resources of a listing mostly share a handful of contexts, so each distinct context is only evaluated once.
+        # The contexts are kept referenced alongside the decision, so that their ids can not be reused meanwhile
+        decisions: dict[int, tuple[Any, bool]] = {}
+        trait_mask = agent_traits.trait_mask
+
+        result = []
+        for ctx in resource_contexts:
+            entry = decisions.get(id(ctx))
+            if entry is None:
+                compiled = _compiled_acl_of(ctx)
+                if compiled is not None:
+                    allowed = compiled.permits_mask(permission, trait_mask)
+                else:
+                    allowed = self.permits(permission, ctx, agent_traits)
+
+                entry = decisions[id(ctx)] = (ctx, allowed)
+
+            result.append(entry[1])
+
+        return result
@@ -0,0 +1,157 @@
+import unittest
+from itertools import combinations
+
+from auth_core import Allow, Deny, AclAuthorizationPolicy, AgentTraitCollection, TraitSpec, CompiledAcl, AclContext
+from auth_core.compiled import _MAX_CLAUSES, CompiledTraitPredicate
+
+
+TRAITS = ('everyone', 'authenticated', 'active', 'admin', 'owner', 'banned')
+
+PERMISSIONS = ('read', 'create', 'update', 'delete', 'access', 'unused')
+
+
+class _Traits(AgentTraitCollection):
+    def get_effective_traits(self, agent_handle):
+        return agent_handle
+
+
+class _PlainContext(object):
+    """ Not an `AclContext`, so the policy evaluates its ACL rule by rule """
+    def __init__(self, *acl):
+        self.acl = acl
+
+
+def _wide_spec():
+    # (t0 | t1) & (t2 | t3) & ... normalizes to 2^n clauses, past `_MAX_CLAUSES`
+    spec = TraitSpec()
+    for i in range(7):
+        spec.add(TraitSpec(f'wide_{i}_a') | TraitSpec(f'wide_{i}_b'))
+    return spec
+
+
+def _empty_or_spec():
+    spec = TraitSpec()
+    spec.connector = TraitSpec.OPER_OR
+    return spec
+
+
+ACLS = {
+    'single_traits': (
+        (Allow, 'everyone', {'read'}),
+        (Allow, 'authenticated', {'create', 'update'}),
+    ),
+    'later_rules_override': (
+        (Allow, 'authenticated', {'read', 'update', 'delete'}),
+        (Deny, 'banned', {'update', 'delete'}),
+        (Allow, 'admin', {'delete'}),
+    ),
+    'specs': (
+        (Allow, 'everyone', {'read'}),
+        (Allow, TraitSpec('authenticated') & TraitSpec('active'), {'create'}),
+        (Allow, TraitSpec('admin') | TraitSpec('owner'), {'update'}),
+        (Deny, ~TraitSpec('active'), {'create', 'update'}),
+        (Allow, ~(TraitSpec('banned') | ~TraitSpec('admin')), {'delete'}),
+    ),
+    'nested_negations': (
+        (Allow, (TraitSpec('owner') & ~TraitSpec('banned')) | (TraitSpec('admin') & ~~TraitSpec('active')), {'update'}),
+        (Deny, ~(TraitSpec('authenticated') | TraitSpec('admin')), {'update', 'read'}),
+        (Allow, ~TraitSpec(), {'read'}),
+        (Allow, TraitSpec(), {'access'}),
+        (Allow, _empty_or_spec(), {'delete'}),
+    ),
+    'contradictions': (
+        (Allow, TraitSpec('admin') & ~TraitSpec('admin'), {'read'}),
+        (Allow, TraitSpec('owner') | ~TraitSpec('owner'), {'access'}),
+    ),
+    'shared_spec': (
+        (Allow, TraitSpec('admin') | TraitSpec('owner'), {'read'}),
+        (Deny, 'banned', {'read', 'update'}),
+        (Allow, TraitSpec('admin') | TraitSpec('owner'), {'update'}),
+    ),
+    'not_normalized': (
+        (Allow, _wide_spec(), {'read'}),
+        (Deny, ~_wide_spec(), {'update'}),
+        (Allow, 'everyone', {'update'}),
+    ),
+    'helpers': (
+        *AclContext.trait_all('authenticated', 'active', 'owner').acl,
+        *AclContext.trait_any('admin', 'owner', 'banned').acl,
+    ),
+    'empty': (),
+}
+
+
+def _trait_sets():
+    for size in range(len(TRAITS) + 1):
+        for traits in combinations(TRAITS, size):
+            yield list(traits)
+
+    # Traits of the spec too wide to normalize
+    yield [f'wide_{i}_a' for i in range(7)]
+    yield [f'wide_{i}_b' for i in range(7)] + ['banned']
+    yield [f'wide_{i}_a' for i in range(6)]
+
+
+class CompiledAclTest(unittest.TestCase):
+    """ Compiled ACLs must decide exactly as the rule by rule evaluation of the same ACL """
+
+    def setUp(self):
+        self.policy = AclAuthorizationPolicy()
+
+    def test_permits_matches_rule_by_rule(self):
+        for (name, acl) in ACLS.items():
+            compiled, plain = AclContext(*acl), _PlainContext(*acl)
+
+            for traits in _trait_sets():
+                agent = _Traits(traits)
+                for permission in PERMISSIONS:
+                    expected = self.policy.permits(permission, plain, agent)
+                    with self.subTest(acl=name, traits=traits, permission=permission):
+                        self.assertEqual(self.policy.permits(permission, compiled, agent), expected)
+                        # Memoized decision
+                        self.assertEqual(self.policy.permits(permission, compiled, agent), expected)
+
+    def test_all_permissions_matches_rule_by_rule(self):
+        for (name, acl) in ACLS.items():
+            compiled, plain = AclContext(*acl), _PlainContext(*acl)
+
+            for traits in _trait_sets():
+                agent = _Traits(traits)
+                expected = set(self.policy.all_permissions(plain, agent))
+                with self.subTest(acl=name, traits=traits):
+                    self.assertEqual(set(self.policy.all_permissions(compiled, agent)), expected)
+                    self.assertEqual(set(self.policy.all_permissions(compiled, agent)), expected)
+
+    def test_known_decisions(self):
+        context = AclContext(*ACLS['specs'])
+        admin = _Traits(['everyone', 'authenticated', 'active', 'admin'])
+        inactive_owner = _Traits(['everyone', 'authenticated', 'owner'])
+
+        self.assertEqual(set(self.policy.all_permissions(context, admin)), {'read', 'create', 'update', 'delete'})
+        self.assertEqual(set(self.policy.all_permissions(context, inactive_owner)), {'read'})
+        self.assertFalse(self.policy.permits('unused', context, admin))
+
+    def test_compiled_acl_as_context(self):
+        acl = ACLS['later_rules_override']
+        compiled = CompiledAcl(acl)
+
+        for traits in _trait_sets():
+            agent = _Traits(traits)
+            for permission in PERMISSIONS:
+                with self.subTest(traits=traits, permission=permission):
+                    self.assertEqual(
+                        self.policy.permits(permission, compiled, agent),
+                        self.policy.permits(permission, _PlainContext(*acl), agent)
+                    )
+
+    def test_wide_specs_are_not_normalized(self):
+        self.assertIsNotNone(CompiledTraitPredicate(_wide_spec()).spec)
+        self.assertGreater(2 ** 7, _MAX_CLAUSES)
+
+    def test_context_compiled_once(self):
+        context = AclContext(*ACLS['specs'])
+        self.assertIs(context.compile(), context.compile())
+
+
+if __name__ == '__main__':
+    unittest.main()
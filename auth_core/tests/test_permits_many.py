@@ -0,0 +1,32 @@
+import unittest
+
+from auth_core import AclAuthorizationPolicy, AclContext
+
+from auth_core.tests.test_compiled import ACLS, PERMISSIONS, _PlainContext, _Traits, _trait_sets
+
+
+class PermitsManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = AclAuthorizationPolicy()
+
+    def test_matches_permits(self):
+        contexts = [AclContext(*acl) for acl in ACLS.values()] + [_PlainContext(*acl) for acl in ACLS.values()]
+        # Listings repeat a few contexts, in any order
+        listing = [contexts[(i * 7) % len(contexts)] for i in range(60)]
+
+        for traits in _trait_sets():
+            agent = _Traits(traits)
+            for permission in PERMISSIONS:
+                with self.subTest(traits=traits, permission=permission):
+                    self.assertEqual(
+                        self.policy.permits_many(permission, listing, agent),
+                        [self.policy.permits(permission, ctx, agent) for ctx in listing]
+                    )
+
+    def test_empty_listing(self):
+        self.assertEqual(self.policy.permits_many('read', [], _Traits(['everyone'])), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
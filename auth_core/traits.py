@@ -1,17 +1,163 @@
-from typing import Any
+from typing import Any, ClassVar, Hashable, Iterable, Optional
 import copy
+import threading
+
+
+class TraitRegistry(object):
+    """
+        Interns traits to bit positions, so that a set of traits can be represented by a single integer
+    """
+
+    def __init__(self):
+        self._bits: dict[Any, int] = {}
+        self._traits: list = []
+        self._lock = threading.Lock()
+
+    def bit(self, trait) -> int:
+        try:
+            return self._bits[trait]
+        except KeyError:
+            pass
+
+        with self._lock:
+            # Some other thread might have interned it in the meantime
+            if trait not in self._bits:
+                self._bits[trait] = 1 << len(self._traits)
+                self._traits.append(trait)
+            return self._bits[trait]
+
+    def lookup(self, trait) -> int:
+        """ Same as `bit()`, but returns 0 for traits that were never interned instead of interning them """
+        return self._bits.get(trait, 0)
+
+    def mask_of(self, traits: Iterable) -> int:
+        mask = 0
+        for trait in traits:
+            mask |= self.bit(trait)
+        return mask
+
+    def traits_of(self, mask: int) -> list:
+        traits = []
+        index = 0
+        while mask:
+            if mask & 1:
+                traits.append(self._traits[index])
+            mask >>= 1
+            index += 1
+        return traits
+
+
+trait_registry = TraitRegistry()
+
+
+class TraitSet(object):
+    """
+        An immutable set of traits, stored as a mask of `trait_registry` bits. Membership checks and set operations
+        are single integer operations.
+    """
+
+    __slots__ = ('mask',)
+
+    def __init__(self, mask: int = 0):
+        self.mask = mask
+
+    @classmethod
+    def of(cls, traits: Iterable) -> 'TraitSet':
+        return cls(trait_registry.mask_of(traits))
+
+    def __contains__(self, trait) -> bool:
+        bit = trait_registry.lookup(trait)
+        return bit != 0 and self.mask & bit != 0
+
+    def __iter__(self):
+        return iter(trait_registry.traits_of(self.mask))
+
+    def __len__(self) -> int:
+        return bin(self.mask).count('1')
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TraitSet) and self.mask == other.mask
+
+    def __hash__(self) -> int:
+        return hash(self.mask)
+
+    def __or__(self, other: 'TraitSet') -> 'TraitSet':
+        return TraitSet(self.mask | other.mask)
+
+    def __and__(self, other: 'TraitSet') -> 'TraitSet':
+        return TraitSet(self.mask & other.mask)
+
+    def __sub__(self, other: 'TraitSet') -> 'TraitSet':
+        return TraitSet(self.mask & ~other.mask)
+
+    def __xor__(self, other: 'TraitSet') -> 'TraitSet':
+        return TraitSet(self.mask ^ other.mask)
+
+    def issubset(self, other: 'TraitSet') -> bool:
+        return self.mask & ~other.mask == 0
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.__class__.__name__, ', '.join(str(t) for t in self))
 
 
 class AgentTraitCollection():
+    __slots__ = ('agent_handle', 'traits')
+
+    # Bound on the number of memoized trait sets (per subclass), see `trait_memo_key()`
+    MAX_MEMO_SIZE = 10000
+
+    _trait_memo: ClassVar[dict]
+    _trait_memo = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._trait_memo = {}
+
     def __init__(self, agent_handle):
         self.agent_handle = agent_handle
-        self._trait_list = self.get_effective_traits(agent_handle)
+        self.traits = self._effective_trait_set(agent_handle)
 
-    def get_effective_traits(self, agent_handle: Any):
+    def get_effective_traits(self, agent_handle: Any) -> Iterable:
         return []
 
+    def trait_memo_key(self, agent_handle: Any) -> Optional[Hashable]:
+        """
+            Returns a key under which the effective traits of the agent are memoized, so that they are not
+            recomputed for every request of the same agent. The key must change whenever the traits of the agent
+            might change. Return None (the default) to not memoize.
+        """
+        return None
+
+    def _effective_trait_set(self, agent_handle: Any) -> TraitSet:
+        key = self.trait_memo_key(agent_handle)
+        if key is None:
+            return TraitSet.of(self.get_effective_traits(agent_handle))
+
+        memo = self._trait_memo
+        traits = memo.get(key)
+        if traits is None:
+            traits = TraitSet.of(self.get_effective_traits(agent_handle))
+
+            if len(memo) >= self.MAX_MEMO_SIZE:
+                # Drop the oldest entry (unless another thread is changing the memo right now)
+                try:
+                    memo.pop(next(iter(memo)), None)
+                except (StopIteration, RuntimeError):
+                    pass
+            memo[key] = traits
+
+        return traits
+
     def has_trait(self, trait):
-        return trait in self._trait_list
+        return trait in self.traits
+
+    @property
+    def trait_mask(self) -> int:
+        """ The traits of the agent as a mask of `trait_registry` bits """
+        return self.traits.mask
 
 
 class TraitSpec:
@@ -0,0 +1,21 @@
+import multiprocessing
+
+import gunicorn
+
+# Gunicorn configuration for serving the ASGI application with uvicorn workers. Set `runtime.async_views = true`
+# in config/app.toml so that the native async views are routed, then run
+#
+#   gunicorn app.bootstrap.asgi:application -c config/gunicorn_asgi_conf.py
+#
+# Each worker runs a single event loop, so unlike sync workers a worker is not tied up by a slow client. A worker
+# per core is usually enough.
+
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = multiprocessing.cpu_count()
+
+bind = '0.0.0.0:3000'
+
+# Slow clients are cheap to keep around on an event loop, but do not keep idle connections forever
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
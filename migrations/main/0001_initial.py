@@ -0,0 +1,56 @@
+# Generated by Django 4.1 on 2026-10-18 10:21
+
+import app.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+import typing
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilePicture',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=250, unique=True)),
+                ('location', models.CharField(max_length=250)),
+            ],
+            options={
+                'db_table': 'k_profile_pics',
+            },
+            bases=(models.Model, typing.Generic),
+        ),
+        migrations.CreateModel(
+            name='AppUser',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', app.models.fields.PositiveTinyIntegerField(default=1)),
+                ('is_deleted', app.models.fields.PositiveTinyIntegerField(default=0)),
+                ('phone_number', models.CharField(max_length=100)),
+                ('post_code', models.CharField(max_length=50)),
+                ('address_line_1', models.CharField(max_length=250)),
+                ('address_line_2', models.CharField(max_length=250)),
+                ('age', models.IntegerField()),
+                ('about_me', models.TextField()),
+                ('current_api_key', models.CharField(db_index=True, max_length=250)),
+                ('username', models.CharField(max_length=250)),
+                ('password_hash', models.CharField(max_length=250)),
+                ('first_name', models.CharField(max_length=250)),
+                ('last_name', models.CharField(max_length=250)),
+                ('email', models.CharField(max_length=250)),
+                ('profile_picture', models.ForeignKey(blank=True, db_column='pic_id', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.profilepicture')),
+            ],
+            options={
+                'db_table': 'k_app_users',
+            },
+            bases=(models.Model, typing.Generic),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appuser',
+            name='api_key_prefix',
+            field=models.CharField(db_index=True, default='', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='appuser',
+            name='current_api_key',
+            field=models.CharField(max_length=250),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_appuser_api_key_prefix_alter_appuser_current_api_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilepicture',
+            name='content_hash',
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_profilepicture_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilepicture',
+            name='variants',
+            field=models.CharField(default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_profilepicture_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appuser',
+            name='email',
+            field=models.CharField(max_length=250, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='appuser',
+            name='username',
+            field=models.CharField(max_length=250, unique=True),
+        ),
+    ]
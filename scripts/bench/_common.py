@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import math
+import time
+import platform
+import subprocess
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Username prefix of the seeded users, so that they can be told apart from (and cleaned up without touching) real ones
+SEED_USERNAME_PREFIX = 'bench_'
+SEED_PASSWORD = 'bench-password'
+
+DEFAULT_USERS_FILE = 'bench_users.jsonl'
+
+
+def setup_django():
+    """ Set up django for the scripts that use the app's models directly """
+    sys.path.insert(0, str(ROOT_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.bootstrap.settings')
+
+    import django
+    django.setup()
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """ Nearest-rank percentile of already sorted values """
+    if not sorted_values:
+        return 0.0
+
+    rank = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def latency_summary(latencies: list) -> dict:
+    """ Summary (in milliseconds) of latencies given in seconds """
+    values = sorted(latencies)
+    count = len(values)
+
+    return {
+        'p50': round(percentile(values, 50) * 1000, 3),
+        'p95': round(percentile(values, 95) * 1000, 3),
+        'p99': round(percentile(values, 99) * 1000, 3),
+        'mean': round(sum(values) / count * 1000, 3) if count else 0.0,
+        'max': round(values[-1] * 1000, 3) if count else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def write_report(kind: str, results: dict, options: dict, output: str):
+    """
+    Write the results as JSON (to stdout when `output` is '-'). Keys are sorted and the environment is recorded, so
+    that the reports of two commits can be diffed, see `compare.py`
+    """
+    report = {
+        'kind': kind,
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': int(time.time()),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'options': options,
+        },
+        'results': results,
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output == '-':
+        print(text)
+    else:
+        Path(output).write_text(text + '\n')
+        print(f"Report written to {output}", file=sys.stderr)
+
+
+def read_users(users_file: str) -> list[dict]:
+    """ Read the users written by `seed.py` """
+    with open(users_file) as f:
+        return [json.loads(line) for line in f if line.strip()]
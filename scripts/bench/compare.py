@@ -0,0 +1,61 @@
+"""
+Compare two reports written by `load.py` or `micro.py`, e.g of two commits:
+
+    python scripts/bench/compare.py before.json after.json
+"""
+import sys
+import json
+import argparse
+
+
+def _flatten(value, prefix='') -> dict:
+    if isinstance(value, dict):
+        flat = {}
+        for (key, item) in value.items():
+            flat.update(_flatten(item, f'{prefix}.{key}' if prefix else key))
+        return flat
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=0.0,
+                        help="Only show the metrics that changed by more than this many percent")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    if base['kind'] != head['kind']:
+        sys.exit(f"Can not compare a {base['kind']} report with a {head['kind']} report")
+
+    print(f"{base['meta']['revision']} -> {head['meta']['revision']}")
+
+    base_values = _flatten(base['results'])
+    head_values = _flatten(head['results'])
+
+    for name in sorted(base_values.keys() | head_values.keys()):
+        old = base_values.get(name)
+        new = head_values.get(name)
+
+        if old is None or new is None:
+            print(f"{name:<60} {old!s:>12} {new!s:>12}")
+            continue
+
+        change = (new - old) / old * 100 if old else 0.0
+        if abs(change) < args.threshold:
+            continue
+
+        print(f"{name:<60} {old:>12} {new:>12} {change:+8.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Import time and memory of the password hashing module, the way a server worker boots.
+
+    python scripts/bench/import_report.py --output imports.json
+
+Every scenario runs in a fresh interpreter under `-X importtime`. `eager` imports the module along with every
+handler of `passlib.hash`, i.e what importing `app/utils/passlib_hash.py` did before its handlers were resolved
+lazily, `lazy` imports the module as it is now and `lazy+pbkdf2` also resolves the handler used to hash passwords
+(as the first login served by a worker does). The `worker_*` ones boot the whole app the same two ways.
+"""
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+import _common
+
+
+_MEASURE = '''
+import sys, json, time, resource
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'passlib_modules': sum(1 for name in sys.modules if name.startswith('passlib')),
+}}))
+'''
+
+_EAGER_HANDLERS = 'import passlib.hash\nfor name in dir(passlib.hash): getattr(passlib.hash, name)\n'
+_WORKER = (
+    'import os, django\n'
+    'os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.bootstrap.settings")\n'
+    'django.setup()\n'
+    'import app.routes\n'
+)
+
+SCENARIOS = {
+    'eager': 'import app.utils.passlib_hash\n' + _EAGER_HANDLERS,
+    'lazy': 'import app.utils.passlib_hash\n',
+    'lazy+pbkdf2': 'import app.utils.passlib_hash as ph\nph.get_handler("pbkdf2_sha256")\n',
+    'worker_eager': _WORKER + _EAGER_HANDLERS,
+    'worker_lazy': _WORKER,
+}
+
+
+def _run(code: str) -> tuple[dict, dict]:
+    """ Run the code in a fresh interpreter, return its measurements and its cumulative import times by module """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _MEASURE.format(code=code)],
+        cwd=_common.ROOT_DIR, capture_output=True, text=True, check=True
+    )
+
+    # `-X importtime` lines look like `import time: self [us] | cumulative | imported package`
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, total, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(total)
+
+    return json.loads(result.stdout.strip().splitlines()[-1]), cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and memory of the password hashing module")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per scenario, the best one is reported")
+    parser.add_argument('--top', type=int, default=10, help="Slowest passlib imports to report per scenario")
+    parser.add_argument('--output', default='-', help="Where to write the JSON report, '-' for stdout")
+    args = parser.parse_args()
+
+    results = {}
+    for (name, code) in SCENARIOS.items():
+        runs = [_run(code) for _ in range(args.repeat)]
+        best, cumulative = min(runs, key=lambda run: run[0]['seconds'])
+
+        passlib_times = defaultdict(int)
+        for (module, total) in cumulative.items():
+            if module.startswith('passlib'):
+                passlib_times[module] = total
+
+        results[name] = {
+            'import_ms': round(best['seconds'] * 1000, 2),
+            'max_rss_kb': min(run[0]['max_rss_kb'] for run in runs),
+            'passlib_modules': best['passlib_modules'],
+            'slowest_passlib_imports_us': dict(
+                sorted(passlib_times.items(), key=lambda item: -item[1])[:args.top]
+            ),
+        }
+        print(f"{name}: {results[name]['import_ms']}ms, {results[name]['max_rss_kb']}KB max RSS, "
+              f"{best['passlib_modules']} passlib modules", file=sys.stderr)
+
+    _common.write_report('imports', results, vars(args), args.output)
+
+
+if __name__ == '__main__':
+    main()
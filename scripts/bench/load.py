@@ -0,0 +1,329 @@
+"""
+Load test of the v1 endpoints against a running server, e.g a local gunicorn:
+
+    gunicorn app.bootstrap.wsgi:application -c config/gunicorn_conf.py -w 4 -b 127.0.0.1:8000
+    python scripts/bench/seed.py --users 10000
+    python scripts/bench/load.py --concurrency 32 --requests 5000 --output before.json
+
+Replay a traffic file (see `traffic.sample.jsonl`) instead of the built-in scenarios:
+
+    python scripts/bench/load.py --replay scripts/bench/traffic.sample.jsonl --loops 100
+
+Queries per request are read from the app's /api/metrics/ endpoint, i.e they are exact with
+`metrics.sample_rate = 1` and estimated from the sampled requests otherwise.
+"""
+import sys
+import json
+import uuid
+import time
+import zlib
+import random
+import struct
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+from collections import defaultdict
+
+import _common
+
+
+API = '/api/v1'
+
+_PROFILE = {
+    'first_name': 'Bench',
+    'last_name': 'User',
+    'phone_number': '0000000000',
+    'post_code': '00000',
+    'address_line_1': 'Bench street',
+    'address_line_2': 'Apt 1',
+    'age': 30,
+    'about_me': '',
+}
+
+
+def _png(width=64, height=64) -> bytes:
+    """ A random (so never deduplicated) RGB image """
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    rows = b''.join(b'\x00' + random.randbytes(width * 3) for _ in range(height))
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(rows)),
+        chunk(b'IEND', b''),
+    ])
+
+
+def _json_request(method, path, payload=None, api_key=None):
+    headers = {'Content-Type': 'application/json'}
+    if api_key:
+        headers['Authorization'] = f'Bearer {api_key}'
+
+    body = json.dumps(payload).encode() if payload is not None else None
+    return method, path, body, headers
+
+
+class Scenarios:
+    """ Request factories of the built-in scenarios, each one returns the n-th request of its scenario """
+
+    def __init__(self, users: list[dict]):
+        self.run_id = uuid.uuid4().hex[:8]
+        # Logging in rotates the user's api key, so the users that log in are not the ones whose keys are used
+        self.key_users = users[0::2]
+        self.login_users = users[1::2]
+
+    def signup(self, n):
+        username = f'{_common.SEED_USERNAME_PREFIX}signup_{self.run_id}_{n}'
+        return _json_request('POST', f'{API}/auth/signup/', {
+            **_PROFILE,
+            'username': username,
+            'email': f'{username}@bench.local',
+            'password': _common.SEED_PASSWORD,
+        })
+
+    def login(self, n):
+        user = self.login_users[n % len(self.login_users)]
+        return _json_request('POST', f'{API}/auth/login/', {'username': user['username'], 'password': user['password']})
+
+    def profile(self, n):
+        user = self.key_users[n % len(self.key_users)]
+        return _json_request('GET', f'{API}/user/profile/', api_key=user['api_key'])
+
+    def update(self, n):
+        user = self.key_users[n % len(self.key_users)]
+        return _json_request('POST', f'{API}/user/profile/update/', {**_PROFILE, 'age': 20 + n % 50}, user['api_key'])
+
+    def upload(self, n):
+        boundary = uuid.uuid4().hex
+        body = b''.join([
+            f'--{boundary}\r\n'.encode(),
+            b'Content-Disposition: form-data; name="image"; filename="bench.png"\r\n',
+            b'Content-Type: image/png\r\n\r\n',
+            _png(),
+            f'\r\n--{boundary}--\r\n'.encode(),
+        ])
+        return 'POST', f'{API}/user/upload-picture/', body, {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+    # Route (as labelled in the app's metrics) of each scenario
+    routes = {
+        'signup': 'api/v1/auth/signup/',
+        'login': 'api/v1/auth/login/',
+        'profile': 'api/v1/user/profile/',
+        'update': 'api/v1/user/profile/update/',
+        'upload': 'api/v1/user/upload-picture/',
+    }
+
+
+class Replay:
+    """
+    Requests read from a JSON lines traffic file, replayed in order. Each line looks like
+
+        {"method": "POST", "path": "/api/v1/auth/login/", "body": {"username": "{username}", "password": "{password}"}}
+
+    `{username}`, `{password}` and `{api_key}` are replaced with the credentials of a seeded user, `{n}` with the
+    index of the request. Set `"auth": true` to send the user's api key. Note that logging in rotates the api key
+    of the user, so later requests authenticated as the same user get rejected.
+    """
+
+    def __init__(self, traffic_file: str, users: list[dict]):
+        with open(traffic_file) as f:
+            self.entries = [json.loads(line) for line in f if line.strip() and not line.startswith('#')]
+        self.users = users
+
+    @staticmethod
+    def _fill(value, values: dict):
+        if isinstance(value, str):
+            for (name, replacement) in values.items():
+                value = value.replace('{' + name + '}', str(replacement))
+            return value
+        if isinstance(value, dict):
+            return {k: Replay._fill(v, values) for k, v in value.items()}
+        if isinstance(value, list):
+            return [Replay._fill(v, values) for v in value]
+        return value
+
+    def __call__(self, n):
+        entry = self.entries[n % len(self.entries)]
+        user = self.users[n % len(self.users)] if self.users else {}
+        values = {**user, 'n': n}
+
+        return _json_request(
+            entry.get('method', 'GET'),
+            self._fill(entry['path'], values),
+            self._fill(entry.get('body'), values),
+            user.get('api_key') if entry.get('auth') else None
+        )
+
+
+class Client(threading.local):
+    """ One keep-alive connection per thread """
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = None
+
+    def send(self, method, path, body, headers) -> int:
+        for attempt in (0, 1):
+            if self.connection is None:
+                self.connection = self.connection_class(self.host, self.port, timeout=60)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.connection.close()
+                    self.connection = None
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed the kept alive connection, retry once with a new one
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+
+def run(client: Client, make_request, total: int, concurrency: int) -> dict:
+    """ Send `total` requests with `concurrency` threads and summarize them """
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+    latencies: list[float] = []
+    statuses: dict[int, int] = defaultdict(int)
+    results_lock = threading.Lock()
+
+    def worker():
+        local_latencies = []
+        local_statuses = defaultdict(int)
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                break
+
+            request = make_request(n)
+            start = time.perf_counter()
+            try:
+                status = client.send(*request)
+            except (OSError, http.client.HTTPException):
+                status = 0
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[status] += 1
+
+        with results_lock:
+            latencies.extend(local_latencies)
+            for (status, count) in local_statuses.items():
+                statuses[status] += count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if not 200 <= status < 300)
+    return {
+        'requests': total,
+        'errors': errors,
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': _common.latency_summary(latencies),
+    }
+
+
+def scrape_sql_metrics(client: Client, token: str) -> dict:
+    """ Per route (sum of sampled SQL queries, sampled request count) read from the app's metrics endpoint """
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    if client.connection is None:
+        client.connection = client.connection_class(client.host, client.port, timeout=60)
+    try:
+        client.connection.request('GET', '/api/metrics/', headers=headers)
+        response = client.connection.getresponse()
+        text = response.read().decode()
+    except (OSError, http.client.HTTPException):
+        client.connection = None
+        return {}
+    if response.status != 200:
+        return {}
+
+    totals: dict[str, list] = defaultdict(lambda: [0.0, 0.0])
+    for line in text.splitlines():
+        for (suffix, index) in (('_sum', 0), ('_count', 1)):
+            name = 'app_request_sql_queries' + suffix + '{'
+            if line.startswith(name):
+                labels, _, value = line[len(name):].rpartition('} ')
+                route = labels.partition('route="')[2].partition('"')[0]
+                totals[route][index] += float(value)
+
+    return totals
+
+
+def queries_per_request(before: dict, after: dict) -> dict:
+    result = {}
+    for (route, (total, count)) in after.items():
+        if route == 'api/metrics/':
+            # Our own scrapes
+            continue
+
+        prev_total, prev_count = before.get(route, (0.0, 0.0))
+        if count - prev_count > 0:
+            result[route] = round((total - prev_total) / (count - prev_count), 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the v1 endpoints of a running server")
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--users-file', default=_common.DEFAULT_USERS_FILE, help="Written by seed.py")
+    parser.add_argument('--scenarios', default='signup,login,profile,update,upload',
+                        help="Comma separated, run one after the other")
+    parser.add_argument('--replay', help="Replay this traffic file instead of running the scenarios")
+    parser.add_argument('--loops', type=int, default=1, help="Times the traffic file is replayed")
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per scenario")
+    parser.add_argument('--warmup', type=int, default=50, help="Unmeasured requests sent before each scenario")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--metrics-token', default='', help="Token of the metrics endpoint (`metrics.token`)")
+    parser.add_argument('--output', default='-', help="Where to write the JSON report, '-' for stdout")
+    args = parser.parse_args()
+
+    users = _common.read_users(args.users_file)
+    client = Client(args.base_url)
+
+    if args.replay:
+        replay = Replay(args.replay, users)
+        jobs = [('replay', replay, len(replay.entries) * args.loops, None)]
+    else:
+        if len(users) < 2:
+            parser.error(f"Not enough users in {args.users_file}, run seed.py first")
+
+        scenarios = Scenarios(users)
+        jobs = [
+            (name, getattr(scenarios, name), args.requests, Scenarios.routes[name])
+            for name in args.scenarios.split(',')
+        ]
+
+    results = {}
+    for (name, make_request, total, route) in jobs:
+        print(f"Running {name} ({total} requests, concurrency {args.concurrency})", file=sys.stderr)
+        if args.warmup:
+            run(client, lambda n: make_request(total + n), args.warmup, args.concurrency)
+
+        before = scrape_sql_metrics(client, args.metrics_token)
+        result = run(client, make_request, total, args.concurrency)
+        queries = queries_per_request(before, scrape_sql_metrics(client, args.metrics_token))
+
+        result['queries_per_request'] = queries.get(route) if route else queries
+        results[name] = result
+
+    options = {k: v for k, v in vars(args).items() if k not in ('metrics_token', 'output')}
+    _common.write_report('load', results, options, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Micro-benchmarks of the hot paths that do not need a running server: ACL checks, api key handling and the
+serializers.
+
+    python scripts/bench/micro.py --output micro.json
+
+The serializer benchmarks that validate unique fields query the configured database, seed it first (seed.py) to
+get realistic numbers.
+"""
+import sys
+import timeit
+import argparse
+
+import _common
+
+
+def _bench(fn, number: int, repeat: int) -> dict:
+    """ Best and median time per call (in microseconds) over `repeat` runs of `number` calls """
+    runs = sorted(t / number for t in timeit.repeat(fn, number=number, repeat=repeat))
+    return {
+        'best_us': round(runs[0] * 1e6, 3),
+        'median_us': round(runs[len(runs) // 2] * 1e6, 3),
+        'calls': number,
+    }
+
+
+def acl_benchmarks() -> dict:
+    from auth_core import AclContext, Allow, Deny, TraitSpec, AclAuthorizationPolicy
+    from app.models.auth import AppUser
+    from app.core.authentication.engine import TR, SimpleTraitCollection
+
+    policy = AclAuthorizationPolicy()
+    user = AppUser(pk=1, username='bench')
+    authenticated = SimpleTraitCollection(user)
+    anonymous = SimpleTraitCollection(None)
+
+    ctx_simple = AclContext.trait_singular(TR.Authenticated)
+    ctx_nested = AclContext(
+        (Allow, TR.Everyone, {'read'}),
+        (Allow, TraitSpec(TR.Authenticated) & ~TraitSpec('role.banned'), {'read', 'write'}),
+        (Deny, TraitSpec('role.banned') | TraitSpec('role.suspended'), {'write'}),
+        (Allow, TraitSpec('role.admin'), {'read', 'write', 'delete'}),
+    )
+
+    class _RawContext:
+        # Not compilable, exercises the interpreted path
+        acl = ctx_nested.acl
+
+    raw_nested = _RawContext()
+    listing = [ctx_simple if i % 3 else ctx_nested for i in range(1000)]
+
+    return {
+        'permits.simple': lambda: policy.permits('access', ctx_simple, authenticated),
+        'permits.simple_denied': lambda: policy.permits('access', ctx_simple, anonymous),
+        'permits.nested': lambda: policy.permits('write', ctx_nested, authenticated),
+        'permits.nested_interpreted': lambda: policy.permits('write', raw_nested, authenticated),
+        'all_permissions.nested': lambda: policy.all_permissions(ctx_nested, authenticated),
+        'permits_many.1000': lambda: policy.permits_many('read', listing, authenticated),
+        'traits.memoized': lambda: SimpleTraitCollection(user),
+    }
+
+
+def keystore_benchmarks() -> dict:
+    from app.core.authentication.keystore import KeyStore
+
+    key = KeyStore.generate_fresh()
+    serialized = KeyStore.serialize_user(key)
+    stored_hash = KeyStore.hash_digest(key)
+    # Well formed, but with a checksum that does not match
+    forged = serialized[:-6] + ('AAAAAA' if not serialized.endswith('AAAAAA') else 'BBBBBB')
+
+    return {
+        'keystore.generate_fresh': KeyStore.generate_fresh,
+        'keystore.serialize_user': lambda: KeyStore.serialize_user(key),
+        'keystore.deserialize_user': lambda: KeyStore.deserialize_user(serialized),
+        'keystore.deserialize_user_malformed': lambda: KeyStore.deserialize_user('kp.malformed'),
+        'keystore.deserialize_user_forged': lambda: KeyStore.deserialize_user(forged),
+        'keystore.hash_digest': lambda: KeyStore.hash_digest(key),
+        'keystore.matches': lambda: KeyStore.matches(key, stored_hash),
+    }
+
+
+def serializer_benchmarks() -> dict:
+    from app.models.auth import AppUser
+    from app.core.authentication.serializers import (
+        UserProfileSerializer,
+        CreateUserSerializer,
+        LoginSerializer,
+    )
+    from app.core.authentication.apiviews import profile_payload
+
+    profile = {
+        'first_name': 'Bench',
+        'last_name': 'User',
+        'phone_number': '0000000000',
+        'post_code': '00000',
+        'address_line_1': 'Bench street',
+        'address_line_2': 'Apt 1',
+        'age': 30,
+        'about_me': '',
+    }
+    signup = {**profile, 'username': 'bench_micro_unused', 'email': 'bench_micro_unused@bench.local', 'password': 'x' * 8}
+
+    user = AppUser(username='bench', email='bench@bench.local', **profile)
+
+    return {
+        'serializer.login.validate': lambda: LoginSerializer(data={'username': 'bench', 'password': 'x'}).is_valid(),
+        'serializer.profile.validate': lambda: UserProfileSerializer(data=profile).is_valid(),
+        'serializer.signup.validate': lambda: CreateUserSerializer(data=signup).is_valid(),
+        # What the profile view renders, without a serializer
+        'serializer.profile_view.data': lambda: profile_payload(user, None),
+    }
+
+
+GROUPS = {
+    'acl': acl_benchmarks,
+    'keystore': keystore_benchmarks,
+    'serializers': serializer_benchmarks,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of ACL checks, api keys and serializers")
+    parser.add_argument('--groups', default=','.join(GROUPS), help="Comma separated, any of: " + ', '.join(GROUPS))
+    parser.add_argument('--number', type=int, default=2000, help="Calls per run")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per benchmark")
+    parser.add_argument('--output', default='-', help="Where to write the JSON report, '-' for stdout")
+    args = parser.parse_args()
+
+    _common.setup_django()
+
+    results = {}
+    for group in args.groups.split(','):
+        for (name, fn) in GROUPS[group]().items():
+            # Slow benchmarks (e.g a listing or db queries) get fewer calls, so that every run takes about as long
+            number = max(args.number // 100, 1) if name.startswith(('permits_many', 'serializer.signup')) else args.number
+            results[name] = _bench(fn, number, args.repeat)
+            print(f"{name}: {results[name]['best_us']}us", file=sys.stderr)
+
+    _common.write_report('micro', results, vars(args), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Seed the database with users for the load tests.
+
+    python scripts/bench/seed.py --users 100000
+
+Writes the credentials and api keys of the seeded users to a JSON lines file, which `load.py` reads.
+"""
+import sys
+import json
+import time
+import argparse
+
+import _common
+
+
+def _make_user(index: int, template):
+    from app.models.auth import AppUser
+    from app.core.authentication.engine import issue_api_key
+
+    username = f'{_common.SEED_USERNAME_PREFIX}{index}'
+
+    if template is None:
+        user = AppUser.make(username, _common.SEED_PASSWORD)
+    else:
+        # Same password as the template, hashed once rather than for each user
+        user = AppUser(username=username, password_hash=template.password_hash)
+
+    user.email = f'{username}@bench.local'
+    user.first_name = 'Bench'
+    user.last_name = str(index)
+    user.phone_number = '0000000000'
+    user.post_code = '00000'
+    user.address_line_1 = 'Bench street'
+    user.address_line_2 = 'Apt 1'
+    user.age = 30
+    user.about_me = ''
+
+    api_key = issue_api_key(user)
+    return user, api_key
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with users for the benchmarks")
+    parser.add_argument('--users', type=int, default=1000, help="Number of users to create")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--users-file', default=_common.DEFAULT_USERS_FILE,
+                        help="Where to write the seeded credentials and api keys")
+    parser.add_argument('--hash-each', action='store_true',
+                        help="Hash the password of every user (slow, about 1M users a day per core) instead of once")
+    parser.add_argument('--reset', action='store_true', help="Delete the previously seeded users first")
+    args = parser.parse_args()
+
+    _common.setup_django()
+
+    from django.db import transaction
+    from app.models.auth import AppUser
+
+    if args.reset:
+        deleted, _ = AppUser.objects.filter(username__startswith=_common.SEED_USERNAME_PREFIX).delete()
+        print(f"Deleted {deleted} seeded user(s)", file=sys.stderr)
+
+    # Continue numbering after the already seeded users, so that usernames stay unique
+    start = AppUser.objects.filter(username__startswith=_common.SEED_USERNAME_PREFIX).count()
+    template = None if args.hash_each else AppUser.make('', _common.SEED_PASSWORD)
+
+    started = time.perf_counter()
+    created = 0
+
+    with open(args.users_file, 'a') as users_file:
+        while created < args.users:
+            count = min(args.batch_size, args.users - created)
+            batch = [_make_user(start + created + i, template) for i in range(count)]
+
+            with transaction.atomic():
+                AppUser.objects.bulk_create([user for user, _ in batch])
+
+            for (user, api_key) in batch:
+                users_file.write(json.dumps({
+                    'username': user.username,
+                    'password': _common.SEED_PASSWORD,
+                    'api_key': api_key,
+                }) + '\n')
+
+            created += count
+            print(f"Created {created}/{args.users} users", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    print(f"Seeded {created} users in {elapsed:.1f}s, credentials appended to {args.users_file}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
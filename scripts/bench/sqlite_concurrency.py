@@ -0,0 +1,157 @@
+"""
+Concurrency of the SQLite database settings: reader and writer processes hammer a scratch database (not the app's
+one) for a while, once set up as django does by default and once as configured in `[db]` of config/app.toml.
+
+    python scripts/bench/sqlite_concurrency.py --readers 8 --writers 2 --output sqlite.json
+
+Readers fetch a row by primary key, writers read a row then update it in a transaction (as a save following a
+validation query does). Each operation stands for a request: it opens its own connection unless the configured
+`db.conn_max_age` keeps them. Operations failing with `database is locked` are counted as lock errors.
+
+The default `[db]` settings are django's own, so opt in to the tuned profile first (`engine = "sqlite-tuned"`,
+`conn_max_age = 600`, see the README) to compare it against them.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+
+import _common
+
+
+def _connect(path: str, profile: dict) -> sqlite3.Connection:
+    # Same as django's sqlite backend: autocommit, transactions are begun explicitly
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA foreign_keys = ON")
+    for (name, value) in profile['pragmas'].items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def _create_database(path: str, profile: dict, rows: int):
+    conn = _connect(path, profile)
+    conn.execute("CREATE TABLE bench_user (id INTEGER PRIMARY KEY, username TEXT, about_me TEXT, updated_at REAL)")
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO bench_user (id, username, about_me, updated_at) VALUES (?, ?, ?, ?)",
+        ((i, f'user_{i}', 'x' * 500, time.time()) for i in range(1, rows + 1))
+    )
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def _run(role: str, path: str, profile: dict, rows: int, duration: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    begin = "BEGIN IMMEDIATE" if profile['immediate_transactions'] else "BEGIN"
+
+    latencies = []
+    lock_errors = 0
+    conn = _connect(path, profile) if profile['reuse_connections'] else None
+
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        op_conn = conn or _connect(path, profile)
+        pk = rng.randint(1, rows)
+
+        try:
+            if role == 'reader':
+                op_conn.execute("SELECT * FROM bench_user WHERE id = ?", (pk,)).fetchone()
+            else:
+                op_conn.execute(begin)
+                try:
+                    op_conn.execute("SELECT * FROM bench_user WHERE id = ?", (pk,)).fetchone()
+                    op_conn.execute("UPDATE bench_user SET updated_at = ? WHERE id = ?", (time.time(), pk))
+                    op_conn.execute("COMMIT")
+                except sqlite3.Error:
+                    op_conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            lock_errors += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+        finally:
+            if conn is None:
+                op_conn.close()
+
+    if conn is not None:
+        conn.close()
+
+    return {'role': role, 'latencies': latencies, 'lock_errors': lock_errors}
+
+
+def _run_star(args):
+    return _run(*args)
+
+
+def bench_profile(profile: dict, readers: int, writers: int, rows: int, duration: float) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.sqlite')
+        _create_database(path, profile, rows)
+
+        jobs = [('reader', path, profile, rows, duration, i) for i in range(readers)]
+        jobs += [('writer', path, profile, rows, duration, readers + i) for i in range(writers)]
+
+        with multiprocessing.Pool(len(jobs)) as pool:
+            outcomes = pool.map(_run_star, jobs)
+
+    results = {}
+    for role in ('reader', 'writer'):
+        latencies = [t for outcome in outcomes if outcome['role'] == role for t in outcome['latencies']]
+        results[role + 's'] = {
+            'ops_per_s': round(len(latencies) / duration, 1),
+            'lock_errors': sum(outcome['lock_errors'] for outcome in outcomes if outcome['role'] == role),
+            'latency_ms': _common.latency_summary(latencies),
+        }
+
+    return results
+
+
+def profiles() -> dict:
+    from django.conf import settings
+
+    database = settings.DATABASES['default']
+    options = database.get('OPTIONS', {})
+
+    return {
+        'django_default': {'pragmas': {}, 'immediate_transactions': False, 'reuse_connections': False},
+        'configured': {
+            'pragmas': options.get('pragmas', {}),
+            'immediate_transactions': bool(options.get('immediate_transactions')),
+            'reuse_connections': bool(database.get('CONN_MAX_AGE')),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency of the default and configured SQLite settings")
+    parser.add_argument('--readers', type=int, default=8, help="Reading processes")
+    parser.add_argument('--writers', type=int, default=2, help="Writing processes")
+    parser.add_argument('--rows', type=int, default=10000, help="Rows of the scratch table")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds each profile runs for")
+    parser.add_argument('--output', default='-', help="Where to write the JSON report, '-' for stdout")
+    args = parser.parse_args()
+
+    _common.setup_django()
+
+    results = {}
+    for (name, profile) in profiles().items():
+        results[name] = bench_profile(profile, args.readers, args.writers, args.rows, args.duration)
+        print(
+            f"{name}: {results[name]['readers']['ops_per_s']} reads/s, {results[name]['writers']['ops_per_s']} "
+            f"writes/s, {results[name]['readers']['lock_errors'] + results[name]['writers']['lock_errors']} "
+            f"lock errors",
+            file=sys.stderr
+        )
+
+    _common.write_report('sqlite', results, vars(args), args.output)
+
+
+if __name__ == '__main__':
+    main()